@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+#
+# 聽牌機端對端效能測試, 使用 skcom.simulator 產生事件, 不需要群益 API:
+#   python bin/bench_receiver.py [--ticks 200000] [--symbols 50] [--output result.json]
+#
+# 每個情境輸出一筆 JSON 結果:
+# * ticks_per_sec: 持續處理速度
+# * latency_us: 從 COM 事件進入到 hook 完成的延遲百分位數 (p50, p99, p999)
+# * peak_rss_kb: 行程最大常駐記憶體
+# * retained_blocks_per_event: 處理後仍存活的記憶體區塊數 / 事件
+# * transient_bytes_per_event: 每輪 PumpWaitingMessages() 暫時配置的記憶體峰值 / 事件
+# * stages: 使用 --probes 時, 各階段的計時直方圖
+
+import argparse
+import array
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from skcom.simulator import SkcomSimulator
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 每次 PumpWaitingMessages() 產生的 ticks 數量
+CHUNK = 100
+
+SCENARIOS = [
+    # (名稱, coroutine hook, 五檔, raw 模式)
+    ('sync-ticks', False, False, False),
+    ('sync-ticks-raw', False, False, True),
+    ('sync-ticks-best5', False, True, False),
+    ('async-ticks', True, False, False),
+    ('async-ticks-best5', True, True, False),
+]
+
+def peak_rss_kb():
+    """ 最大常駐記憶體 (KB), 無法取得時回傳 None """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if platform.system() == 'Darwin':
+        peak //= 1024
+    return peak
+
+def percentile(samples, ratio):
+    """ 已排序樣本的百分位數 """
+    if not samples:
+        return 0
+    return samples[min(len(samples) - 1, int(ratio * len(samples)))]
+
+class Probe():
+    """ 記錄 COM 事件進入時間與 hook 完成延遲 """
+
+    def __init__(self):
+        self.entry = 0
+        self.latency = array.array('q')
+
+    def wrap(self, receiver, name):
+        """ 包裝聽牌機的 COM 事件處理函數, 記錄進入時間 """
+        method = getattr(receiver, name)
+        clock = time.perf_counter_ns
+
+        def wrapper(*args):
+            self.entry = clock()
+            method(*args)
+        setattr(receiver, name, wrapper)
+
+    def sync_hook(self, entry):
+        """ 同步 hook """
+        # pylint: disable=unused-argument
+        self.latency.append(time.perf_counter_ns() - self.entry)
+
+    def async_hook(self, entry):
+        """ coroutine hook, 進入時間在呼叫當下取得 """
+        # pylint: disable=unused-argument
+        begin = self.entry
+
+        async def work():
+            self.latency.append(time.perf_counter_ns() - begin)
+        return work()
+
+    def best5_hook(self, entry):
+        """ 五檔 hook 不列入延遲統計 """
+
+async def drive(sim, count):
+    """ 產生 count 筆 ticks 並推送, 每一輪讓 coroutine hook 執行完畢 """
+    sent = 0
+    while sent < count:
+        size = min(CHUNK, count - sent)
+        sim.generate(size)
+        sim.pump()
+        sent += size
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+async def run_scenario(name, use_async, with_best5, raw, ticks, symbols, probes=False):
+    """ 執行單一情境 """
+    # pylint: disable=too-many-arguments, too-many-locals
+    sim = SkcomSimulator(symbols=symbols, tick_rate=1000, best5_every=1 if with_best5 else 0)
+    sim.install()
+    try:
+        return await measure(sim, name, use_async, with_best5, raw, ticks, symbols, probes)
+    finally:
+        sim.uninstall()
+
+async def measure(sim, name, use_async, with_best5, raw, ticks, symbols, probes):
+    """ 量測單一情境的速度, 延遲與記憶體配置 """
+    # pylint: disable=too-many-arguments, too-many-locals
+    receiver = sim.create_receiver()
+    probe = Probe()
+
+    hook = probe.async_hook if use_async else probe.sync_hook
+    receiver.set_ticks_hook(hook, raw=raw)
+    if with_best5:
+        receiver.set_best5_hook(probe.best5_hook)
+    if probes:
+        receiver.set_probes()
+
+    # 直接建立 COM 元件與訂閱, 略過登入流程
+    sinks = receiver.create_com_objects() # pylint: disable=unused-variable
+    probe.wrap(receiver, 'OnNotifyTicksLONG')
+    receiver.request_ticks()
+    sim.pump()
+
+    # 暖機, 讓個股資料快取就緒
+    await drive(sim, symbols * 10)
+    probe.latency = array.array('q')
+
+    events = ticks * (2 if with_best5 else 1)
+
+    # 記憶體配置
+    alloc_ticks = min(ticks, 20000)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    (base, _) = tracemalloc.get_traced_memory()
+    blocks_before = sys.getallocatedblocks()
+    await drive(sim, alloc_ticks)
+    blocks_after = sys.getallocatedblocks()
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    probe.latency = array.array('q')
+    if probes:
+        receiver.probe.reset()
+
+    # 速度與延遲
+    begin = time.perf_counter()
+    await drive(sim, ticks)
+    elapsed = time.perf_counter() - begin
+
+    samples = sorted(probe.latency)
+    result = {
+        'scenario': name,
+        'ticks': ticks,
+        'events': events,
+        'symbols': symbols,
+        'elapsed_sec': elapsed,
+        'ticks_per_sec': ticks / elapsed,
+        'events_per_sec': events / elapsed,
+        'latency_us': {
+            'p50': percentile(samples, 0.5) / 1000,
+            'p99': percentile(samples, 0.99) / 1000,
+            'p999': percentile(samples, 0.999) / 1000,
+            'max': samples[-1] / 1000 if samples else 0
+        },
+        'delivered': len(samples),
+        'peak_rss_kb': peak_rss_kb(),
+        'retained_blocks_per_event': (blocks_after - blocks_before) / alloc_ticks,
+        'transient_bytes_per_event': (peak - base) / (CHUNK * (events // ticks))
+    }
+    if probes:
+        result['stages'] = receiver.get_probe_stats()
+    return result
+
+def main():
+    """ main() """
+    parser = argparse.ArgumentParser(description='聽牌機端對端效能測試')
+    parser.add_argument('--ticks', type=int, default=200000, help='每個情境的 ticks 數量')
+    parser.add_argument('--symbols', type=int, default=50, help='模擬股票數量')
+    parser.add_argument('--scenario', action='append', help='只執行指定情境, 可重複指定')
+    parser.add_argument('--probes', action='store_true', help='啟用熱路徑計時探針, 輸出各階段統計')
+    parser.add_argument('--output', help='結果輸出檔案, 省略時輸出到 stdout')
+    args = parser.parse_args()
+
+    results = []
+    for (name, use_async, with_best5, raw) in SCENARIOS:
+        if args.scenario and name not in args.scenario:
+            continue
+        result = asyncio.run(run_scenario(
+            name, use_async, with_best5, raw, args.ticks, args.symbols, args.probes
+        ))
+        results.append(result)
+        print('%-18s %10.0f ticks/s  p50 %7.1fus  p99 %7.1fus  p999 %7.1fus' % (
+            name,
+            result['ticks_per_sec'],
+            result['latency_us']['p50'],
+            result['latency_us']['p99'],
+            result['latency_us']['p999']
+        ), file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            out.write(text)
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
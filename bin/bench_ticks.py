@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#
+# 比較 ticks hook 兩種格式經過 OnNotifyTicksLONG 的記憶體配置數量:
+#   python bin/bench_ticks.py [筆數]
+#
+# * dict: 舊版 hook 格式, 每筆 tick 建立 8 個鍵值的 dict
+# * raw: set_ticks_hook(..., raw=True), 每筆 tick 建立一個 TickRecord
+#
+# 使用 skcom.simulator 取代 COM 元件, hook 保留每筆收到的資料,
+# 統計結果為每筆 tick 處理後仍存活的記憶體區塊數與位元組數
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from skcom.simulator import SkcomSimulator
+from skcom.stockmeta import StockMeta
+
+def measure(sim, name, raw, count):
+    """ 統計每筆 tick 的記憶體配置區塊數與位元組數 """
+    receiver = sim.create_receiver()
+    keep = [None] * count
+    pos = 0
+
+    def hook(entry):
+        nonlocal pos
+        keep[pos] = entry
+        pos += 1
+
+    receiver.set_ticks_hook(hook, raw=raw)
+    receiver.stock_meta.put(StockMeta(1, 0, '2330', '台積電', 2))
+    on_ticks = receiver.OnNotifyTicksLONG
+
+    def feed(first):
+        for i in range(first, first + count):
+            on_ticks(1, 0, i, 20220113, 90000 + i % 60, i % 1000000,
+                     60000, 60100, 60000 + i % 3, 1, 0)
+
+    # 預熱並計時, 讓每日時間基準與個股資料進入快取; tracemalloc 會拖慢速度, 分開量測
+    begin = time.perf_counter()
+    feed(0)
+    elapsed = time.perf_counter() - begin
+    warm = keep
+    keep = [None] * count
+    pos = 0
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    feed(count)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del warm
+
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    print('%-5s %8.2f blocks/tick %8.1f bytes/tick %8.0f ns/tick' % (
+        name, blocks / count, size / count, elapsed * 1e9 / count
+    ))
+
+def main():
+    """ main() """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sim = SkcomSimulator(symbols=1)
+    sim.install()
+    measure(sim, 'dict', False, count)
+    measure(sim, 'raw', True, count)
+
+if __name__ == '__main__':
+    main()
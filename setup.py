@@ -42,5 +42,9 @@ setup(
         'skcom': ['conf/*', 'samples/*', 'tools/*']
     },
     install_requires=requiredPkgs,
+    extras_require={
+        'numpy': ['numpy >= 1.17'],
+        'pandas': ['numpy >= 1.17', 'pandas']
+    },
     python_requires='>=3.7'
 )
@@ -4,9 +4,9 @@
 
 import asyncio
 import enum
+import importlib
 import json
 import logging
-import math
 import os
 import os.path
 import signal
@@ -16,23 +16,49 @@ import time
 import types
 from datetime import datetime, timedelta
 
-import pythoncom
-import comtypes.client
-import comtypes.gen.SKCOMLib as sk
-from comtypes import COMError
-
 from skcom.helper import load_config
 from skcom.exception import ConfigException
+from skcom.stockmeta import StockMetaCache, fix_encoding
+from skcom.record import TickRecord, Best5Book, tick_timestamp, tick_dict
+from skcom.batch import TickBatcher, Best5Conflator
+from skcom.ringbuf import TickRingStore
+from skcom.pump import AdaptivePump
+from skcom.comthread import ComThread, EventHandoff
+from skcom.inflight import HookGate, HookPolicy, HOOK_KINDS
+from skcom.journal import JournalWriter
+from skcom.probe import HotPathProbe
+from skcom.metrics import LatencyHistogram
+from skcom.exporter import MetricsExporter
+from skcom.subscribe import SubscriptionManager
+from skcom.tickgap import MissingTicks
+from skcom.klinestore import KLineStore
+from skcom.klinetrack import KLineTracker
+from skcom.klinearray import KLineColumns, dates_to_int
+from skcom.npcompat import require_numpy
+from skcom.klinestore import date_to_int
+from skcom.tradecal import TradingCalendar, int_to_day, day_to_int
+from skcom.bars import BarBuilder, parse_interval
 
 logger = logging.getLogger('skcom')
 
-def fix_encoding(thestr):
-    # TODO: 股票名稱的編碼可能會被 Python 的參數影響, 需要測試一下
-    # 換了 Python 版本以後, 這樣才能取得正確中文字
-    newstr = bytes(map(ord, thestr)).decode('cp950')
-    # 原本這樣就可以
-    # newstr = thestr
-    return newstr
+# COM 相關模組在建立 COM 元件之前才載入, 以日誌重播時不需要 pythoncom 與 comtypes
+# pylint: disable=invalid-name
+pythoncom = None
+comtypes = None
+sk = None
+COMError = None
+# pylint: enable=invalid-name
+
+def load_com_modules():
+    """ 載入 pythoncom 與 comtypes, 已載入 (或已由 skcom.simulator 取代) 時略過 """
+    global pythoncom, comtypes, sk, COMError # pylint: disable=global-statement, invalid-name
+    if pythoncom is not None:
+        return
+    pythoncom = importlib.import_module('pythoncom')
+    importlib.import_module('comtypes.client')
+    comtypes = importlib.import_module('comtypes')
+    sk = importlib.import_module('comtypes.gen.SKCOMLib')
+    COMError = comtypes.COMError
 
 class ReceiverState(enum.Enum):
     """ 非同步聽牌機生命週期狀態 """
@@ -71,8 +97,8 @@ class AsyncQuoteReceiver():
         self.skr = None # 回報 API
 
         # 接收器設定屬性
-        self.dst_conf = os.path.expanduser(r'~\.skcom\skcom.yaml')
-        self.log_path = os.path.expanduser(r'~\.skcom\logs\capital')
+        self.dst_conf = os.path.join(os.path.expanduser('~'), '.skcom', 'skcom.yaml')
+        self.log_path = os.path.join(os.path.expanduser('~'), '.skcom', 'logs', 'capital')
 
         # 供 request() 等待連線就緒或失敗的是件
         self.monitor_event = None
@@ -83,26 +109,113 @@ class AsyncQuoteReceiver():
         # 連線重試次數
         self.retry_count = 0
 
+        # COM 事件推送, pump_ctl 為 None 時固定間隔 DELAY_PUMP
+        self.pump_ctl = None
+        self.event_count = 0
+        # 推送狀況, pump() 每一輪更新, 供監控指標使用
+        self.pump_cycle_time = LatencyHistogram()
+        self.pump_lag = 0.0
+        self.last_event_time = None
+
+        # 獨立 COM 執行緒模式, com_thread 為 None 時與 asyncio 共用執行緒
+        self.com_thread_conf = None
+        self.com_thread = None
+        self.loop = None
+        self.ticks_handoff = None
+        self.best5_handoff = None
+
+        # coroutine hook 同時執行數量限制, 依事件類型 ticks/ticks_batch/best5/kline/bar 設定
+        self.hook_gates = {}
+        # 沒有數量限制的事件類型, 執行中的 coroutine hook 數量
+        self.hook_inflight = dict.fromkeys(HOOK_KINDS, 0)
+
         # Ticks 處理用屬性
         self.ticks_hook = None
         self.ticks_total = {}
+        self.ticks_count = {}
+        # 每檔股票最後處理的 nPtr, 重新連線後重複的回補 ticks 以此略過
+        self.ticks_ptr = {}
+        self.ticks_duplicates = 0
+        self.duplicates_mark = 0
+        self.sessions = 0
+        self.reconnect_duplicates = []
+        # nPtr 缺漏偵測與回補
+        self.ticks_missing = {}
+        self.ticks_gaps = 0
+        self.ticks_gap_missing = 0
+        self.ticks_recovered = 0
+        self.gap_hook = None
+        self.gap_recover = False
+        self.gap_max_recover = 1000
         self.ticks_include_history = False
+        self.ticks_raw = False
+        self.ticks_batch_hook = None
+        self.ticks_batcher = None
+        self.ticks_buffer = None
+
+        # 盤中 K 棒處理用屬性
+        self.bar_hook = None
+        self.bar_builder = None
+        self.bars_ptr = {}    # 已寫入 K 棒的最後一筆回補 tick nPtr, 與日期合併比較
+        # ticks 訂閱分頁
+        self.subscriptions = SubscriptionManager()
+        # 建立撮合資料的函數, 啟用探針時替換為計時版本
+        # 只有舊版 dict 格式的 hook 時直接建立 dict, 不經過 TickRecord
+        self.ticks_legacy = True
+        self.tick_factory = tick_dict
 
         # 日 K 處理用屬性
         self.kline_hook = None
         self.stock_name = {}
         self.daily_kline = {}
         self.kline_days_limit = 20
-        self.kline_last_mtime = 0
+        self.kline_history_start = 19900101  # kline_days_limit 為 0 時的開始日
+        self.kline_store = None
+        # 每檔股票的日 K 接收進度
+        self.kline_tracker = None
+        self.kline_quiet_ms = 300
+        self.kline_wait_ms = 5000
+        self.kline_ready = None
+        # 日 K 以原始字串暫存, 收齊後一次轉換為 NumPy 陣列
+        self.kline_columnar = False
+        # 交易日曆, 由收到的日 K 學習, 寫入 ~/.skcom/calendar.txt 供下次啟動使用
+        self.calendar = TradingCalendar(
+            os.path.join(os.path.expanduser('~'), '.skcom', 'calendar.txt')
+        )
+        # 使用完整請求區間的股票, 收到的日 K 不足 kline_days_limit 時再往前請求一次
+        self.kline_short = {}
+        self.kline_retried = set()
 
         # 最佳五檔處理用屬性
         self.best5_hook = None
+        self.best5_raw = False
+        self.best5_conflator = None
+        self.best5_books = {}
+
+        # ticks 與五檔的二進位日誌
+        self.journal = None
+
+        # 熱路徑計時探針
+        self.probe = None
+
+        # Prometheus 監控指標服務
+        self.metrics_conf = None
+        self.metrics_exporter = None
+
+        # 個股基本資料快取, 減少 GetStockByIndexLONG 呼叫次數
+        self.stock_meta = StockMetaCache(self.load_stock_meta)
 
         # 產生 log 目錄
         if not os.path.isdir(self.log_path):
             os.makedirs(self.log_path)
 
-        # 載入 yaml 設定
+        # yaml 設定在 root_task() 開始時才載入, 以日誌重播時不需要設定檔
+        self.config = None
+
+    def ensure_config(self):
+        """ 載入 yaml 設定, 無法載入時結束程式 """
+        if self.config is not None:
+            return
         try:
             self.config = load_config()
         except ConfigException as ex:
@@ -114,19 +227,301 @@ class AsyncQuoteReceiver():
         """ 使用 asyncio 啟動非同步聽牌作業 """
         asyncio.run(self.root_task())
 
-    def set_kline_hook(self, hook, days_limit=20):
-        """ 設定日 K 回傳函數 """
+    def set_pump_mode(self, budget_ms=20, idle_ms=None):
+        """
+        設定低延遲 COM 事件推送模式
+
+        有事件時推送間隔縮短到 budget_ms 以內, 沒有事件時逐步退避到 idle_ms,
+        idle_ms 省略時使用 DELAY_PUMP
+        """
+        if idle_ms is None:
+            idle_ms = self.DELAY_PUMP * 1000
+        self.pump_ctl = AdaptivePump(
+            lambda: pythoncom.PumpWaitingMessages(),  # pylint: disable=unnecessary-lambda
+            lambda: self.event_count,
+            budget_ms,
+            idle_ms
+        )
+
+    def set_com_thread(self, queue_size=65536, interval_ms=5):
+        """
+        在獨立的 STA 執行緒上建立 COM 元件與推送事件
+
+        ticks 與最佳五檔在 COM 執行緒上解碼後, 經由上限 queue_size 的佇列交給
+        asyncio event loop 呼叫 hook, hook 執行太久不會卡住 COM 事件推送
+        """
+        self.com_thread_conf = (queue_size, interval_ms)
+
+    def set_hook_limit(self, kind, limit, policy=HookPolicy.BLOCK, backlog=None):
+        """
+        限制 coroutine hook 同時執行的數量
+
+        kind 為 ticks, ticks_batch, best5, kline 或 bar, 達到 limit 時依照 policy 處理:
+
+        * BLOCK: 暫停推送 COM 事件 (獨立 COM 執行緒模式暫停 COM 執行緒), 直到 hook 消化到上限以內
+        * DROP_OLDEST: 丟棄等待中最舊的事件
+        * DROP_NEWEST: 丟棄新事件
+        * CONFLATE: 同一檔股票只保留最新的等待事件, ticks_batch 只保留最新一批
+
+        等待中的事件最多 backlog 筆 (預設 1024), 超過時丟棄最舊的
+        """
+        if kind not in HOOK_KINDS:
+            raise ValueError('無法識別的事件類型: %s' % kind)
+        self.hook_gates[kind] = HookGate(kind, limit, policy, backlog)
+
+    def set_journal(self, directory=None, commit_ms=200, fsync=True):
+        """
+        將收到的 ticks, 回補 ticks 與最佳五檔記錄為二進位日誌
+
+        由背景執行緒每 commit_ms 毫秒批次寫入並 fsync, 每天一個檔案,
+        directory 省略時使用 ~/.skcom/journal
+        """
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'), '.skcom', 'journal')
+        self.journal = JournalWriter(directory, commit_ms, fsync)
+        # 個股基本資料也寫進日誌, 重播時不需要 COM 元件
+        self.stock_meta.listener = lambda meta: self.journal.write_meta(
+            meta.market_no, meta.index, meta.stock_no, meta.name, meta.decimal
+        )
+
+    def set_probes(self, enabled=True):
+        """
+        啟用或停用熱路徑計時探針
+
+        啟用時把 COM 事件處理函數, 個股資料查詢, 紀錄建立, hook 呼叫替換成計時版本,
+        停用時還原成原本的函數, 不會在每筆事件檢查開關;
+        必須在 start() 之前設定, 統計結果以 get_probe_stats() 取得
+        """
+        # 還原成類別上的原始函數
+        for name in ['OnNotifyTicksLONG', 'OnNotifyHistoryTicksLONG', 'OnNotifyBest5LONG',
+                     'update_best5_book', 'deliver_tick', 'emit_best5',
+                     'handle_ticks_batch', 'await_coroutine']:
+            self.__dict__.pop(name, None)
+        self.stock_meta.__dict__.pop('get', None)
+        for gate in self.hook_gates.values():
+            gate.wrap = None
+        self.probe = None
+        if not enabled:
+            self.update_tick_factory()
+            return
+
+        probe = HotPathProbe()
+        self.probe = probe
+        self.OnNotifyTicksLONG = probe.wrap_callback('ticks', self.OnNotifyTicksLONG)
+        self.OnNotifyHistoryTicksLONG = probe.wrap_callback(
+            'history', self.OnNotifyHistoryTicksLONG
+        )
+        self.OnNotifyBest5LONG = probe.wrap_callback('best5', self.OnNotifyBest5LONG)
+        self.stock_meta.get = probe.wrap_stage('meta', self.stock_meta.get)
+        self.update_tick_factory()
+        self.update_best5_book = probe.wrap_stage('record', self.update_best5_book)
+        self.deliver_tick = probe.wrap_dispatch('ticks', self.deliver_tick)
+        self.emit_best5 = probe.wrap_dispatch('best5', self.emit_best5)
+        self.handle_ticks_batch = probe.wrap_dispatch('ticks_batch', self.handle_ticks_batch)
+
+        await_coroutine = self.await_coroutine
+        def probed_await(retv, kind=None, key=None):
+            if isinstance(retv, types.CoroutineType):
+                gate = self.hook_gates.get(kind)
+                if gate is None:
+                    retv = probe.complete(retv, kind)
+                elif gate.wrap is None:
+                    # 有數量限制時, 等到建立 task 才包裝, 被丟棄的 coroutine 不列入統計
+                    gate.wrap = lambda coro: probe.complete(coro, kind)
+            await_coroutine(retv, kind, key)
+        self.await_coroutine = probed_await
+
+    def update_tick_factory(self):
+        """
+        依照 ticks 的使用方式選擇撮合資料格式
+
+        raw 模式, 撮合批次與環狀緩衝區需要 TickRecord, 其餘情況直接建立舊版 dict
+        """
+        self.ticks_legacy = not self.ticks_raw and self.ticks_batcher is None and \
+            self.ticks_buffer is None
+        factory = tick_dict if self.ticks_legacy else TickRecord
+        if self.probe is not None:
+            factory = self.probe.wrap_stage('record', factory)
+        self.tick_factory = factory
+
+    def get_probe_stats(self, kind=None):
+        """
+        取得熱路徑計時統計, 格式為 {事件類型: {階段: 直方圖摘要}}
+
+        kind 有指定時只回傳該事件類型, 探針未啟用時回傳 None
+        """
+        if self.probe is None:
+            return None
+        return self.probe.summary(kind)
+
+    def set_metrics_server(self, port=9150, host='127.0.0.1'):
+        """
+        在 event loop 上啟動 Prometheus 監控指標服務 http://host:port/metrics
+
+        包含個股 ticks 數量, 五檔更新數量, hook 佇列深度, 推送時間, 生命週期狀態,
+        重試次數與最後一次收到事件的時間, 數值在抓取時才計算
+        """
+        self.metrics_conf = (host, port)
+
+    def set_kline_hook(self, hook, days_limit=20, quiet_ms=300, wait_ms=5000, columnar=False):
+        """
+        設定日 K 回傳函數
+
+        每檔股票的日 K 收齊後立即發送, 收到請求區間最後一個交易日即視為完整,
+        否則在最後一筆之後 quiet_ms 毫秒沒有新資料, 或請求後 wait_ms 毫秒都沒有資料時發送
+
+        columnar=True 時 (需要 numpy) 收到的字串先暫存, 收齊後一次解析,
+        hook 收到 KLineColumns, 適合 days_limit=0 取得完整歷史的情況
+        """
+        # pylint: disable=too-many-arguments
+        if columnar:
+            require_numpy()
         self.kline_days_limit = days_limit
         self.kline_hook = hook
-
-    def set_ticks_hook(self, hook, include_history=False):
-        """ 設定撮合回傳函數 """
+        self.kline_quiet_ms = quiet_ms
+        self.kline_wait_ms = wait_ms
+        self.kline_columnar = columnar
+
+    def new_kline_buffer(self, stock_no, name):
+        """ 個股日 K 接收緩衝區 """
+        buffer = {
+            'id': stock_no,
+            'name': name,
+            'quotes': []
+        }
+        if self.kline_columnar:
+            buffer['lines'] = []
+        return buffer
+
+    def set_kline_store(self, directory=None):
+        """
+        啟用日 K 本機資料庫
+
+        啟動時只請求最後一筆已儲存日 K 之後的日期, 合併寫入後由本機資料提供 kline_hook,
+        directory 省略時使用 ~/.skcom/kline
+        """
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'), '.skcom', 'kline')
+        self.kline_store = KLineStore(directory)
+
+    def set_trading_calendar(self, path=None):
+        """
+        變更本機交易日曆檔
+
+        預設使用 ~/.skcom/calendar.txt, 啟動時載入, 收到日 K 學到新的交易日後寫回,
+        檔案中可以用 "YYYYMMDD closed" 預先登記休市日
+        """
+        if path is None:
+            path = os.path.join(os.path.expanduser('~'), '.skcom', 'calendar.txt')
+        self.calendar = TradingCalendar(path)
+
+    def set_ticks_hook(self, hook, include_history=False, raw=False):
+        """
+        設定撮合回傳函數
+
+        raw=True 時 hook 收到 TickRecord, 省去每筆 tick 建立 dict 的成本,
+        需要舊格式可呼叫 TickRecord.as_dict(); 沒有使用 raw 模式時 hook 收到舊版 dict
+        """
         self.ticks_hook = hook
         self.ticks_include_history = include_history
+        self.ticks_raw = raw
+        self.update_tick_factory()
     
-    def set_best5_hook(self, hook):
-        """ 設定最佳五檔回傳函數 """
+    def set_ticks_pages(self, symbols_per_page=None):
+        """
+        設定每個 psPageNo 訂閱的股票數量
+
+        symbols_per_page 為 None 時依股票數量自動調整, 50 檔以內每個 page 一檔,
+        超過 50 檔時平均分散到 50 個 page
+        """
+        self.subscriptions = SubscriptionManager(symbols_per_page)
+
+    def get_page_stats(self):
+        """ 取得每個 psPageNo 的股票數量與事件數量 """
+        return self.subscriptions.page_stats(self.ticks_count, self.best5_books)
+
+    def set_ticks_batch_hook(self, hook, max_batch=500, max_delay_ms=100, include_history=False):
+        """
+        設定撮合批次回傳函數
+
+        hook 收到 TickRecord 的 list, 一次 PumpWaitingMessages() 期間收到的 ticks
+        會合併成一批, 超過 max_batch 筆或 max_delay_ms 毫秒時提前送出
+        """
+        self.ticks_batch_hook = hook
+        self.ticks_batcher = TickBatcher(max_batch, max_delay_ms)
+        self.update_tick_factory()
+        self.ticks_include_history = include_history
+
+    def set_gap_hook(self, hook=None, recover=False, max_recover=1000):
+        """
+        設定 ticks 缺漏回傳函數
+
+        同一檔股票的 nPtr 不連續時, hook 收到 dict:
+        {'id': 股票代碼, 'name': 股票名稱, 'first': 第一個缺漏 nPtr, 'last': 最後一個缺漏 nPtr, 'missing': 筆數}
+
+        recover=True 時以 SKQuoteLib_GetTickLONG 只補抓缺漏的 ticks, 不需要重新連線,
+        補回的 ticks 晚於後續 ticks 送給 hook, 成交量 vol 為補回當下的累計總量,
+        ticks 環狀緩衝區則依時間順序插入;
+        超過 max_recover 筆的缺漏只通報不補抓, 缺漏的 nPtr 仍會保留給重新連線的回補 ticks 補上
+        """
+        self.gap_hook = hook
+        self.gap_recover = recover
+        self.gap_max_recover = max_recover
+
+    def set_bar_hook(self, hook, intervals=('1m',), session=(90000, 133000)):
+        """
+        設定盤中 K 棒回傳函數
+
+        由 ticks 合成 intervals 指定週期的 K 棒, 週期可以是 '1m', '5m', '15m', '30s'
+        或秒數, 每根 K 棒收盤時 hook 收到 Bar; 回補 ticks 一律列入計算,
+        ticks hook 不包含回補 ticks 時, 回補 ticks 不影響 ticks hook 收到的總量,
+        重新連線或重新啟動後重建的 K 棒與即時合成的結果相同,
+        盤中的 K 棒使用 get_bars() 取得
+        """
+        self.bar_hook = hook
+        self.bar_builder = BarBuilder(
+            [parse_interval(interval) for interval in intervals], self.emit_bar, session
+        )
+
+    def get_bars(self, stock_no, interval='1m'):
+        """ 取得個股指定週期的 BarSeries, 尚未啟用或沒有資料時回傳 None """
+        if self.bar_builder is None:
+            return None
+        return self.bar_builder.get(stock_no, parse_interval(interval))
+
+    def set_ticks_buffer(self, capacity=65536):
+        """
+        啟用個股 ticks 環狀緩衝區 (需要 numpy)
+
+        每檔股票保留最後 capacity 筆, 使用 get_ticks_buffer() 取得;
+        緩衝區隨成交筆數加倍成長, 每檔股票最多使用 capacity * 96 bytes
+        """
+        self.ticks_buffer = TickRingStore(capacity)
+        self.update_tick_factory()
+
+    def get_ticks_buffer(self, stock_no):
+        """ 取得個股 ticks 環狀緩衝區, 尚未啟用或沒有資料時回傳 None """
+        if self.ticks_buffer is None:
+            return None
+        return self.ticks_buffer.get(stock_no)
+
+    def get_best5_book(self, stock_no):
+        """ 取得個股最佳五檔快照, 尚未收到資料時回傳 None """
+        return self.best5_books.get(stock_no)
+
+    def set_best5_hook(self, hook, conflate_ms=None, raw=False):
+        """
+        設定最佳五檔回傳函數
+
+        * conflate_ms: 每檔股票只保留最新的五檔, 每 conflate_ms 毫秒送出一次
+        * raw: hook 收到 Best5Book 唯讀快照, 需要舊格式可呼叫 Best5Book.as_dict()
+        """
         self.best5_hook = hook
+        self.best5_raw = raw
+        if conflate_ms is not None:
+            self.best5_conflator = Best5Conflator(conflate_ms)
+        else:
+            self.best5_conflator = None
 
     def ctrl_c(self, sig, frm):
         """ Ctrl+C 處理 """
@@ -141,42 +536,137 @@ class AsyncQuoteReceiver():
         # 接收 Ctrl+C
         signal.signal(signal.SIGINT, self.ctrl_c)
 
-        # 載入 COM 元件
+        self.ensure_config()
         try:
-            self.skr = comtypes.client.CreateObject(sk.SKReplyLib, interface=sk.ISKReplyLib)
-            skh0 = comtypes.client.GetEvents(self.skr, self)
-            self.skc = comtypes.client.CreateObject(sk.SKCenterLib, interface=sk.ISKCenterLib)
-            self.skc.SKCenterLib_SetLogPath(self.log_path)
-            self.skq = comtypes.client.CreateObject(sk.SKQuoteLib, interface=sk.ISKQuoteLib)
-            skh1 = comtypes.client.GetEvents(self.skq, self)
-        except COMError as ex:
-            logger.error('init() 發生不預期狀況')
-            logger.error(ex)
+            load_com_modules()
+        except ImportError as ex:
+            logger.error('尚未生成 SKCOMLib.py 請先執行一次 python -m skcom.tools.setup')
+            logger.error('例外訊息: %s', ex)
+            sys.exit(1)
+
+        if self.journal is not None:
+            self.journal.start()
+
+        if self.metrics_conf is not None:
+            (host, port) = self.metrics_conf
+            self.metrics_exporter = MetricsExporter(self, host, port)
+            await self.metrics_exporter.start()
+
+        # 載入 COM 元件
+        # 注意: GetEvents() 的回傳值必須保留到結束, 否則會收不到事件
+        if self.com_thread_conf is not None:
+            self.start_com_thread()
+        else:
+            sinks = self.create_com_objects() # pylint: disable=unused-variable
 
         # 啟動與重試聽牌作業
         while self.state in [ReceiverState.IDLE, ReceiverState.RETRY]:
             if self.state is ReceiverState.RETRY:
                 logger.debug('root_task(): retry_count=%d', self.retry_count)
+                self.stock_meta.clear()
                 self.change_state(ReceiverState.IDLE)
             
             await asyncio.gather(
                 self.pump(),    # 更新 COM 事件
                 self.request(), # 處理請求
                 self.connect(), # 連線
+                self.flush_best5(), # 送出合併後的最佳五檔
             )
 
+        if self.com_thread is not None:
+            self.com_thread.stop()
+        if self.journal is not None:
+            self.journal.stop()
+            logger.debug('root_task(): 日誌 %s', self.journal.summary())
+        if self.metrics_exporter is not None:
+            await self.metrics_exporter.stop()
         self.change_state(ReceiverState.STOP_DONE)
         logger.debug('root_task(): done')
         sys.stdout.flush()
 
+    def create_com_objects(self):
+        """ 建立 COM 元件, 回傳必須保留的事件接收器 """
+        load_com_modules()
+        try:
+            self.skr = comtypes.client.CreateObject(sk.SKReplyLib, interface=sk.ISKReplyLib)
+            skh0 = comtypes.client.GetEvents(self.skr, self)
+            self.skc = comtypes.client.CreateObject(sk.SKCenterLib, interface=sk.ISKCenterLib)
+            self.skc.SKCenterLib_SetLogPath(self.log_path)
+            self.skq = comtypes.client.CreateObject(sk.SKQuoteLib, interface=sk.ISKQuoteLib)
+            skh1 = comtypes.client.GetEvents(self.skq, self)
+            return (skh0, skh1)
+        except COMError as ex:
+            logger.error('init() 發生不預期狀況')
+            logger.error(ex)
+        return None
+
+    def start_com_thread(self):
+        """ 啟動 COM 執行緒與事件交接佇列 """
+        (queue_size, interval_ms) = self.com_thread_conf
+        self.loop = asyncio.get_running_loop()
+        self.ticks_handoff = EventHandoff(
+            self.loop, self.deliver_tick, queue_size, self.flush_ticks_batch
+        )
+        self.best5_handoff = EventHandoff(self.loop, self.handoff_best5, queue_size)
+        self.com_thread = ComThread(
+            self.create_com_objects,
+            pythoncom.PumpWaitingMessages,
+            interval_ms,
+            pythoncom.CoInitialize,
+            pythoncom.CoUninitialize
+        )
+        self.com_thread.start_and_wait()
+        # BLOCK 模式的 hook 消化完之前, COM 執行緒暫停推送事件
+        for gate in self.hook_gates.values():
+            if gate.policy is HookPolicy.BLOCK:
+                gate.notify = self.update_com_pumping
+
+    def update_com_pumping(self, ready):
+        """ BLOCK 模式的 hook 閘門狀態改變, 所有閘門都可以繼續時才恢復 COM 執行緒推送 """
+        if not ready:
+            self.com_thread.pause()
+            return
+        for gate in self.hook_gates.values():
+            if gate.policy is HookPolicy.BLOCK and not gate.is_ready():
+                return
+        self.com_thread.resume()
+
+    def com_call(self, func, *args):
+        """ 呼叫 COM 元件方法, 獨立 COM 執行緒模式會轉交給 COM 執行緒執行 """
+        if self.com_thread is None:
+            return func(*args)
+        return self.com_thread.call(func, *args)
+
     async def pump(self):
         """ 推送 COM 元件事件 """
         logger.debug('pump(): begin')
 
         prev = time.time()
+        seen = self.event_count
         while self.state not in [ReceiverState.RETRY, ReceiverState.STOP]:
-            pythoncom.PumpWaitingMessages()
-            await asyncio.sleep(self.DELAY_PUMP)
+            # BLOCK 模式的 hook 消化完之前暫停推送
+            for gate in self.hook_gates.values():
+                if gate.policy is HookPolicy.BLOCK:
+                    await gate.wait_ready()
+
+            begin = time.monotonic()
+            if self.com_thread is not None:
+                # COM 事件由 COM 執行緒推送, 這裡只負責定期送出批次
+                delay = self.DELAY_PUMP
+            elif self.pump_ctl is not None:
+                delay = self.pump_ctl.cycle()
+            else:
+                pythoncom.PumpWaitingMessages()
+                delay = self.DELAY_PUMP
+            self.flush_ticks_batch()
+            end = time.monotonic()
+            self.pump_cycle_time.add(end - begin)
+            # 最後收到事件的時間以每輪推送為單位, 不在每筆事件取時間
+            if self.event_count != seen:
+                seen = self.event_count
+                self.last_event_time = end
+            await asyncio.sleep(delay)
+            self.pump_lag = max(0.0, time.monotonic() - end - delay)
             interval = time.time() - prev
             if interval > self.FLUSH_INTERVAL:
                 logger.debug('pump(): flush stdout')
@@ -185,6 +675,16 @@ class AsyncQuoteReceiver():
 
         logger.debug('pump(): done')
 
+    async def flush_best5(self):
+        """ 定期送出合併後的最佳五檔 """
+        if self.best5_conflator is None:
+            return
+
+        while self.state not in [ReceiverState.RETRY, ReceiverState.STOP]:
+            await asyncio.sleep(self.best5_conflator.interval)
+            for record in self.best5_conflator.flush():
+                self.emit_best5(record)
+
     async def connect(self):
         """ 建立連線 """
         logger.debug('connect(): begin')
@@ -192,7 +692,11 @@ class AsyncQuoteReceiver():
         # 登入
         # 注意! 錯誤碼 2003 表示已登入, 這種情況也要放行
         self.change_state(ReceiverState.LOGIN)
-        n_code = self.skc.SKCenterLib_Login(self.config['account'], self.config['password'])
+        n_code = self.com_call(
+            self.skc.SKCenterLib_Login,
+            self.config['account'],
+            self.config['password']
+        )
         if n_code not in [0, 2003]:
             self.change_state(ReceiverState.LOGIN_FAILED)
             self.handle_sk_error('Login()', n_code)
@@ -206,7 +710,7 @@ class AsyncQuoteReceiver():
         # 啟動監聽器的作業細節
         def target():
             self.change_state(ReceiverState.MONITOR)
-            n_code = self.skq.SKQuoteLib_EnterMonitorLONG()
+            n_code = self.com_call(self.skq.SKQuoteLib_EnterMonitorLONG)
             if n_code != 0:
                 self.change_state(ReceiverState.MONITOR_FAILED)
                 self.monitor_event.set()
@@ -266,10 +770,36 @@ class AsyncQuoteReceiver():
 
         if self.state == ReceiverState.MONITOR_DONE:
             logger.debug('stop(): Leave monitor')
-            n_code = self.skq.SKQuoteLib_LeaveMonitor()
+            n_code = self.com_call(self.skq.SKQuoteLib_LeaveMonitor)
             if n_code != 0:
                 self.handle_sk_error('LeaveMonitor()', n_code)
 
+        self.report_duplicates()
+        if self.ticks_gaps > 0:
+            logger.info(
+                'stop(): Ticks 缺漏 %d 次共 %d 筆, 補回 %d 筆',
+                self.ticks_gaps, self.ticks_gap_missing, self.ticks_recovered
+            )
+        logger.debug('stop(): 個股資料快取 %s', self.stock_meta.stats())
+        if self.kline_store is not None:
+            logger.debug('stop(): 日 K 資料庫 %s', self.kline_store.summary())
+        if self.kline_tracker is not None:
+            logger.debug('stop(): 日 K 接收 %s', self.kline_tracker.summary())
+        if self.bar_builder is not None:
+            logger.debug('stop(): 盤中 K 棒 %s', self.bar_builder.summary())
+        if self.ticks_batcher is not None:
+            logger.debug('stop(): 撮合批次 %s', self.ticks_batcher.stats.summary())
+        if self.pump_ctl is not None:
+            logger.debug('stop(): 事件推送 %s', self.pump_ctl.summary())
+        if self.best5_conflator is not None:
+            logger.debug('stop(): 五檔合併 %s', self.best5_conflator.summary())
+        for gate in self.hook_gates.values():
+            logger.debug('stop(): %s hook %s', gate.name, gate.summary())
+        if self.com_thread is not None:
+            logger.debug('stop(): ticks 交接 %s', self.ticks_handoff.summary())
+            logger.debug('stop(): 五檔交接 %s', self.best5_handoff.summary())
+        if self.probe is not None:
+            logger.debug('stop(): 計時探針 %s', self.probe.summary())
         self.monitor_event.set()
         self.change_state(ReceiverState.STOP)
 
@@ -288,56 +818,149 @@ class AsyncQuoteReceiver():
     
     def request_ticks(self):
         """ 請求 Ticks """
-        if len(self.config['products']) > 50:
-            # 發生這個問題不阻斷使用, 讓其他功能維持正常運作
-            logger.warning('Ticks 最多只能監聽 50 檔')
-        else:
-            for stock_no in self.config['products']:
-                # 參考文件: 4-4-6 (p.186)
-                # 1. 這裡的回傳值是個 list [pageNo, nCode], 與官方文件不符
-                # 2. 參數 psPageNo 在官方文件上表示一個 pn 只能對應一檔股票, 但實測發現可以一對多,
-                #    因為這樣, 實際上可能可以突破只能聽 50 檔的限制, 不過暫時先照文件友善使用 API
-                # 3. 參數 psPageNo 指定 -1 會自動分配 page, page 介於 0-49, 與 stock page 不同
-                # 4. 參數 psPageNo 指定 50 會取消報價
-                (page_no, n_code) = self.skq.SKQuoteLib_RequestTicks(-1, stock_no) # pylint: disable=unused-variable
-                if n_code != 0:
-                    self.handle_sk_error('RequestTicks()', n_code)
+        for (page_no, stock_no) in self.subscriptions.plan(self.config['products']):
+            # 參考文件: 4-4-6 (p.186)
+            # 1. 這裡的回傳值是個 list [pageNo, nCode], 與官方文件不符
+            # 2. 參數 psPageNo 在官方文件上表示一個 pn 只能對應一檔股票, 但實測發現可以一對多,
+            #    因此超過 50 檔時由 SubscriptionManager 把多檔股票分配到同一個 page
+            # 3. 參數 psPageNo 指定 -1 會自動分配 page, page 介於 0-49, 與 stock page 不同
+            # 4. 參數 psPageNo 指定 50 會取消報價
+            (page_no, n_code) = self.com_call(self.skq.SKQuoteLib_RequestTicks, page_no, stock_no)
+            if n_code != 0:
+                self.handle_sk_error('RequestTicks()', n_code)
+                self.subscriptions.release(stock_no)
+            else:
+                self.subscriptions.confirm(stock_no, page_no)
     
+    async def subscribe(self, symbols):
+        """
+        執行期間增加訂閱股票, 回傳成功訂閱的股票代碼
+
+        已連線時立即呼叫 SKQuoteLib_RequestTicks, 同時預先載入個股基本資料,
+        尚未連線時只加入訂閱清單, 連線後由 request_ticks() 一併訂閱
+        """
+        done = []
+        products = self.config['products']
+        for stock_no in symbols:
+            if stock_no in self.subscriptions.symbols:
+                continue
+            if self.state is not ReceiverState.MONITOR_DONE:
+                if stock_no not in products:
+                    products.append(stock_no)
+                done.append(stock_no)
+                continue
+
+            page_no = self.subscriptions.assign(stock_no)
+            if page_no is None:
+                logger.warning('Ticks 訂閱已滿, 無法訂閱 %s', stock_no)
+                continue
+
+            (page_no, n_code) = self.com_call(self.skq.SKQuoteLib_RequestTicks, page_no, stock_no)
+            if n_code != 0:
+                self.handle_sk_error('RequestTicks()', n_code)
+                self.subscriptions.release(stock_no)
+                continue
+            self.subscriptions.confirm(stock_no, page_no)
+            if stock_no not in products:
+                products.append(stock_no)
+
+            # 預先載入個股基本資料, 第一筆 ticks 不需要再呼叫 GetStockByIndexLONG()
+            (p_stock, n_code) = self.com_call(self.skq.SKQuoteLib_GetStockByNoLONG, stock_no)
+            if n_code == 0:
+                self.stock_meta.load(int(p_stock.bstrMarketNo), p_stock.nStockIdx, p_stock)
+            done.append(stock_no)
+            await asyncio.sleep(0)
+
+        logger.info('新增訂閱: %s', ', '.join(done))
+        return done
+
+    async def unsubscribe(self, symbols):
+        """
+        執行期間取消訂閱股票, 回傳成功取消的股票代碼
+
+        同時移除個股基本資料快取, 累計總量與五檔快照
+        """
+        done = []
+        products = self.config['products']
+        for stock_no in symbols:
+            if stock_no in products:
+                products.remove(stock_no)
+            if self.subscriptions.release(stock_no) is None:
+                continue
+
+            if self.state is ReceiverState.MONITOR_DONE:
+                n_code = self.com_call(self.skq.SKQuoteLib_CancelRequestTicks, stock_no)
+                if n_code != 0:
+                    self.handle_sk_error('CancelRequestTicks()', n_code)
+            self.com_call(self.reset_symbol, stock_no)
+            self.stock_meta.discard(stock_no)
+            self.best5_books.pop(stock_no, None)
+            done.append(stock_no)
+            await asyncio.sleep(0)
+
+        logger.info('取消訂閱: %s', ', '.join(done))
+        return done
+
+    def reset_symbol(self, stock_no):
+        """
+        清除個股累計總量與 nPtr, 重新訂閱時從回補 ticks 重新累計
+
+        獨立 COM 執行緒模式在 COM 執行緒上執行
+        """
+        self.ticks_total.pop(stock_no, None)
+        self.ticks_count.pop(stock_no, None)
+        self.ticks_ptr.pop(stock_no, None)
+        self.ticks_missing.pop(stock_no, None)
+        if self.bar_builder is not None:
+            self.bar_builder.discard(stock_no)
+            self.bars_ptr.pop(stock_no, None)
+
+    def report_duplicates(self):
+        """ 連線階段結束, 回報重新連線後略過的重複 ticks 數量 """
+        count = self.ticks_duplicates - self.duplicates_mark
+        self.duplicates_mark = self.ticks_duplicates
+        if self.sessions > 1:
+            self.reconnect_duplicates.append(count)
+            logger.info('重新連線後略過重複的回補 ticks: %d 筆', count)
+
     def request_kline(self):
         """ 取得股名 & 請求日 K 資料 """
         # 取樣截止日
         # 生成開始日與結束日參數, 配合 SKQuoteLib_RequestKLineAMByDate 使用 YYYYMMDD 格式
-        # end_date 15:00 以前取樣到昨日
-        # end_date 15:00 以後取樣到當日
-        # start_date 逆推 kline_days_limit 之後再逆推 14 天, 補足例假日或國定假日缺口
-        now = datetime.today()
-        human_min = now.hour * 100 + now.minute
-        end_date_offset = 0
-        if human_min < 1500:
-            end_date_offset = 1
-        start_date_offset = end_date_offset + self.kline_days_limit + 14
-        end_date = (now - timedelta(days=end_date_offset)).strftime('%Y%m%d')
-        start_date = (now - timedelta(days=start_date_offset)).strftime('%Y%m%d')
-        # logger.info('request_kline() %s ~ %s', start_date, end_date)
-
-        # 載入股票代碼/名稱對應
+        # end_date 為最後一個已收盤的交易日, 15:00 以前不含當日
+        # start_date 由交易日曆逆推 kline_days_limit 個交易日, kline_days_limit 為 0 時取得完整歷史
+        end_date = self.calendar.last_completed(datetime.today())
+        if self.kline_days_limit > 0:
+            start_date = self.kline_window(self.kline_days_limit, end_date)
+        else:
+            start_date = self.kline_history_start
+        # logger.info('request_kline() %d ~ %d', start_date, end_date)
+
+        # 載入股票代碼/名稱對應, 重新連線時緩衝區已在前一次 handle_kline() 清除
+        self.daily_kline = {}
+        self.kline_tracker = KLineTracker(self.kline_quiet_ms, self.kline_wait_ms)
+        self.kline_short = {}
+        self.kline_retried = set()
         for stock_no in self.config['products']:
             # 取得個股名稱
             # 參考文件: 4-4-32 (p.201)
             # 1. 參數 pSKStock 可以省略
             # 2. 回傳值是 list [SKSTOCKS*, nCode], 與官方文件不符
-            (p_stock, n_code) = self.skq.SKQuoteLib_GetStockByNoLONG(stock_no)
+            (p_stock, n_code) = self.com_call(self.skq.SKQuoteLib_GetStockByNoLONG, stock_no)
             if n_code != 0:
                 if n_code == 9999:
                     logger.warning('商品 %s 資料無法取得, 請確認是否已下市', stock_no)
                 else:
                     self.handle_sk_error('GetStockByNoLONG()', n_code)
                 continue
-            self.daily_kline[p_stock.bstrStockNo] = {
-                'id': p_stock.bstrStockNo,
-                'name': fix_encoding(p_stock.bstrStockName),
-                'quotes': []
-            }
+            self.daily_kline[p_stock.bstrStockNo] = self.new_kline_buffer(
+                p_stock.bstrStockNo, fix_encoding(p_stock.bstrStockName)
+            )
+            if self.journal is not None:
+                self.journal.write_meta(
+                    -1, -1, p_stock.bstrStockNo,
+                    fix_encoding(p_stock.bstrStockName), p_stock.sDecimal
+                )
         logger.info('股票名稱載入完成')
 
         # 請求日 K
@@ -347,86 +970,384 @@ class AsyncQuoteReceiver():
             if stock_no not in self.daily_kline:
                 continue
 
-            # 參考文件: 4-4-29 (p.198)
-            # 1. 使用方式與文件相符
-            # 2. 台股日 K 使用全盤與 AM 盤效果相同
-            logger.info('請求 %s 的日 K 資料', stock_no)
-            kline_type = 4           # 0:分線 / 4:日線 / 5:週線 / 6:月線
-            out_type = 1             # 0:舊版 / 1:新版
-            trade_session = 1        # 0:全盤 / 1:AM盤
-            min_number = 0           # 分K線的分鐘間隔 kline_type = 0 才有用
-            n_code = self.skq.SKQuoteLib_RequestKLineAMByDate(
-                stock_no, kline_type, out_type, trade_session,
-                start_date, end_date, min_number
-            )
-            if n_code != 0:
-                self.handle_sk_error('RequestKLine()', n_code)
+            # 本機資料足夠時只請求最後一筆之後的日期
+            req_start_date = start_date
+            if self.kline_store is not None:
+                span = self.kline_store.span(stock_no)
+                if span is not None and span[2] >= self.kline_days_limit:
+                    req_start_date = self.calendar.next_session(span[1])
+            if req_start_date == start_date and self.kline_days_limit > 0:
+                self.kline_short[stock_no] = True
+
+            # 請求區間沒有交易日時不需要請求
+            expected = self.calendar.count(req_start_date, end_date)
+            if self.kline_tracker.expect(stock_no, expected, end_date):
+                logger.info('%s 的日 K 使用本機資料', stock_no)
+                self.finish_kline(stock_no)
                 continue
+
+            logger.info('請求 %s 的日 K 資料', stock_no)
+            self.send_kline_request(stock_no, req_start_date, end_date)
         logger.info('日 K 請求完成')
 
+    def kline_window(self, count, end_date):
+        """
+        截至 end_date 最後 count 個交易日的第一天
+
+        日曆還沒有確認過的平日可能是休市日 (例如第一次啟動時的春節封關),
+        每一天都多請求一個交易日, 日曆學到這段期間之後就不再多請求
+        """
+        (start_date, _) = self.calendar.last_sessions(count, end_date)
+        extra = self.calendar.assumed(start_date, end_date)
+        if extra > 0:
+            (start_date, _) = self.calendar.last_sessions(count + extra, end_date)
+        return start_date
+
+    def send_kline_request(self, stock_no, start_date, end_date):
+        """ 送出日 K 請求, 失敗時結束該檔股票的接收 """
+        # 參考文件: 4-4-29 (p.198)
+        # 1. 使用方式與文件相符
+        # 2. 台股日 K 使用全盤與 AM 盤效果相同
+        kline_type = 4           # 0:分線 / 4:日線 / 5:週線 / 6:月線
+        out_type = 1             # 0:舊版 / 1:新版
+        trade_session = 1        # 0:全盤 / 1:AM盤
+        min_number = 0           # 分K線的分鐘間隔 kline_type = 0 才有用
+        n_code = self.com_call(
+            self.skq.SKQuoteLib_RequestKLineAMByDate,
+            stock_no, kline_type, out_type, trade_session,
+            str(start_date), str(end_date), min_number
+        )
+        if n_code != 0:
+            self.handle_sk_error('RequestKLine()', n_code)
+            self.kline_tracker.finish(stock_no, 'error')
+            self.daily_kline.pop(stock_no)
+
+    def request_short_kline(self, stock_id):
+        """
+        收到的日 K 少於 kline_days_limit 筆時, 往前再請求不足的筆數, 已送出請求時回傳 True
+
+        只重新請求一次, 上市不滿 kline_days_limit 個交易日的股票第二次仍然不足
+        """
+        if not self.kline_short.pop(stock_id, False):
+            return False
+        resp = self.daily_kline.get(stock_id)
+        result = self.kline_tracker.results.get(stock_id)
+        if resp is None or result is None:
+            return False
+        missing = self.kline_days_limit - result['bars']
+        if result['bars'] == 0 or missing <= 0:
+            return False
+
+        # 先學習已收到的交易日, 再從第一筆的前一天往前推算
+        if self.kline_columnar:
+            dates = [int(line[:10].replace('/', '')) for line in resp['lines']]
+        else:
+            dates = [date_to_int(quote['date']) for quote in resp['quotes']]
+        self.calendar.learn(dates)
+        end_date = day_to_int(int_to_day(min(dates)) - timedelta(days=1))
+        start_date = self.kline_window(missing, end_date)
+        logger.info(
+            '%s 的日 K 只收到 %d 筆, 往前請求 %d ~ %d',
+            stock_id, result['bars'], start_date, end_date
+        )
+        self.kline_retried.add(stock_id)
+        (_, last_session) = self.calendar.last_sessions(1, end_date)
+        self.kline_tracker.expect(stock_id, self.calendar.count(start_date, end_date), last_session)
+        self.send_kline_request(stock_id, start_date, end_date)
+        return True
+
     async def handle_kline(self):
-        """ 整理日 K 資料, 發送事件給 hook """
-        while self.state not in [ReceiverState.RETRY, ReceiverState.STOP]:
-            await asyncio.sleep(0.5)
+        """ 等待每檔股票的日 K 收齊, 收齊的股票由 finish_kline() 個別發送 """
+        tracker = self.kline_tracker
+        self.kline_ready = asyncio.Event()
+        while tracker.pending and self.state not in [ReceiverState.RETRY, ReceiverState.STOP]:
+            # 逾時的股票以目前收到的資料發送
+            for stock_id in tracker.expire():
+                self.finish_kline(stock_id)
+
+            deadline = tracker.next_deadline()
+            if deadline is None:
+                break
+            # 等到下一個逾時時間, 或有股票收齊時重新計算
+            self.kline_ready.clear()
+            try:
+                await asyncio.wait_for(
+                    self.kline_ready.wait(),
+                    max(0.01, deadline - tracker.clock())
+                )
+            except asyncio.TimeoutError:
+                pass
+
+        logger.debug('handle_kline(): %s', tracker.summary())
+        self.calendar.save()
+
+    def emit_kline_columns(self, resp):
+        """ 一次解析個股暫存的日 K 字串, 以 KLineColumns 發送給 hook """
+        stock_id = resp['id']
+        kline = KLineColumns.parse(stock_id, resp['name'], resp['lines'])
+        self.calendar.learn(dates_to_int(kline.date).tolist())
+        if self.kline_store is not None:
+            # 新收到的日 K 寫入本機資料庫, hook 改用本機資料
+            self.kline_store.merge_bars(stock_id, kline.bars())
+            kline = KLineColumns.from_bytes(
+                stock_id, resp['name'],
+                self.kline_store.read_bytes(stock_id, self.kline_days_limit)
+            )
+        if self.kline_hook is not None:
+            retv = self.kline_hook(kline.tail(self.kline_days_limit))
+            self.await_coroutine(retv, 'kline', stock_id)
+        else:
+            logger.info('    日 K: %s 已接收 %d 筆', stock_id, len(kline))
+
+    def track_kline(self, stock_id, kdate):
+        """ 更新日 K 接收進度, 收齊時發送 """
+        if self.kline_tracker is not None and self.kline_tracker.bar(stock_id, kdate):
+            self.finish_kline(stock_id)
+
+    def finish_kline(self, stock_id):
+        """ 個股日 K 收齊, 發送給 hook """
+        if self.kline_tracker is not None:
+            result = self.kline_tracker.results.get(stock_id)
+            if result is not None:
+                logger.debug(
+                    '日 K: %s 收齊 %d 筆 (%s), %.3f 秒',
+                    stock_id, result['bars'], result['reason'], result['complete']
+                )
+            if self.request_short_kline(stock_id):
+                return
+        self.emit_kline_stock(stock_id)
+        if self.kline_ready is not None:
+            self.kline_ready.set()
+
+    def emit_kline(self):
+        """ 發送所有已接收的日 K 資料給 hook """
+        for stock_id in list(self.daily_kline):
+            self.emit_kline_stock(stock_id)
+
+    def emit_kline_stock(self, stock_id):
+        """ 發送單一股票的日 K 資料給 hook, 發送後不再接收該檔的日 K """
+        resp = self.daily_kline.get(stock_id)
+        if resp is None:
+            return
+        self.daily_kline[stock_id] = None
+
+        if stock_id in self.kline_retried:
+            # 往前補請求的日 K 晚於後面的日期收到, 依日期重新排序
+            if self.kline_columnar:
+                resp['lines'].sort()
+            else:
+                resp['quotes'].sort(key=lambda quote: quote['date'])
+
+        if self.kline_columnar:
+            self.emit_kline_columns(resp)
+            return
+
+        self.calendar.learn(date_to_int(quote['date']) for quote in resp['quotes'])
+        if self.kline_store is not None:
+            # 新收到的日 K 寫入本機資料庫, hook 改用本機資料
+            self.kline_store.merge(stock_id, resp['quotes'])
+            resp['quotes'] = self.kline_store.quotes(stock_id, self.kline_days_limit)
+        if self.kline_hook is not None:
+            # 報價數量只留下最後 kline_days_limit 筆, 其餘捨棄
+            resp['quotes'] = resp['quotes'][-self.kline_days_limit:]
+            # 觸發事件
+            retv = self.kline_hook(resp)
+            self.await_coroutine(retv, 'kline', stock_id)
+        else:
+            logger.info('    日 K: %s 已接收', stock_id)
+
+    def detect_gap(self, meta, last, seq):
+        """ nPtr 不連續, 記錄缺漏範圍 """
+        if seq // 1000000000 != last // 1000000000:
+            # 換日, nPtr 重新開始
+            self.ticks_missing.pop(meta.stock_no, None)
+            return
 
-            # 最後一次收到日 K 的時間差不夠久跳過
-            passed = time.time() - self.kline_last_mtime
-            if passed < 0.15:
+        first = last % 1000000000 + 1
+        end = seq % 1000000000 - 1
+        count = end - first + 1
+        self.ticks_gaps += 1
+        self.ticks_gap_missing += count
+        # 缺漏的 nPtr 之後由回補 ticks 或 GetTickLONG() 補上, 超過補抓上限的缺漏也要記錄,
+        # 重新連線的回補 ticks 才不會被當成重複略過
+        missing = self.ticks_missing.get(meta.stock_no)
+        if missing is None:
+            missing = MissingTicks()
+            self.ticks_missing[meta.stock_no] = missing
+        missing.add(first, end)
+
+        if self.com_thread is not None:
+            self.loop.call_soon_threadsafe(self.handle_gap, meta, first, end)
+        else:
+            self.handle_gap(meta, first, end)
+
+    def handle_gap(self, meta, first, last):
+        """ 在 event loop 上發送缺漏事件, 需要時啟動回補 """
+        count = last - first + 1
+        if self.gap_hook is not None:
+            retv = self.gap_hook({
+                'id': meta.stock_no,
+                'name': meta.name,
+                'first': first,
+                'last': last,
+                'missing': count
+            })
+            self.await_coroutine(retv, 'gap', meta.stock_no)
+        else:
+            logger.warning('Ticks 缺漏: %s nPtr %d-%d, 共 %d 筆', meta.stock_no, first, last, count)
+
+        if self.gap_recover:
+            if count > self.gap_max_recover:
+                logger.warning(
+                    'Ticks 缺漏超過 %d 筆, 不補抓, 等待重新連線的回補 ticks: %s',
+                    self.gap_max_recover, meta.stock_no
+                )
+            else:
+                asyncio.get_running_loop().create_task(self.recover_gap(meta, first, last))
+
+    async def recover_gap(self, meta, first, last):
+        """ 以 SKQuoteLib_GetTickLONG 補抓缺漏的 ticks """
+        recovered = 0
+        for ptr in range(first, last + 1):
+            missing = self.ticks_missing.get(meta.stock_no)
+            if missing is None:
+                break
+            if ptr not in missing:
+                # 已經由回補 ticks 補上
                 continue
 
-            # 生成日 K 事件
-            for stock_id in self.daily_kline:
-                # 觸發事件
-                # pylint: disable=line-too-long
-                if self.kline_hook is not None:
-                    # 報價數量只留下最後 kline_days_limit 筆, 其餘捨棄
-                    resp = self.daily_kline[stock_id]
-                    resp['quotes'] = resp['quotes'][-self.kline_days_limit:]
-                    # 觸發事件
-                    retv = self.kline_hook(resp)
-                    self.await_coroutine(retv)
-                else:
-                    logger.info('    日 K: %s 已接收', stock_id)
+            # 回傳值是 list [SKTICK, nCode], 與其他查詢函數相同
+            (tick, n_code) = self.com_call(
+                self.skq.SKQuoteLib_GetTickLONG, meta.market_no, meta.index, ptr
+            )
+            if n_code != 0:
+                self.handle_sk_error('GetTickLONG()', n_code)
+                break
+            args = (
+                meta.market_no, meta.index, ptr,
+                tick.nDate, tick.nTimehms, tick.nTimemillis,
+                tick.nBid, tick.nAsk, tick.nClose, tick.nQty, tick.nSimulate
+            )
+            if self.journal is not None:
+                self.journal.write_tick(True, *args)
+            self.com_call(self.process_ticks, *args)
+            recovered += 1
+            await asyncio.sleep(0)
 
-            # 清除緩衝資料
-            # TODO: 這個做法會
-            self.daily_kline = None
-            break
+        self.ticks_recovered += recovered
+        logger.info('Ticks 補抓: %s nPtr %d-%d, 補回 %d 筆', meta.stock_no, first, last, recovered)
 
-    def handle_ticks(self, stock_id, name, timestr, bid, ask, close, qty, vol): # pylint: disable=too-many-arguments
+    def handle_ticks(self, stock_id, name, timestamp, bid, ask, close, qty, vol): # pylint: disable=too-many-arguments
         """ 處理當天回補 ticks 或即時 ticks """
-        entry = {
-            'id': stock_id,
-            'name': name,
-            'time': timestr,
-            'bid': bid,
-            'ask': ask,
-            'close': close,
-            'qty': qty,
-            'vol': vol
-        }
-        if self.ticks_hook is not None:
-            retv = self.ticks_hook(entry)
-            self.await_coroutine(retv)
+        entry = self.tick_factory(stock_id, name, timestamp, bid, ask, close, qty, vol)
+        if self.ticks_handoff is not None:
+            # 獨立 COM 執行緒模式, 交給 event loop 處理
+            self.ticks_handoff.put(entry)
         else:
+            self.deliver_tick(entry)
+
+    def deliver_tick(self, entry):
+        """ 在 event loop 上發送撮合資料 """
+        if self.ticks_legacy:
+            # 舊版 dict 格式, 與 TickRecord 無關的功能都沒有啟用
+            if self.ticks_hook is not None:
+                retv = self.ticks_hook(entry)
+                self.await_coroutine(retv, 'ticks', entry['id'])
+            else:
+                logger.info(
+                    '    成交: %6s %s %.2f - %s',
+                    entry['id'],
+                    entry['name'],
+                    entry['close'],
+                    entry['time'],
+                )
+            return
+
+        # 寫入環狀緩衝區
+        if self.ticks_buffer is not None:
+            self.ticks_buffer.append(
+                entry.id, entry.ts, entry.bid, entry.ask, entry.close, entry.qty, entry.vol
+            )
+
+        if self.ticks_batcher is not None:
+            batch = self.ticks_batcher.add(entry)
+            if batch is not None:
+                self.handle_ticks_batch(batch)
+
+        if self.ticks_hook is not None:
+            if self.ticks_raw:
+                retv = self.ticks_hook(entry)
+            else:
+                retv = self.ticks_hook(entry.as_dict())
+            self.await_coroutine(retv, 'ticks', entry.id)
+        elif self.ticks_batcher is None:
             logger.info(
                 '    成交: %6s %s %.2f - %s',
-                entry['id'],
-                entry['name'],
-                entry['close'],
-                entry['time'],
+                entry.id,
+                entry.name,
+                entry.close,
+                entry.time,
             )
 
+    def emit_bar(self, bar):
+        """ K 棒收盤, 獨立 COM 執行緒模式交給 event loop 處理 """
+        if self.com_thread is not None:
+            self.loop.call_soon_threadsafe(self.deliver_bar, bar)
+        else:
+            self.deliver_bar(bar)
+
+    def deliver_bar(self, bar):
+        """ 在 event loop 上發送 K 棒 """
+        if self.bar_hook is not None:
+            retv = self.bar_hook(bar)
+            self.await_coroutine(retv, 'bar', bar.id)
+
+    def handle_ticks_batch(self, batch):
+        """ 發送撮合批次給 hook """
+        retv = self.ticks_batch_hook(batch)
+        self.await_coroutine(retv, 'ticks_batch')
+
+    def flush_ticks_batch(self):
+        """ 送出本次 PumpWaitingMessages() 累積的撮合批次 """
+        if self.ticks_batcher is None:
+            return
+        batch = self.ticks_batcher.flush()
+        if batch is not None:
+            self.handle_ticks_batch(batch)
+
+    def load_stock_meta(self, market_no, index):
+        """ 個股基本資料快取未命中時, 透過 COM 元件取得 """
+        # 參考文件: 4-4-31 (p.200)
+        # 1. pSKStock 參數可忽略
+        # 2. 回傳值是 list [SKSTOCKS*, nCode], 與官方文件不符
+        # 3. 如果沒有 RequestStocks(), 這裡得到的總量 pStock.nTQty 恆為 0
+        return self.com_call(self.skq.SKQuoteLib_GetStockByIndexLONG, market_no, index)
+
     def handle_sk_error(self, action, n_code):
         """ 顯示錯誤訊息 """
-        skmsg = self.skc.SKCenterLib_GetReturnCodeMessage(n_code)
+        skmsg = self.com_call(self.skc.SKCenterLib_GetReturnCodeMessage, n_code)
         logger.info('執行動作 [%s] 時發生錯誤, 詳細原因: #%d %s', action, n_code, skmsg)
 
-    def await_coroutine(self, retv):
-        """ 如果 function 回傳值是 coroutine, 放進 event loop """
+    def await_coroutine(self, retv, kind=None, key=None):
+        """
+        如果 function 回傳值是 coroutine, 放進 event loop
+
+        kind 有設定 set_hook_limit() 時交給 HookGate 控制同時執行數量, key 為股票代碼
+        """
         if isinstance(retv, types.CoroutineType):
+            gate = self.hook_gates.get(kind)
+            if gate is not None:
+                gate.submit(retv, key)
+                return
             loop = asyncio.get_running_loop()
-            loop.create_task(retv)
+            task = loop.create_task(retv)
+            if kind in self.hook_inflight:
+                self.hook_inflight[kind] += 1
+                task.add_done_callback(lambda _: self.hook_done(kind))
+
+    def hook_done(self, kind):
+        """ 沒有數量限制的 coroutine hook 執行結束 """
+        self.hook_inflight[kind] -= 1
 
     def OnReplyMessage(self, bstrUserID, bstrMessage):
         """ 處理登入時的公告訊息 4-3-e (p.167) """
@@ -448,6 +1369,16 @@ class AsyncQuoteReceiver():
     
     def OnConnection(self, nKind, nCode):
         """ EnterMonitor() 之後的連線事件處理 4-4-a (p.205) """
+        # pylint: disable=invalid-name
+        if self.com_thread is not None:
+            # 生命週期狀態與 asyncio.Event 只在 event loop 上變更
+            self.loop.call_soon_threadsafe(self.handle_connection, nKind, nCode)
+        else:
+            self.handle_connection(nKind, nCode)
+
+    def handle_connection(self, nKind, nCode):
+        """ 處理連線事件 """
+        # pylint: disable=invalid-name
         if nCode != 0:
             # 這裡的 nCode 沒有對應的文字訊息
             action = '狀態變更 %d' % nKind
@@ -465,16 +1396,20 @@ class AsyncQuoteReceiver():
             msg = '結束連線'
         if nKind == 3003:
             msg = '連線就緒'
+            self.report_duplicates()
+            self.sessions += 1
             self.change_state(ReceiverState.MONITOR_DONE)
             self.retry_count = 0
             self.monitor_event.set()
         if nKind == 3021:
             msg = '異常斷線'
+            self.stock_meta.clear()
         
         logger.info('%s: nKind=%d, nCode=%d', msg, nKind, nCode)
 
-        if nCode != 0:
-            self.retry()
+        # 異常斷線或發生錯誤時重新連線
+        if nCode != 0 or nKind == 3021:
+            asyncio.get_running_loop().create_task(self.retry())
 
     def OnNotifyTicksLONG(self, sMarketNo, nStockIndex, nPtr, \
                       nDate, nTimehms, nTimemillis, \
@@ -483,6 +1418,49 @@ class AsyncQuoteReceiver():
         # pylint: disable=invalid-name, unused-argument, too-many-arguments
         # pylint: enable=invalid-name
         # pylint: disable=too-many-locals
+        self.event_count += 1
+
+        if self.journal is not None:
+            self.journal.write_tick(
+                False, sMarketNo, nStockIndex, nPtr, nDate, nTimehms, nTimemillis,
+                nBid, nAsk, nClose, nQty, nSimulate
+            )
+
+        self.process_ticks(sMarketNo, nStockIndex, nPtr, \
+                      nDate, nTimehms, nTimemillis, \
+                      nBid, nAsk, nClose, nQty, nSimulate)
+
+    def process_ticks(self, sMarketNo, nStockIndex, nPtr, \
+                      nDate, nTimehms, nTimemillis, \
+                      nBid, nAsk, nClose, nQty, nSimulate):
+        """ 即時 ticks 與回補 ticks 的共用處理 """
+        # pylint: disable=invalid-name, unused-argument, too-many-arguments
+        # pylint: enable=invalid-name
+        # pylint: disable=too-many-locals
+
+        # 個股基本資料, 只有第一次才會呼叫 GetStockByIndexLONG()
+        (meta, n_code) = self.stock_meta.get(sMarketNo, nStockIndex)
+        if n_code != 0:
+            self.handle_sk_error('GetStockByIndexLONG()', n_code)
+            return
+
+        # 重新連線後, 回補 ticks 會從當天第一筆重送, 已處理過的 nPtr 直接略過,
+        # 只有缺漏的 nPtr 會補進來; nPtr 每天從 0 開始, 與日期合併比較
+        # 試撮回報也佔用 nPtr, 所以在過濾試撮之前檢查
+        seq = nDate * 1000000000 + nPtr
+        last = self.ticks_ptr.get(meta.stock_no, -1)
+        if seq > last:
+            self.ticks_ptr[meta.stock_no] = seq
+            if seq != last + 1 and last >= 0:
+                self.detect_gap(meta, last, seq)
+        else:
+            missing = self.ticks_missing.get(meta.stock_no)
+            if missing is None or nPtr not in missing:
+                self.ticks_duplicates += 1
+                return
+            missing.discard(nPtr)
+            if not missing:
+                del self.ticks_missing[meta.stock_no]
 
         # 忽略試撮回報
         # 盤中最後一筆與零股交易, 即使收盤也不會觸發歷史 Ticks, 這兩筆會在這裡觸發
@@ -492,41 +1470,58 @@ class AsyncQuoteReceiver():
         if nTimehms < 90000 or (132500 <= nTimehms < 133000):
             return
 
-        # 參考文件: 4-4-31 (p.200)
-        # 1. pSKStock 參數可忽略
-        # 2. 回傳值是 list [SKSTOCKS*, nCode], 與官方文件不符
-        # 3. 如果沒有 RequestStocks(), 這裡得到的總量 pStock.nTQty 恆為 0
-        (p_stock, n_code) = self.skq.SKQuoteLib_GetStockByIndexLONG(sMarketNo, nStockIndex)
+        # 累加總量與筆數
+        if meta.stock_no not in self.ticks_total:
+            self.ticks_total[meta.stock_no] = nQty
+            self.ticks_count[meta.stock_no] = 1
+        else:
+            self.ticks_total[meta.stock_no] += nQty
+            self.ticks_count[meta.stock_no] += 1
+
+        # 時間轉換為 epoch 奈秒, 字串等到 hook 讀取 time 才產生
+        timestamp = tick_timestamp(nDate, nTimehms, nTimemillis)
+
+        # 格式轉換
+        ppow = meta.divisor
+        bid = nBid / ppow
+        ask = nAsk / ppow
+        close = nClose / ppow
+        vol = self.ticks_total[meta.stock_no]
+        if self.bar_builder is not None and seq > self.bars_ptr.get(meta.stock_no, -1):
+            # 已經由回補 ticks 寫入 K 棒的 nPtr (例如斷線期間的缺漏) 補回時不再重複寫入
+            self.bar_builder.update(meta.stock_no, meta.name, timestamp, close, nQty)
+        self.handle_ticks(meta.stock_no, meta.name, timestamp, bid, ask, close, nQty, vol)
+
+    def process_history_bar(self, sMarketNo, nStockIndex, nPtr, \
+                      nDate, nTimehms, nTimemillis, nClose, nQty):
+        """
+        ticks hook 不包含回補 ticks 時, 回補 ticks 只寫入盤中 K 棒
+
+        不影響個股的總量, 筆數與 nPtr; 重新連線時從第一筆重送的回補 ticks,
+        已經由即時 ticks 或前一次回補寫入 K 棒的部分直接略過
+        """
+        # pylint: disable=invalid-name, too-many-arguments
+        # pylint: enable=invalid-name
+        (meta, n_code) = self.stock_meta.get(sMarketNo, nStockIndex)
         if n_code != 0:
             self.handle_sk_error('GetStockByIndexLONG()', n_code)
             return
 
-        # 累加總量
-        if p_stock.bstrStockNo not in self.ticks_total:
-            self.ticks_total[p_stock.bstrStockNo] = nQty
-        else:
-            self.ticks_total[p_stock.bstrStockNo] += nQty
+        seq = nDate * 1000000000 + nPtr
+        if seq <= self.bars_ptr.get(meta.stock_no, -1):
+            return
+        self.bars_ptr[meta.stock_no] = seq
+        if seq <= self.ticks_ptr.get(meta.stock_no, -1):
+            missing = self.ticks_missing.get(meta.stock_no)
+            if missing is None or nPtr not in missing:
+                return
 
-        # 時間字串化
-        ssdec = nTimehms % 100
-        nTimehms /= 100
-        mmdec = nTimehms % 100
-        nTimehms /= 100
-        hhdec = nTimehms
-        timestr = '%02d:%02d:%02d.%03d' % (hhdec, mmdec, ssdec, nTimemillis//1000)
+        # 忽略試撮回報, 與 process_ticks() 相同
+        if nTimehms < 90000 or (132500 <= nTimehms < 133000):
+            return
 
-        # 格式轉換
-        ppow = math.pow(10, p_stock.sDecimal)
-        self.handle_ticks(
-            p_stock.bstrStockNo,
-            fix_encoding(p_stock.bstrStockName),
-            timestr,
-            nBid / ppow,
-            nAsk / ppow,
-            nClose / ppow,
-            nQty,
-            self.ticks_total[p_stock.bstrStockNo]
-        )
+        timestamp = tick_timestamp(nDate, nTimehms, nTimemillis)
+        self.bar_builder.update(meta.stock_no, meta.name, timestamp, nClose / meta.divisor, nQty)
 
     def OnNotifyHistoryTicksLONG(self, sMarketNo, nStockIndex, nPtr, \
                       nDate, nTimehms, nTimemillis, \
@@ -535,37 +1530,58 @@ class AsyncQuoteReceiver():
         # pylint: disable=invalid-name, unused-argument, too-many-arguments
         # pylint: enable=invalid-name
         # pylint: disable=too-many-locals
+        self.event_count += 1
+
+        if self.journal is not None:
+            self.journal.write_tick(
+                True, sMarketNo, nStockIndex, nPtr, nDate, nTimehms, nTimemillis,
+                nBid, nAsk, nClose, nQty, nSimulate
+            )
 
         if self.ticks_include_history:
-            self.OnNotifyTicksLONG(sMarketNo, nStockIndex, nPtr, \
+            self.process_ticks(sMarketNo, nStockIndex, nPtr, \
                       nDate, nTimehms, nTimemillis, \
                       nBid, nAsk, nClose, nQty, nSimulate)
+        elif self.bar_builder is not None:
+            # 盤中 K 棒需要從當天第一筆開始累計
+            self.process_history_bar(sMarketNo, nStockIndex, nPtr, \
+                      nDate, nTimehms, nTimemillis, nClose, nQty)
 
     def OnNotifyKLineData(self, bstrStockNo, bstrData):
         """ 接收 K 線資料 (文件 4-4-f p.206) """
         # pylint: disable=invalid-name
         # pylint: enable=invalid-name
+        self.event_count += 1
+
+        if self.journal is not None:
+            self.journal.write_kline(bstrStockNo, bstrData)
 
         # 新版 K 線資料格式
         # 日期        開           高          低          收          量
         # 2019/05/21, 233.500000, 236.000000, 232.500000, 234.000000, 79971
-        cols = bstrData.split(', ')
-        this_date = cols[0].replace('/', '-')
-        self.kline_last_mtime = time.time()
-        # logger.info('OnNotifyKLineData() %s %.5f' % (this_date, self.kline_last_mtime))
-
-        if self.daily_kline[bstrStockNo] is not None:
-            # 寫入緩衝區與交易日數限制處理
-            quote = {
-                'date': this_date,
-                'open': float(cols[1]),
-                'high': float(cols[2]),
-                'low': float(cols[3]),
-                'close': float(cols[4]),
-                'volume': int(cols[5])
-            }
-            buffer = self.daily_kline[bstrStockNo]['quotes']
-            buffer.append(quote)
+        # 已發送的股票不再接收
+        resp = self.daily_kline.get(bstrStockNo)
+        if resp is not None:
+            if self.kline_columnar:
+                # 只暫存字串, 收齊後一次解析
+                resp['lines'].append(bstrData)
+            else:
+                cols = bstrData.split(', ')
+                resp['quotes'].append({
+                    'date': cols[0].replace('/', '-'),
+                    'open': float(cols[1]),
+                    'high': float(cols[2]),
+                    'low': float(cols[3]),
+                    'close': float(cols[4]),
+                    'volume': int(cols[5])
+                })
+
+            # 更新接收進度, 獨立 COM 執行緒模式交給 event loop 處理
+            kdate = int(bstrData[:10].replace('/', ''))
+            if self.com_thread is not None:
+                self.loop.call_soon_threadsafe(self.track_kline, bstrStockNo, kdate)
+            else:
+                self.track_kline(bstrStockNo, kdate)
 
     def OnNotifyBest5LONG(self, sMarketNo, nStockIndex, \
             nBestBid1, nBestBidQty1, \
@@ -582,29 +1598,70 @@ class AsyncQuoteReceiver():
             nExtendAsk, nExtendAskQty, \
             nSimulate):
         """ 接收最佳五檔資料 (文件 4-4-u p.216) """
+        self.event_count += 1
+
+        # 個股基本資料, 只有第一次才會呼叫 GetStockByIndexLONG()
+        (meta, n_code) = self.stock_meta.get(sMarketNo, nStockIndex)
+
+        # 24 個價量之後附上個股資料, 交接到 event loop 時不需要另外包裝
+        levels = (
+            nBestBid1, nBestBidQty1,
+            nBestBid2, nBestBidQty2,
+            nBestBid3, nBestBidQty3,
+            nBestBid4, nBestBidQty4,
+            nBestBid5, nBestBidQty5,
+            nExtendBid, nExtendBidQty,
+            nBestAsk1, nBestAskQty1,
+            nBestAsk2, nBestAskQty2,
+            nBestAsk3, nBestAskQty3,
+            nBestAsk4, nBestAskQty4,
+            nBestAsk5, nBestAskQty5,
+            nExtendAsk, nExtendAskQty,
+            meta
+        )
+
+        if self.journal is not None:
+            self.journal.write_best5(sMarketNo, nStockIndex, levels, nSimulate)
 
-        # 參考文件: 4-4-31 (p.200)
-        # 1. pSKStock 參數可忽略
-        # 2. 回傳值是 list [SKSTOCKS*, nCode], 與官方文件不符
-        # 3. 如果沒有 RequestStocks(), 這裡得到的總量 pStock.nTQty 恆為 0
-        (p_stock, n_code) = self.skq.SKQuoteLib_GetStockByIndexLONG(sMarketNo, nStockIndex)
         if n_code != 0:
             self.handle_sk_error('GetStockByIndex()', n_code)
             return
 
-        best5_entry = {
-            'id': p_stock.bstrStockNo,
-            'name': fix_encoding(p_stock.bstrStockName),
-            'best': [
-                { 'bid': nBestBid1/100, 'bidQty': nBestBidQty1, 'ask': nBestAsk1/100, 'askQty': nBestAskQty1 },
-                { 'bid': nBestBid2/100, 'bidQty': nBestBidQty2, 'ask': nBestAsk2/100, 'askQty': nBestAskQty2 },
-                { 'bid': nBestBid3/100, 'bidQty': nBestBidQty3, 'ask': nBestAsk3/100, 'askQty': nBestAskQty3 },
-                { 'bid': nBestBid4/100, 'bidQty': nBestBidQty4, 'ask': nBestAsk4/100, 'askQty': nBestAskQty4 },
-                { 'bid': nBestBid5/100, 'bidQty': nBestBidQty5, 'ask': nBestAsk5/100, 'askQty': nBestAskQty5 },
-                # 這條用途不明, 暫不使用
-                # { 'bid': nExtendBid, 'bidQty': nExtendBidQty, 'ask': nExtendAsk, 'askQty': nExtendAskQty },
-            ]
-        }
+        if self.best5_handoff is not None:
+            # 五檔快照只在 event loop 上更新, COM 執行緒交接的是這一筆的原始數值,
+            # hook 不會讀到寫到一半的內容, 每一筆更新也都會依序送出
+            self.best5_handoff.put(levels)
+            return
+        self.handoff_best5(levels)
+
+    def handoff_best5(self, levels):
+        """ 在 event loop 上處理 COM 執行緒交接的最佳五檔 """
+        self.deliver_best5(self.update_best5_book(levels))
+
+    def update_best5_book(self, levels):
+        """ 更新個股五檔快照, levels 最後一個欄位是個股資料 """
+        meta = levels[-1]
+        # 每檔股票一組預先配置的五檔陣列, 直接覆寫內容
+        # 價格依個股小數位數換算, 不再固定除以 100
+        best5_entry = self.best5_books.get(meta.stock_no)
+        if best5_entry is None:
+            best5_entry = Best5Book(meta.stock_no, meta.name)
+            self.best5_books[meta.stock_no] = best5_entry
+        best5_entry.update(meta.divisor, levels)
+        return best5_entry
+
+    def deliver_best5(self, best5_entry):
+        """ 在 event loop 上發送最佳五檔資料 """
+        if self.best5_conflator is not None:
+            self.best5_conflator.put(best5_entry.id, best5_entry)
+        else:
+            self.emit_best5(best5_entry)
+
+    def emit_best5(self, best5_entry):
+        """ 呼叫最佳五檔 hook """
         if self.best5_hook is not None:
-            retv = self.best5_hook(best5_entry)
-            self.await_coroutine(retv)
+            if self.best5_raw:
+                retv = self.best5_hook(best5_entry)
+            else:
+                retv = self.best5_hook(best5_entry.as_dict())
+            self.await_coroutine(retv, 'best5', best5_entry.id)
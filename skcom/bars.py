@@ -0,0 +1,274 @@
+"""
+skcom.bars
+
+由 ticks 即時合成盤中 K 棒
+"""
+
+import array
+
+from skcom.exception import ConfigException
+from skcom.record import format_tick_time
+
+# 台股交易時間以 UTC+8 為準
+TW_OFFSET_SEC = 8 * 3600
+DAY_SEC = 86400
+
+# 週期單位
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+def parse_interval(value):
+    """ K 棒週期轉換為秒數, 可以是秒數整數或 '30s', '1m', '5m', '1h' 格式的字串 """
+    try:
+        if isinstance(value, int):
+            seconds = value
+        else:
+            seconds = int(value[:-1]) * INTERVAL_UNITS[value[-1]]
+    except (KeyError, ValueError, TypeError, IndexError) as ex:
+        raise ConfigException('無法識別的 K 棒週期: %s' % value) from ex
+    if seconds <= 0 or seconds > DAY_SEC:
+        raise ConfigException('無法識別的 K 棒週期: %s' % value)
+    return seconds
+
+def hms_to_seconds(hms):
+    """ HHMMSS 整數轉換為當日秒數 """
+    return hms // 10000 * 3600 + hms // 100 % 100 * 60 + hms % 100
+
+class Bar():
+    """
+    收盤的 K 棒
+
+    ts 為 K 棒開始時間 (epoch 奈秒), interval 為週期秒數
+    """
+    __slots__ = ('id', 'name', 'interval', 'ts', 'open', 'high', 'low', 'close', 'volume', 'ticks')
+
+    def __init__(self, stock_id, name, interval, timestamp,
+                 open_price, high, low, close, volume, ticks):
+        # pylint: disable=too-many-arguments, invalid-name
+        self.id = stock_id
+        self.name = name
+        self.interval = interval
+        self.ts = timestamp
+        self.open = open_price
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.ticks = ticks
+
+    @property
+    def time(self):
+        """ HH:MM:SS 格式的 K 棒開始時間 """
+        return format_tick_time(self.ts)[:8]
+
+    def as_dict(self):
+        """ 轉換為 dict """
+        return {
+            'id': self.id,
+            'name': self.name,
+            'interval': self.interval,
+            'time': self.time,
+            'ts': self.ts,
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume': self.volume,
+            'ticks': self.ticks
+        }
+
+    def __repr__(self):
+        return '<Bar %s %ds %s O:%.2f H:%.2f L:%.2f C:%.2f V:%d>' % (
+            self.id, self.interval, self.time,
+            self.open, self.high, self.low, self.close, self.volume
+        )
+
+class BarSeries():
+    """
+    單一股票單一週期的盤中 K 棒
+
+    一個交易日的所有 K 棒在建立時一次配置, 第 n 根 K 棒就是陣列的第 n 個位置,
+    每筆 tick 只在原位更新數值; 開盤價與收盤價以 tick 時間決定, 與收到的順序無關,
+    因此回補 ticks 重建的 K 棒與即時收到的結果相同
+
+    陣列可以用 numpy.frombuffer() 直接轉換, 不需要複製
+    """
+
+    def __init__(self, stock_no, name, interval, start, slots):
+        # pylint: disable=too-many-arguments
+        self.stock_no = stock_no
+        self.name = name
+        self.interval = interval
+        self.start = start    # 第一根 K 棒的開始時間, 當日秒數
+        self.slots = slots
+        self.blank = (array.array('d', bytes(8 * slots)), array.array('q', bytes(8 * slots)))
+        self.open = array.array('d', self.blank[0])
+        self.high = array.array('d', self.blank[0])
+        self.low = array.array('d', self.blank[0])
+        self.close = array.array('d', self.blank[0])
+        self.volume = array.array('q', self.blank[1])
+        self.ticks = array.array('q', self.blank[1])
+        self.first_ts = array.array('q', self.blank[1])
+        self.last_ts = array.array('q', self.blank[1])
+        self.day = -1       # 交易日 (epoch 日數, UTC+8)
+        self.current = -1   # 最後一根有資料的 K 棒
+        self.closed = -1    # 最後一根已發送的 K 棒
+
+    def reset(self, day):
+        """ 換日, 清除所有 K 棒 """
+        for column in (self.open, self.high, self.low, self.close):
+            column[:] = self.blank[0]
+        for column in (self.volume, self.ticks, self.first_ts, self.last_ts):
+            column[:] = self.blank[1]
+        self.day = day
+        self.current = -1
+        self.closed = -1
+
+    def bar(self, slot):
+        """ 取得第 slot 根 K 棒 """
+        offset = self.start + slot * self.interval
+        timestamp = (self.day * DAY_SEC - TW_OFFSET_SEC + offset) * 1000000000
+        return Bar(
+            self.stock_no, self.name, self.interval, timestamp,
+            self.open[slot], self.high[slot], self.low[slot], self.close[slot],
+            self.volume[slot], self.ticks[slot]
+        )
+
+    def bars(self):
+        """ 當日所有有成交的 K 棒, 包含尚未收盤的最後一根 """
+        return [self.bar(slot) for slot in range(self.current + 1) if self.ticks[slot] > 0]
+
+class BarBuilder():
+    """
+    盤中 K 棒產生器
+
+    * intervals: 週期秒數的 list
+    * emit: K 棒收盤時呼叫的函數, 參數為 Bar
+    * session: 交易時間 (開始 HHMMSS, 結束 HHMMSS), 結束時間的 tick (收盤撮合) 併入最後一根,
+      交易時間以外的 ticks 不列入
+
+    收到下一根 K 棒的 tick 時前一根 K 棒收盤; 任何一檔股票的 tick 時間跨過週期邊界時,
+    也會檢查其他股票, 沒有新 tick 的 K 棒一樣準時收盤
+    """
+
+    def __init__(self, intervals, emit, session=(90000, 133000)):
+        self.intervals = sorted(set(intervals))
+        self.emit = emit
+        self.start = hms_to_seconds(session[0])
+        self.end = hms_to_seconds(session[1])
+        self.symbols = {}   # stock_no -> [BarSeries, ...], 與 intervals 順序相同
+
+        # 市場時間, 以收到的 tick 時間為準
+        self.day = -1
+        self.next_sweep = 0
+
+        # 統計
+        self.bars_closed = 0
+        self.late_ticks = 0
+        self.ignored_ticks = 0
+
+    def get(self, stock_no, interval):
+        """ 取得個股指定週期的 K 棒, 沒有資料時回傳 None """
+        if interval not in self.intervals:
+            return None
+        series_list = self.symbols.get(stock_no)
+        if series_list is None:
+            return None
+        return series_list[self.intervals.index(interval)]
+
+    def discard(self, stock_no):
+        """ 清除個股 K 棒, 重新訂閱時由回補 ticks 重建 """
+        self.symbols.pop(stock_no, None)
+
+    def update(self, stock_no, name, timestamp, price, qty):
+        """ 寫入一筆 tick """
+        # pylint: disable=too-many-arguments
+        local = timestamp // 1000000000 + TW_OFFSET_SEC
+        day = local // DAY_SEC
+        offset = local % DAY_SEC - self.start
+        if offset < 0 or offset > self.end - self.start:
+            self.ignored_ticks += 1
+            return
+
+        series_list = self.symbols.get(stock_no)
+        if series_list is None:
+            series_list = [
+                BarSeries(
+                    stock_no, name, interval, self.start,
+                    max(1, -(-(self.end - self.start) // interval))
+                ) for interval in self.intervals
+            ]
+            self.symbols[stock_no] = series_list
+
+        for series in series_list:
+            if series.day != day:
+                self.close_current(series)
+                series.reset(day)
+            slot = min(offset // series.interval, series.slots - 1)
+            if series.ticks[slot] == 0:
+                series.open[slot] = price
+                series.high[slot] = price
+                series.low[slot] = price
+                series.close[slot] = price
+                series.first_ts[slot] = timestamp
+                series.last_ts[slot] = timestamp
+            else:
+                if price > series.high[slot]:
+                    series.high[slot] = price
+                elif price < series.low[slot]:
+                    series.low[slot] = price
+                if timestamp < series.first_ts[slot]:
+                    series.first_ts[slot] = timestamp
+                    series.open[slot] = price
+                if timestamp >= series.last_ts[slot]:
+                    series.last_ts[slot] = timestamp
+                    series.close[slot] = price
+            series.volume[slot] += qty
+            series.ticks[slot] += 1
+
+            if slot > series.current:
+                # 進入新的 K 棒, 前一根收盤
+                self.close_current(series)
+                series.current = slot
+            elif slot <= series.closed:
+                # 已發送的 K 棒收到補回的 ticks, 只更新陣列
+                self.late_ticks += 1
+
+        # 市場時間跨過最小週期的邊界時, 讓其他股票的 K 棒也收盤
+        if day != self.day or offset >= self.next_sweep:
+            self.day = day
+            step = self.intervals[0]
+            self.next_sweep = min((offset // step + 1) * step, self.end - self.start)
+            self.sweep(day, offset)
+
+    def close_current(self, series):
+        """ 發送最後一根尚未發送的 K 棒 """
+        if series.current > series.closed:
+            series.closed = series.current
+            self.bars_closed += 1
+            self.emit(series.bar(series.current))
+
+    def sweep(self, day, offset):
+        """ 發送結束時間已經過去的 K 棒 """
+        last_end = self.end - self.start
+        for series_list in self.symbols.values():
+            for series in series_list:
+                if series.current <= series.closed:
+                    continue
+                if series.day != day:
+                    self.close_current(series)
+                    continue
+                if series.current == series.slots - 1:
+                    bar_end = last_end
+                else:
+                    bar_end = (series.current + 1) * series.interval
+                if bar_end <= offset:
+                    self.close_current(series)
+
+    def summary(self):
+        """ 統計摘要 """
+        return {
+            'symbols': len(self.symbols),
+            'bars_closed': self.bars_closed,
+            'late_ticks': self.late_ticks,
+            'ignored_ticks': self.ignored_ticks
+        }
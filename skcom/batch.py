@@ -0,0 +1,120 @@
+"""
+skcom.batch
+
+撮合資料批次化, 減少 hook 呼叫次數
+"""
+
+import time
+
+class BatchStats():
+    """ 批次大小統計 """
+
+    # 直方圖區間上限, 最後一格收容超過 512 筆的批次
+    BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+    def __init__(self):
+        self.batches = 0
+        self.items = 0
+        self.max_size = 0
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+
+    def add(self, size):
+        """ 紀錄一個批次 """
+        self.batches += 1
+        self.items += size
+        if size > self.max_size:
+            self.max_size = size
+        slot = 0
+        for upper in self.BUCKETS:
+            if size <= upper:
+                break
+            slot += 1
+        self.histogram[slot] += 1
+
+    def summary(self):
+        """ 統計摘要 """
+        labels = ['<=%d' % upper for upper in self.BUCKETS] + ['>%d' % self.BUCKETS[-1]]
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean': self.items / self.batches if self.batches > 0 else 0.0,
+            'max': self.max_size,
+            'histogram': dict(zip(labels, self.histogram))
+        }
+
+class TickBatcher():
+    """
+    撮合資料批次收集器
+
+    依到達順序累積資料, 同一檔股票的先後順序不會改變,
+    達到 max_batch 筆或第一筆等待超過 max_delay_ms 時交出批次,
+    其餘的批次由 pump 在每次 PumpWaitingMessages() 之後呼叫 flush() 交出
+    """
+
+    def __init__(self, max_batch=500, max_delay_ms=100, clock=time.monotonic):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.clock = clock
+        self.pending = []
+        self.first_time = 0
+        self.stats = BatchStats()
+
+    def add(self, record):
+        """ 加入一筆資料, 達到上限時回傳批次, 否則回傳 None """
+        if not self.pending:
+            self.first_time = self.clock()
+        self.pending.append(record)
+        if len(self.pending) >= self.max_batch:
+            return self.flush()
+        if self.clock() - self.first_time >= self.max_delay:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """ 交出目前累積的資料, 沒有資料時回傳 None """
+        if not self.pending:
+            return None
+        batch = self.pending
+        self.pending = []
+        self.stats.add(len(batch))
+        return batch
+
+class Best5Conflator():
+    """
+    最佳五檔合併器
+
+    每檔股票只保留最新的一筆, 由呼叫端每 interval_ms 毫秒 flush() 一次,
+    被覆蓋掉的中間更新次數記錄在 collapsed
+    """
+
+    def __init__(self, interval_ms=100):
+        self.interval = interval_ms / 1000
+        self.latest = {}
+        self.updates = 0
+        self.collapsed = 0
+        self.flushes = 0
+
+    def put(self, stock_id, record):
+        """ 寫入最新資料 """
+        self.updates += 1
+        if stock_id in self.latest:
+            self.collapsed += 1
+        self.latest[stock_id] = record
+
+    def flush(self):
+        """ 取出各檔股票的最新資料 """
+        if not self.latest:
+            return []
+        self.flushes += 1
+        records = list(self.latest.values())
+        self.latest.clear()
+        return records
+
+    def summary(self):
+        """ 統計摘要 """
+        return {
+            'updates': self.updates,
+            'collapsed': self.collapsed,
+            'delivered': self.updates - self.collapsed - len(self.latest),
+            'flushes': self.flushes
+        }
@@ -0,0 +1,176 @@
+"""
+skcom.comthread
+
+獨立的 COM 事件執行緒, 以及交接事件給 asyncio event loop 的佇列
+"""
+
+import collections
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+
+from skcom.metrics import LatencyHistogram
+
+logger = logging.getLogger('skcom')
+
+class EventHandoff():
+    """
+    COM 執行緒到 asyncio event loop 的事件交接
+
+    COM 執行緒只做 deque.append(), 在 GIL 保護下不需要額外的鎖,
+    佇列由空轉為非空時才呼叫一次 call_soon_threadsafe() 喚醒 event loop,
+    因此每筆事件除了資料本身之外不會產生其他物件
+
+    * handler: 在 event loop 上逐筆處理事件的函數
+    * after: 每次批次處理完畢後呼叫的函數 (可省略)
+    * maxsize: 佇列上限, 滿了就丟棄新事件並計數
+    """
+
+    def __init__(self, loop, handler, maxsize=65536, after=None, clock=time.perf_counter):
+        # pylint: disable=too-many-arguments
+        self.loop = loop
+        self.handler = handler
+        self.after = after
+        self.maxsize = maxsize
+        self.clock = clock
+        self.queue = collections.deque()
+        self.scheduled = False
+        self.wake_time = 0.0
+        self.dropped = 0
+        self.max_depth = 0
+        self.latency = LatencyHistogram()
+
+    def put(self, record):
+        """ 在 COM 執行緒放入事件 """
+        depth = len(self.queue)
+        if depth >= self.maxsize:
+            self.dropped += 1
+            return
+        if depth >= self.max_depth:
+            self.max_depth = depth + 1
+        self.queue.append(record)
+        if not self.scheduled:
+            self.scheduled = True
+            self.wake_time = self.clock()
+            self.loop.call_soon_threadsafe(self.drain)
+
+    def drain(self):
+        """ 在 event loop 上取出並處理所有事件 """
+        # 先清除排程旗標再取資料, 確保取資料期間加入的事件會再排程一次
+        self.scheduled = False
+        self.latency.add(self.clock() - self.wake_time)
+        pending = self.queue
+        handler = self.handler
+        while pending:
+            handler(pending.popleft())
+        if self.after is not None:
+            self.after()
+
+    def depth(self):
+        """ 目前佇列深度 """
+        return len(self.queue)
+
+    def summary(self):
+        """ 統計摘要 """
+        return {
+            'depth': len(self.queue),
+            'max_depth': self.max_depth,
+            'dropped': self.dropped,
+            'latency': self.latency.summary()
+        }
+
+class ComThread(threading.Thread):
+    """
+    在獨立 STA 執行緒上建立 COM 元件並推送事件
+
+    * setup: 在 COM 執行緒上建立 COM 元件的函數, 回傳值 (事件接收器) 會保留到執行緒結束
+    * pump_messages: pythoncom.PumpWaitingMessages
+    * initialize, uninitialize: pythoncom.CoInitialize, pythoncom.CoUninitialize
+
+    其他執行緒透過 call() 或 submit() 把 COM 方法呼叫排進這個執行緒執行;
+    pause() 之後暫停推送 COM 事件, 但仍會執行排入的 COM 方法呼叫, resume() 恢復推送
+    """
+
+    def __init__(self, setup, pump_messages, interval_ms=5, initialize=None, uninitialize=None):
+        # pylint: disable=too-many-arguments
+        super().__init__(name='skcom-com', daemon=True)
+        self.setup = setup
+        self.pump_messages = pump_messages
+        self.interval = interval_ms / 1000
+        self.initialize = initialize
+        self.uninitialize = uninitialize
+        self.jobs = queue.Queue()
+        self.ready = threading.Event()
+        self.pumping = threading.Event()
+        self.pumping.set()
+        self.stopping = False
+        self.setup_error = None
+
+    def run(self):
+        if self.initialize is not None:
+            self.initialize()
+        sinks = None # pylint: disable=unused-variable
+        try:
+            try:
+                sinks = self.setup()
+            except Exception as ex: # pylint: disable=broad-except
+                self.setup_error = ex
+            self.ready.set()
+
+            while not self.stopping:
+                self.run_jobs()
+                if self.pumping.is_set():
+                    self.pump_messages()
+                time.sleep(self.interval)
+            self.run_jobs()
+        finally:
+            if self.uninitialize is not None:
+                self.uninitialize()
+            logger.debug('ComThread: done')
+
+    def run_jobs(self):
+        """ 執行其他執行緒排入的 COM 方法呼叫 """
+        while True:
+            try:
+                (func, args, future) = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except Exception as ex: # pylint: disable=broad-except
+                future.set_exception(ex)
+
+    def submit(self, func, *args):
+        """ 排入 COM 方法呼叫, 回傳 concurrent.futures.Future """
+        future = concurrent.futures.Future()
+        self.jobs.put((func, args, future))
+        return future
+
+    def call(self, func, *args):
+        """ 執行 COM 方法呼叫並等待結果, 在 COM 執行緒上呼叫時直接執行 """
+        if threading.current_thread() is self:
+            return func(*args)
+        return self.submit(func, *args).result()
+
+    def start_and_wait(self):
+        """ 啟動執行緒並等待 COM 元件建立完成 """
+        self.start()
+        self.ready.wait()
+        if self.setup_error is not None:
+            raise self.setup_error
+
+    def pause(self):
+        """ 暫停推送 COM 事件 """
+        self.pumping.clear()
+
+    def resume(self):
+        """ 恢復推送 COM 事件 """
+        self.pumping.set()
+
+    def stop(self):
+        """ 結束執行緒 """
+        self.stopping = True
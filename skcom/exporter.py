@@ -0,0 +1,198 @@
+"""
+skcom.exporter
+
+在 asyncio event loop 上提供 Prometheus 格式的監控指標
+"""
+
+import asyncio
+import logging
+import math
+import time
+
+from skcom.inflight import HOOK_KINDS
+
+logger = logging.getLogger('skcom')
+
+class MetricsExporter():
+    """
+    聽牌機監控指標 HTTP 服務, 只回應 GET /metrics
+
+    所有數值在抓取時才從聽牌機的計數器讀取, 每筆 tick 不會多做計數以外的工作;
+    只輸出累計計數與目前數值, 每秒速率請在 Prometheus 以 rate() 計算,
+    抓取不會改變任何狀態, 多個 Prometheus 同時抓取也不會互相影響
+    """
+
+    def __init__(self, receiver, host='127.0.0.1', port=9150, clock=time.monotonic):
+        self.receiver = receiver
+        self.host = host
+        self.port = port
+        self.clock = clock
+        self.server = None
+
+        # 統計
+        self.scrapes = 0
+
+    async def start(self):
+        """ 啟動 HTTP 服務 """
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info('監控指標: http://%s:%d/metrics', self.host, self.port)
+
+    async def stop(self):
+        """ 停止 HTTP 服務 """
+        if self.server is None:
+            return
+        self.server.close()
+        await self.server.wait_closed()
+        self.server = None
+
+    async def handle(self, reader, writer):
+        """ 處理 HTTP 請求 """
+        try:
+            request = await reader.readline()
+            while True:
+                line = await reader.readline()
+                if line in [b'\r\n', b'\n', b'']:
+                    break
+
+            parts = request.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status = '200 OK'
+                body = self.render().encode('utf-8')
+            else:
+                status = '404 Not Found'
+                body = b'Not Found\n'
+
+            writer.write((
+                'HTTP/1.0 %s\r\n'
+                'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                'Content-Length: %d\r\n'
+                'Connection: close\r\n\r\n' % (status, len(body))
+            ).encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def render(self):
+        """ 產生 Prometheus 文字格式的指標 """
+        # pylint: disable=too-many-locals
+        rcv = self.receiver
+        now = self.clock()
+        self.scrapes += 1
+        lines = []
+
+        def metric(name, mtype, helptext, samples):
+            lines.append('# HELP %s %s' % (name, helptext))
+            lines.append('# TYPE %s %s' % (name, mtype))
+            for (labels, value) in samples:
+                lines.append('%s%s %s' % (name, labels, format_value(value)))
+
+        # ticks, COM 執行緒模式下計數器可能同時被更新, 先複製
+        ticks = rcv.ticks_count.copy()
+        metric('skcom_ticks_total', 'counter', '個股累計 ticks 數量', [
+            (symbol_label(stock_no), count) for (stock_no, count) in ticks.items()
+        ])
+
+        metric('skcom_ticks_duplicates_total', 'counter', '依 nPtr 略過的重複 ticks 數量', [
+            ('', rcv.ticks_duplicates)
+        ])
+
+        metric('skcom_ticks_gaps_total', 'counter', 'nPtr 不連續的次數', [('', rcv.ticks_gaps)])
+        metric('skcom_ticks_gap_missing_total', 'counter', 'nPtr 缺漏的 ticks 數量', [
+            ('', rcv.ticks_gap_missing)
+        ])
+        metric('skcom_ticks_recovered_total', 'counter', '以 GetTickLONG 補回的 ticks 數量', [
+            ('', rcv.ticks_recovered)
+        ])
+
+        # 最佳五檔
+        books = rcv.best5_books.copy()
+        best5 = sum(book.updates for book in books.values())
+        metric('skcom_best5_updates_total', 'counter', '累計最佳五檔更新數量', [('', best5)])
+
+        # 訂閱分頁
+        pages = rcv.subscriptions.page_stats(ticks, books)
+        metric('skcom_page_symbols', 'gauge', '每個 psPageNo 訂閱的股票數量', [
+            ('{page="%d"}' % page_no, page['symbols']) for (page_no, page) in pages.items()
+        ])
+        metric('skcom_page_events_total', 'counter', '每個 psPageNo 累計的 ticks 與五檔事件數量', [
+            ('{page="%d"}' % page_no, page['events']) for (page_no, page) in pages.items()
+        ])
+
+        # hook 佇列, 沒有設定 set_hook_limit() 的事件類型只有執行中的數量
+        gates = rcv.hook_gates
+        metric('skcom_hook_inflight', 'gauge', '執行中的 coroutine hook 數量', [
+            (kind_label(kind), gates[kind].inflight if kind in gates else rcv.hook_inflight[kind])
+            for kind in HOOK_KINDS
+        ])
+        metric('skcom_hook_pending', 'gauge', '等待執行的 coroutine hook 數量', [
+            (kind_label(kind), len(gates[kind].pending) if kind in gates else 0)
+            for kind in HOOK_KINDS
+        ])
+        metric('skcom_hook_dropped_total', 'counter', '被丟棄或合併的 coroutine hook 數量', [
+            (kind_label(kind), gates[kind].dropped + gates[kind].conflated if kind in gates else 0)
+            for kind in HOOK_KINDS
+        ])
+        handoffs = [('ticks', rcv.ticks_handoff), ('best5', rcv.best5_handoff)]
+        metric('skcom_handoff_depth', 'gauge', 'COM 執行緒交接佇列深度', [
+            (kind_label(kind), handoff.depth() if handoff is not None else 0)
+            for (kind, handoff) in handoffs
+        ])
+        metric('skcom_handoff_dropped_total', 'counter', 'COM 執行緒交接佇列滿載丟棄數量', [
+            (kind_label(kind), handoff.dropped if handoff is not None else 0)
+            for (kind, handoff) in handoffs
+        ])
+
+        # 事件推送
+        hist = rcv.pump_cycle_time
+        lines.append('# HELP skcom_pump_cycle_seconds 每輪推送 COM 事件與送出批次的時間')
+        lines.append('# TYPE skcom_pump_cycle_seconds histogram')
+        acc = 0
+        for (upper, count) in zip(hist.bounds, hist.counts):
+            acc += count
+            lines.append('skcom_pump_cycle_seconds_bucket{le="%g"} %d' % (upper, acc))
+        lines.append('skcom_pump_cycle_seconds_bucket{le="+Inf"} %d' % hist.count)
+        lines.append('skcom_pump_cycle_seconds_sum %s' % format_value(hist.total))
+        lines.append('skcom_pump_cycle_seconds_count %d' % hist.count)
+        metric('skcom_pump_lag_seconds', 'gauge', '上一輪推送比預定時間晚醒來的秒數', [
+            ('', rcv.pump_lag)
+        ])
+
+        # 生命週期
+        metric('skcom_receiver_state', 'gauge', '聽牌機生命週期狀態', [
+            ('{state="%s"}' % state.name, 1 if rcv.state is state else 0)
+            for state in type(rcv.state)
+        ])
+        metric('skcom_retry_count', 'gauge', '目前連線重試次數', [('', rcv.retry_count)])
+        metric('skcom_events_total', 'counter', '累計 COM 事件數量', [('', rcv.event_count)])
+        if rcv.last_event_time is None:
+            age = math.nan
+        else:
+            age = max(0.0, now - rcv.last_event_time)
+        metric('skcom_last_event_age_seconds', 'gauge', '距離最後一次收到 COM 事件的秒數', [
+            ('', age)
+        ])
+
+        return '\n'.join(lines) + '\n'
+
+def symbol_label(stock_no):
+    """ 股票代碼標籤 """
+    return '{symbol="%s"}' % escape_label(stock_no)
+
+def kind_label(kind):
+    """ 事件類型標籤 """
+    return '{kind="%s"}' % escape_label(kind)
+
+def escape_label(value):
+    """ 標籤值跳脫 """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value):
+    """ 數值格式 """
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        return repr(value)
+    return str(value)
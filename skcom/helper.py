@@ -12,12 +12,9 @@ import re
 import shutil
 import site
 import subprocess
-import winreg
 import zipfile
 from getpass import getpass
 
-import comtypes.client
-import win32com.client
 import requests
 from packaging import version
 from requests.exceptions import ConnectionError as RequestsConnectionError
@@ -25,6 +22,21 @@ import yaml
 import base64
 import busm
 
+# 安裝工具才會用到的 Windows 元件, 各自載入
+# 非 Windows 環境 (例如使用 skcom.simulator 的 CI) 仍然可以載入設定檔與 logging
+try:
+    import winreg
+except ImportError:
+    winreg = None
+try:
+    import comtypes.client
+except ImportError:
+    comtypes = None
+try:
+    import win32com.client
+except ImportError:
+    win32com = None
+
 from skcom.crypto import decrypt_text
 from skcom.exception import ShellException
 from skcom.exception import NetworkException
@@ -125,6 +137,13 @@ def powershell_start(cmd, admin_priv=False):
     # print('RETURN:')
     # print(exitcode)
 
+def require_module(module, name):
+    """
+    檢查安裝工具需要的 Windows 元件是否已載入
+    """
+    if module is None:
+        raise ConfigException('無法載入 %s, 這個功能只能在 Windows 環境使用' % name)
+
 def pack_arglist(args):
     """
     處理 Start-Process -ArgumentList 的參數內容
@@ -134,22 +153,28 @@ def pack_arglist(args):
     packed = "'{}'".format(packed)
     return packed
 
-def reg_read_value(node, root=winreg.HKEY_LOCAL_MACHINE):
+def reg_read_value(node, root=None):
     """
-    讀取單一值
+    讀取單一值, root 省略時為 HKEY_LOCAL_MACHINE
     """
+    require_module(winreg, 'winreg')
     (key, name) = node.split(':')
+    if root is None:
+        root = winreg.HKEY_LOCAL_MACHINE
     handle = winreg.OpenKey(root, key)
     (value, _) = winreg.QueryValueEx(handle, name)
     winreg.CloseKey(handle)
     return value
 
-def reg_list_value(key, root=winreg.HKEY_LOCAL_MACHINE):
+def reg_list_value(key, root=None):
     """
-    列舉機碼下的所有值
+    列舉機碼下的所有值, root 省略時為 HKEY_LOCAL_MACHINE
     """
+    require_module(winreg, 'winreg')
     i = 0
     values = {}
+    if root is None:
+        root = winreg.HKEY_LOCAL_MACHINE
     handle = winreg.OpenKey(root, key)
 
     while True:
@@ -166,12 +191,15 @@ def reg_list_value(key, root=winreg.HKEY_LOCAL_MACHINE):
     winreg.CloseKey(handle)
     return values
 
-def reg_find_value(key, value, root=winreg.HKEY_LOCAL_MACHINE):
+def reg_find_value(key, value, root=None):
     """
     遞迴搜尋機碼下的值, 回傳一組 tuple (所在位置, 數值)
-    字串資料採用局部比對, 其餘型態採用完整比對
+    字串資料採用局部比對, 其餘型態採用完整比對, root 省略時為 HKEY_LOCAL_MACHINE
     """
+    require_module(winreg, 'winreg')
     i = 0
+    if root is None:
+        root = winreg.HKEY_LOCAL_MACHINE
     handle = winreg.OpenKey(root, key)
     vtype = type(value)
 
@@ -290,6 +318,7 @@ def verof_skcom():
     try:
         (_, dll_path) = reg_find_value(r'SOFTWARE\Classes\TypeLib', 'SKCOM.dll')
         if dll_path != '':
+            require_module(win32com, 'win32com')
             fso = win32com.client.Dispatch('Scripting.FileSystemObject')
             skcom_ver = fso.GetFileVersion(dll_path)
         else:
@@ -428,6 +457,7 @@ def generate_mod():
     """
     logger = logging.getLogger('helper')
     logger.info(r'生成 site-packages\comtypes\gen\SKCOMLib.py')
+    require_module(comtypes, 'comtypes')
     dll_path = os.path.expanduser(r'~\.skcom\lib\SKCOM.dll')
     comtypes.client.GetModule(dll_path)
 
@@ -0,0 +1,159 @@
+"""
+skcom.inflight
+
+限制 coroutine hook 同時執行的數量
+"""
+
+import asyncio
+import collections
+import enum
+import logging
+
+logger = logging.getLogger('skcom')
+
+# 可以設定 coroutine hook 數量限制的事件類型
+HOOK_KINDS = ('ticks', 'ticks_batch', 'best5', 'kline', 'bar')
+
+class HookPolicy(enum.Enum):
+    """ 同時執行數量達到上限時的處理方式 """
+    BLOCK = enum.auto()        # 暫停推送 COM 事件, 等待 hook 消化
+    DROP_OLDEST = enum.auto()  # 丟棄等待中最舊的事件
+    DROP_NEWEST = enum.auto()  # 丟棄新事件
+    CONFLATE = enum.auto()     # 同一檔股票只保留最新的等待事件, 沒有股票代碼的事件只保留最新一筆
+
+class HookGate():
+    """
+    單一事件類型的 coroutine hook 閘門
+
+    執行中的 task 不超過 limit 個, 超過的 coroutine 依照 policy 排隊或丟棄,
+    被丟棄的 coroutine 會直接 close(), 不會執行
+
+    等待中的 coroutine 最多 backlog 個 (DROP_OLDEST 為 limit 個), 超過時丟棄最舊的;
+    BLOCK 模式只能在兩輪事件推送之間暫停, 同一輪推送進來的事件超過 backlog 時也會丟棄
+    """
+
+    # 等待中 coroutine 數量的預設上限
+    BACKLOG = 1024
+
+    def __init__(self, name, limit, policy=HookPolicy.BLOCK, backlog=None):
+        self.name = name
+        self.limit = limit
+        self.policy = policy
+        if policy is HookPolicy.DROP_OLDEST:
+            self.backlog = limit
+        elif backlog is None:
+            self.backlog = self.BACKLOG
+        else:
+            self.backlog = backlog
+        self.inflight = 0
+        self.pending = collections.OrderedDict()
+        self.seq = 0
+        self.ready = None
+        # 建立 task 之前包裝 coroutine 的函數, 計時探針使用
+        self.wrap = None
+        # BLOCK 模式可否繼續推送事件改變時呼叫的函數, 參數為 is_ready(), 獨立 COM 執行緒使用
+        self.notify = None
+
+        # 統計
+        self.started = 0
+        self.completed = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.max_inflight = 0
+        self.max_pending = 0
+
+    def submit(self, coro, key=None):
+        """ 排入 coroutine, key 為 CONFLATE 合併用的股票代碼 """
+        if self.inflight < self.limit and not self.pending:
+            self.start(coro)
+            if not self.is_ready():
+                self.blocked()
+            return
+
+        if self.policy is HookPolicy.DROP_NEWEST:
+            coro.close()
+            self.dropped += 1
+            return
+
+        if self.policy is HookPolicy.CONFLATE:
+            # 沒有股票代碼 (例如 ticks_batch) 時 key 為 None, 所有事件合併為最新一筆
+            old = self.pending.pop(key, None)
+            if old is not None:
+                old.close()
+                self.conflated += 1
+            self.pending[key] = coro
+        else:
+            self.seq += 1
+            self.pending[self.seq] = coro
+
+        if len(self.pending) > self.backlog:
+            (_, old) = self.pending.popitem(last=False)
+            old.close()
+            self.dropped += 1
+        if len(self.pending) > self.max_pending:
+            self.max_pending = len(self.pending)
+        self.blocked()
+
+    def blocked(self):
+        """ 達到上限, 暫停推送事件 """
+        if self.ready is not None:
+            self.ready.clear()
+        if self.notify is not None and self.policy is HookPolicy.BLOCK:
+            self.notify(False)
+
+    def start(self, coro):
+        """ 建立 task """
+        self.inflight += 1
+        self.started += 1
+        if self.inflight > self.max_inflight:
+            self.max_inflight = self.inflight
+        if self.wrap is not None:
+            coro = self.wrap(coro)
+        task = asyncio.get_running_loop().create_task(coro)
+        task.add_done_callback(self.done)
+
+    def done(self, task):
+        """ task 結束, 遞補等待中的 coroutine """
+        self.inflight -= 1
+        self.completed += 1
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('%s hook 發生例外: %s', self.name, task.exception())
+
+        while self.pending and self.inflight < self.limit:
+            (_, coro) = self.pending.popitem(last=False)
+            self.start(coro)
+
+        if self.is_ready():
+            if self.ready is not None:
+                self.ready.set()
+            if self.notify is not None and self.policy is HookPolicy.BLOCK:
+                self.notify(True)
+
+    def is_ready(self):
+        """ 是否可以繼續推送事件 """
+        return not self.pending and self.inflight < self.limit
+
+    async def wait_ready(self):
+        """ BLOCK 模式下等待 hook 消化到上限以內 """
+        if self.is_ready():
+            return
+        if self.ready is None:
+            self.ready = asyncio.Event()
+        self.ready.clear()
+        await self.ready.wait()
+
+    def summary(self):
+        """ 統計摘要 """
+        return {
+            'policy': self.policy.name,
+            'limit': self.limit,
+            'backlog': self.backlog,
+            'inflight': self.inflight,
+            'pending': len(self.pending),
+            'started': self.started,
+            'completed': self.completed,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+            'max_inflight': self.max_inflight,
+            'max_pending': self.max_pending
+        }
@@ -0,0 +1,314 @@
+"""
+skcom.journal
+
+ticks 與最佳五檔的二進位日誌, 以背景執行緒批次寫入檔案
+"""
+
+import collections
+import logging
+import os
+import os.path
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+
+from skcom.metrics import LatencyHistogram
+
+logger = logging.getLogger('skcom')
+
+# 檔案開頭的識別碼
+JOURNAL_MAGIC = b'SKJ1'
+
+# 紀錄類型
+REC_TICK = 1
+REC_HISTORY = 2
+REC_BEST5 = 3
+REC_META = 4
+REC_KLINE = 5
+
+# 所有欄位都是 COM 事件的原始整數, 尚未做價格換算
+# type, sMarketNo, nStockIndex, nPtr, nDate, nTimehms, nTimemillis,
+# nBid, nAsk, nClose, nQty, nSimulate, 接收時間 (epoch 奈秒)
+TICK_STRUCT = struct.Struct('<Bxhiiiiiiiiihxxq')
+
+# type, sMarketNo, nStockIndex, 買進五檔 + 延伸檔 (價, 量), 賣出五檔 + 延伸檔 (價, 量),
+# nSimulate, 接收時間 (epoch 奈秒)
+BEST5_STRUCT = struct.Struct('<Bxhi' + 'i' * 24 + 'hxxq')
+
+# 變動長度紀錄, 標頭之後接 UTF-8 字串
+# type, sMarketNo, nStockIndex, sDecimal, 字串長度, 接收時間 (epoch 奈秒)
+# * REC_META: 個股基本資料, 字串為 "股票代碼\t股票名稱", 從代碼查詢的項目 sMarketNo, nStockIndex 為 -1
+# * REC_KLINE: K 線資料, 字串為 "股票代碼\tbstrData", 其他欄位為 0
+VAR_STRUCT = struct.Struct('<BxhihHq')
+
+RECORD_STRUCTS = {
+    REC_TICK: TICK_STRUCT,
+    REC_HISTORY: TICK_STRUCT,
+    REC_BEST5: BEST5_STRUCT
+}
+
+# 接收時間在固定長度紀錄的最後 8 bytes, 在變動長度紀錄標頭的位置
+RECV_STRUCT = struct.Struct('<q')
+VAR_RECV_OFFSET = VAR_STRUCT.size - RECV_STRUCT.size
+
+def journal_filename(directory, day):
+    """ 日誌檔名, day 為 YYYYMMDD 字串 """
+    return os.path.join(directory, 'quotes-%s.skj' % day)
+
+def record_recv_ns(record):
+    """ 紀錄的接收時間 (epoch 奈秒) """
+    fmt = RECORD_STRUCTS.get(record[0])
+    if fmt is None:
+        return RECV_STRUCT.unpack_from(record, VAR_RECV_OFFSET)[0]
+    return RECV_STRUCT.unpack_from(record, fmt.size - RECV_STRUCT.size)[0]
+
+def scan_records(data, offset=0):
+    """
+    逐筆切分日誌內容, 產生 (紀錄類型, 開始位置, 結束位置),
+    最後一筆寫入不完整時停止, 可以用最後的結束位置判斷完整資料的長度
+    """
+    size = len(data)
+    while offset < size:
+        rec_type = data[offset]
+        if rec_type in (REC_META, REC_KLINE):
+            if offset + VAR_STRUCT.size > size:
+                return
+            length = VAR_STRUCT.unpack_from(data, offset)[4]
+            end = offset + VAR_STRUCT.size + length
+        else:
+            fmt = RECORD_STRUCTS.get(rec_type)
+            if fmt is None:
+                raise ValueError('無法識別的紀錄類型 %d, 位置 %d' % (rec_type, offset))
+            end = offset + fmt.size
+        if end > size:
+            return
+        yield (rec_type, offset, end)
+        offset = end
+
+class JournalWriter():
+    """
+    二進位日誌寫入器
+
+    COM 事件回呼只負責 struct.pack() 與 deque.append(),
+    背景執行緒每 commit_ms 毫秒把累積的紀錄一次寫入並 fsync (group commit)
+
+    * 每筆紀錄依接收時間的日期寫入當天的檔案, 跨日前後的紀錄不會寫錯檔案
+    * 等待寫入的紀錄最多 maxsize 筆, 磁碟跟不上時丟棄新紀錄並計數
+    * 開啟既有的檔案時截掉上次異常結束留下的不完整紀錄, 再接著寫入
+    """
+
+    def __init__(self, directory, commit_ms=200, fsync=True, maxsize=1048576):
+        # pylint: disable=too-many-arguments
+        self.directory = directory
+        self.commit_interval = commit_ms / 1000
+        self.fsync = fsync
+        self.maxsize = maxsize
+        self.queue = collections.deque()
+        self.thread = None
+        self.stopping = threading.Event()
+        self.file = None
+        self.day = None
+        self.day_range = (0, 0)     # 目前檔案的日期範圍 [開始, 結束) epoch 奈秒
+
+        # 統計
+        self.dropped = 0
+        self.truncated = 0
+        self.records = 0
+        self.ticks = 0
+        self.bytes = 0
+        self.commits = 0
+        self.begin_time = None
+        self.commit_time = LatencyHistogram()
+
+    def write_tick(self, history, market_no, index, ptr, date, timehms, timemillis,
+                   bid, ask, close, qty, simulate):
+        """ 紀錄一筆即時或回補 tick """
+        # pylint: disable=too-many-arguments
+        self.put(TICK_STRUCT.pack(
+            REC_HISTORY if history else REC_TICK,
+            market_no, index, ptr, date, timehms, timemillis,
+            bid, ask, close, qty, simulate, time.time_ns()
+        ))
+
+    def write_best5(self, market_no, index, levels, simulate):
+        """ 紀錄一筆最佳五檔, levels 與 Best5Book.update() 相同, 只寫入前 24 個價量 """
+        self.put(BEST5_STRUCT.pack(
+            REC_BEST5, market_no, index, *levels[:24], simulate, time.time_ns()
+        ))
+
+    def write_meta(self, market_no, index, stock_no, name, decimal):
+        """ 紀錄個股基本資料, 重播時不需要呼叫 GetStockByIndexLONG() """
+        # pylint: disable=too-many-arguments
+        self.write_text(REC_META, market_no, index, decimal, '%s\t%s' % (stock_no, name))
+
+    def write_kline(self, stock_no, data):
+        """ 紀錄一筆 K 線資料 """
+        self.write_text(REC_KLINE, 0, 0, 0, '%s\t%s' % (stock_no, data))
+
+    def write_text(self, rec_type, market_no, index, decimal, text):
+        """ 寫入變動長度紀錄 """
+        # pylint: disable=too-many-arguments
+        payload = text.encode('utf-8')
+        self.put(VAR_STRUCT.pack(
+            rec_type, market_no, index, decimal, len(payload), time.time_ns()
+        ) + payload)
+
+    def put(self, record):
+        """ 排入一筆紀錄, 佇列滿了就丟棄 """
+        if len(self.queue) >= self.maxsize:
+            self.dropped += 1
+            return
+        self.queue.append(record)
+
+    def start(self):
+        """ 啟動背景寫入執行緒 """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.begin_time = time.monotonic()
+        self.thread = threading.Thread(target=self.run, name='skcom-journal', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """ 寫入剩餘紀錄並結束背景執行緒 """
+        if self.thread is None:
+            return
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+
+    def run(self):
+        """ 背景寫入迴圈 """
+        try:
+            while not self.stopping.wait(self.commit_interval):
+                self.commit()
+            self.commit()
+        finally:
+            self.close_file()
+
+    def rotate(self, recv_ns):
+        """ 切換到接收時間 recv_ns 當天 (本地時間) 的日誌檔 """
+        midnight = datetime.fromtimestamp(recv_ns // 1000000000).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.day_range = (
+            int(midnight.timestamp()) * 1000000000,
+            int((midnight + timedelta(days=1)).timestamp()) * 1000000000
+        )
+        day = midnight.strftime('%Y%m%d')
+        if day == self.day:
+            return
+        self.close_file()
+        path = journal_filename(self.directory, day)
+        self.file = open(path, 'ab')
+        self.repair(path)
+        self.day = day
+        logger.debug('JournalWriter: %s', path)
+
+    def repair(self, path):
+        """ 截掉檔案結尾不完整的紀錄, 新檔案寫入識別碼 """
+        size = os.path.getsize(path)
+        if size < len(JOURNAL_MAGIC):
+            self.file.truncate(0)
+            self.file.write(JOURNAL_MAGIC)
+            return
+
+        with open(path, 'rb') as journal:
+            data = journal.read()
+        end = len(JOURNAL_MAGIC)
+        try:
+            for (_, _, end) in scan_records(data, end):
+                pass
+        except ValueError as ex:
+            logger.warning('JournalWriter: %s', ex)
+        if end < size:
+            logger.warning('JournalWriter: 截掉 %s 結尾不完整的 %d bytes', path, size - end)
+            self.file.truncate(end)
+            self.truncated += size - end
+
+    def close_file(self):
+        """ 關閉目前的日誌檔 """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def commit(self):
+        """ 將累積的紀錄一次寫入檔案 """
+        if not self.queue:
+            return
+
+        begin = time.perf_counter()
+        chunks = []
+        pending = self.queue
+        while pending:
+            chunks.append(pending.popleft())
+
+        # 依接收時間的日期分段寫入
+        (day_begin, day_end) = self.day_range
+        segment = []
+        for chunk in chunks:
+            recv_ns = record_recv_ns(chunk)
+            if not day_begin <= recv_ns < day_end:
+                self.write_segment(segment)
+                segment = []
+                self.rotate(recv_ns)
+                (day_begin, day_end) = self.day_range
+            segment.append(chunk)
+        self.write_segment(segment)
+
+        self.records += len(chunks)
+        self.ticks += sum(1 for chunk in chunks if chunk[0] in (REC_TICK, REC_HISTORY))
+        self.bytes += sum(len(chunk) for chunk in chunks)
+        self.commits += 1
+        self.commit_time.add(time.perf_counter() - begin)
+
+    def write_segment(self, chunks):
+        """ 寫入同一天的紀錄 """
+        if not chunks:
+            return
+        self.file.write(b''.join(chunks))
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def summary(self):
+        """ 統計摘要 """
+        elapsed = time.monotonic() - self.begin_time if self.begin_time is not None else 0
+        return {
+            'records': self.records,
+            'bytes': self.bytes,
+            'commits': self.commits,
+            'pending': len(self.queue),
+            'dropped': self.dropped,
+            'truncated': self.truncated,
+            'bytes_per_sec': self.bytes / elapsed if elapsed > 0 else 0.0,
+            'records_per_sec': self.records / elapsed if elapsed > 0 else 0.0,
+            'bytes_per_tick': self.bytes / self.ticks if self.ticks > 0 else 0.0,
+            'commit_time': self.commit_time.summary()
+        }
+
+def read_journal(path):
+    """
+    逐筆讀取日誌, 產生 (紀錄類型, 欄位 tuple), 欄位最後一項為接收時間
+
+    * REC_TICK, REC_HISTORY: OnNotifyTicksLONG 的參數 (sMarketNo 到 nSimulate)
+    * REC_BEST5: OnNotifyBest5LONG 的參數 (sMarketNo 到 nSimulate)
+    * REC_META: (sMarketNo, nStockIndex, sDecimal, 股票代碼, 股票名稱)
+    * REC_KLINE: (股票代碼, bstrData)
+    """
+    with open(path, 'rb') as journal:
+        magic = journal.read(len(JOURNAL_MAGIC))
+        if magic != JOURNAL_MAGIC:
+            raise ValueError('不是 skcom 日誌檔: %s' % path)
+        data = journal.read()
+
+    for (rec_type, offset, end) in scan_records(data):
+        if rec_type in (REC_META, REC_KLINE):
+            (_, market_no, index, decimal, _, recv_ns) = VAR_STRUCT.unpack_from(data, offset)
+            (stock_no, text) = data[offset + VAR_STRUCT.size:end].decode('utf-8').split('\t', 1)
+            if rec_type == REC_META:
+                yield (rec_type, (market_no, index, decimal, stock_no, text, recv_ns))
+            else:
+                yield (rec_type, (stock_no, text, recv_ns))
+        else:
+            yield (rec_type, RECORD_STRUCTS[rec_type].unpack_from(data, offset)[1:])
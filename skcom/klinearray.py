@@ -0,0 +1,154 @@
+"""
+skcom.klinearray
+
+日 K 欄位式資料, 把 OnNotifyKLineData 的原始字串一次轉換成 NumPy 陣列
+"""
+
+from skcom.exception import ConfigException
+from skcom.klinestore import int_to_date
+from skcom.npcompat import np, require_numpy
+
+if np is not None:
+    # 與 klinestore.BAR_STRUCT 相同的紀錄格式, 可以直接對應資料檔內容
+    BAR_DTYPE = np.dtype([
+        ('date', '<i4'),
+        ('open', '<f8'),
+        ('high', '<f8'),
+        ('low', '<f8'),
+        ('close', '<f8'),
+        ('volume', '<i8')
+    ])
+else:
+    BAR_DTYPE = None
+
+# 日 K 字串的欄位數: 日期, 開, 高, 低, 收, 量
+KLINE_FIELDS = 6
+
+def dates_from_int(values):
+    """ YYYYMMDD 整數陣列轉換為 datetime64[D] """
+    values = np.asarray(values, dtype=np.int64)
+    years = (values // 10000 - 1970).astype('M8[Y]')
+    months = (values // 100 % 100 - 1).astype('m8[M]')
+    days = (values % 100 - 1).astype('m8[D]')
+    return (years + months).astype('M8[D]') + days
+
+def dates_to_int(dates):
+    """ datetime64[D] 陣列轉換為 YYYYMMDD 整數 """
+    years = dates.astype('M8[Y]')
+    months = dates.astype('M8[M]')
+    return (
+        (years.astype(np.int64) + 1970) * 10000 +
+        ((months - years).astype(np.int64) + 1) * 100 +
+        (dates - months).astype(np.int64) + 1
+    )
+
+class KLineColumns():
+    """
+    單一股票的欄位式日 K
+
+    date 為 datetime64[D], open/high/low/close 為 float64, volume 為 int64;
+    kline['id'], kline['name'], kline['quotes'] 維持原本 dict 格式的讀取方式,
+    其中 quotes 會即時轉換成 dict 的 list
+    """
+
+    COLUMNS = ('date', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, stock_id, name, date, open_price, high, low, close, volume):
+        # pylint: disable=too-many-arguments
+        self.id = stock_id  # pylint: disable=invalid-name
+        self.name = name
+        self.date = date
+        self.open = open_price
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def parse(cls, stock_id, name, lines):
+        """ 一次解析 OnNotifyKLineData 收到的所有 bstrData 字串 """
+        require_numpy()
+        if not lines:
+            return cls.empty(stock_id, name)
+        # 日期去掉 "/" 之後與其他欄位一樣都是數字, 整批交給 numpy 轉換
+        text = ' '.join(lines).replace('/', '').replace(',', '')
+        values = np.fromstring(text, dtype=np.float64, sep=' ').reshape(-1, KLINE_FIELDS)
+        return cls(
+            stock_id, name, dates_from_int(values[:, 0]),
+            values[:, 1].copy(), values[:, 2].copy(),
+            values[:, 3].copy(), values[:, 4].copy(),
+            values[:, 5].astype(np.int64)
+        )
+
+    @classmethod
+    def from_bytes(cls, stock_id, name, data):
+        """ 由日 K 資料檔的原始紀錄建立 """
+        require_numpy()
+        bars = np.frombuffer(data, dtype=BAR_DTYPE)
+        return cls(
+            stock_id, name, dates_from_int(bars['date']),
+            bars['open'].copy(), bars['high'].copy(), bars['low'].copy(),
+            bars['close'].copy(), bars['volume'].copy()
+        )
+
+    @classmethod
+    def empty(cls, stock_id, name):
+        """ 沒有資料的日 K """
+        return cls.from_bytes(stock_id, name, b'')
+
+    def __len__(self):
+        return len(self.date)
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.id
+        if key == 'name':
+            return self.name
+        if key == 'quotes':
+            return self.quotes()
+        raise KeyError(key)
+
+    def tail(self, limit):
+        """ 最後 limit 筆, limit 為 0 時回傳全部 """
+        if limit <= 0 or limit >= len(self):
+            return self
+        return KLineColumns(self.id, self.name, *(
+            getattr(self, column)[-limit:] for column in self.COLUMNS
+        ))
+
+    def bars(self):
+        """ 轉換為 (日期, 開, 高, 低, 收, 量) 的 list, 日期為 YYYYMMDD 整數, 用於寫入資料庫 """
+        return list(zip(
+            dates_to_int(self.date).tolist(),
+            self.open.tolist(), self.high.tolist(), self.low.tolist(),
+            self.close.tolist(), self.volume.tolist()
+        ))
+
+    def quotes(self):
+        """ 轉換為原本 kline_hook 的 quotes 格式 """
+        return [{
+            'date': int_to_date(date),
+            'open': open_price,
+            'high': high,
+            'low': low,
+            'close': close,
+            'volume': volume
+        } for (date, open_price, high, low, close, volume) in self.bars()]
+
+    def to_dict(self):
+        """ 轉換為原本 kline_hook 的 dict 格式 """
+        return {
+            'id': self.id,
+            'name': self.name,
+            'quotes': self.quotes()
+        }
+
+    def to_pandas(self):
+        """ 轉換為以日期為索引的 pandas DataFrame (需要 pandas) """
+        try:
+            import pandas as pd  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            raise ConfigException('需要安裝 pandas 才能使用這個功能: pip install pandas') from None
+        return pd.DataFrame({
+            column: getattr(self, column) for column in self.COLUMNS[1:]
+        }, index=pd.DatetimeIndex(self.date, name='date'))
@@ -0,0 +1,149 @@
+"""
+skcom.klinestore
+
+日 K 本機資料庫, 每檔股票一個固定長度紀錄的二進位檔
+"""
+
+import logging
+import os
+import os.path
+import struct
+
+logger = logging.getLogger('skcom')
+
+# 檔案開頭的識別碼
+KLINE_MAGIC = b'SKK1'
+
+# 日期 (YYYYMMDD), 開, 高, 低, 收, 量
+BAR_STRUCT = struct.Struct('<iddddq')
+
+def date_to_int(date):
+    """ 'YYYY-MM-DD' 轉換為 YYYYMMDD 整數 """
+    return int(date.replace('-', ''))
+
+def int_to_date(value):
+    """ YYYYMMDD 整數轉換為 'YYYY-MM-DD' """
+    return '%04d-%02d-%02d' % (value // 10000, value // 100 % 100, value % 100)
+
+class KLineStore():
+    """
+    日 K 本機資料庫
+
+    紀錄依日期排序, 新資料的日期都在最後一筆之後時直接附加到檔尾,
+    否則與既有資料合併後重寫整個檔案; 第一筆, 最後一筆與筆數都可以直接定位讀取
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # 統計
+        self.bars_read = 0
+        self.bars_written = 0
+
+    def filename(self, stock_no):
+        """ 個股資料檔名 """
+        return os.path.join(self.directory, '%s.skk' % stock_no)
+
+    def count(self, stock_no):
+        """ 已儲存的日 K 數量 """
+        path = self.filename(stock_no)
+        if not os.path.isfile(path):
+            return 0
+        return (os.path.getsize(path) - len(KLINE_MAGIC)) // BAR_STRUCT.size
+
+    def span(self, stock_no):
+        """ 已儲存資料的 (第一天, 最後一天, 筆數), 日期為 YYYYMMDD 整數, 沒有資料時回傳 None """
+        count = self.count(stock_no)
+        if count == 0:
+            return None
+        with open(self.filename(stock_no), 'rb') as kfile:
+            kfile.seek(len(KLINE_MAGIC))
+            first = BAR_STRUCT.unpack(kfile.read(BAR_STRUCT.size))[0]
+            kfile.seek(len(KLINE_MAGIC) + (count - 1) * BAR_STRUCT.size)
+            last = BAR_STRUCT.unpack(kfile.read(BAR_STRUCT.size))[0]
+        return (first, last, count)
+
+    def read_bytes(self, stock_no, limit=0):
+        """ 讀取最後 limit 筆日 K 的原始紀錄, limit 為 0 時讀取全部 """
+        count = self.count(stock_no)
+        if count == 0:
+            return b''
+        skip = max(0, count - limit) if limit > 0 else 0
+        with open(self.filename(stock_no), 'rb') as kfile:
+            magic = kfile.read(len(KLINE_MAGIC))
+            if magic != KLINE_MAGIC:
+                logger.warning('日 K 資料檔格式錯誤: %s', self.filename(stock_no))
+                return b''
+            kfile.seek(skip * BAR_STRUCT.size, os.SEEK_CUR)
+            data = kfile.read((count - skip) * BAR_STRUCT.size)
+        self.bars_read += count - skip
+        return data
+
+    def read(self, stock_no, limit=0):
+        """ 讀取最後 limit 筆日 K, limit 為 0 時讀取全部, 回傳 (日期, 開, 高, 低, 收, 量) 的 list """
+        return list(BAR_STRUCT.iter_unpack(self.read_bytes(stock_no, limit)))
+
+    def quotes(self, stock_no, limit=0):
+        """ 讀取最後 limit 筆日 K, 格式與 kline_hook 的 quotes 相同 """
+        return [{
+            'date': int_to_date(date),
+            'open': open_price,
+            'high': high,
+            'low': low,
+            'close': close,
+            'volume': volume
+        } for (date, open_price, high, low, close, volume) in self.read(stock_no, limit)]
+
+    def merge(self, stock_no, quotes):
+        """
+        寫入 kline_hook 格式的日 K, 同一天的資料以新資料為準, 回傳新增的筆數
+        """
+        return self.merge_bars(stock_no, [
+            (date_to_int(q['date']), q['open'], q['high'], q['low'], q['close'], q['volume'])
+            for q in quotes
+        ])
+
+    def merge_bars(self, stock_no, bars):
+        """
+        寫入 (日期, 開, 高, 低, 收, 量) 格式的日 K, 日期為 YYYYMMDD 整數, 回傳新增的筆數
+        """
+        if not bars:
+            return 0
+
+        bars = sorted(bars)
+        span = self.span(stock_no)
+        path = self.filename(stock_no)
+
+        # 上次寫入中斷時檔尾會有不完整的紀錄, 改用重寫
+        aligned = span is None or \
+            (os.path.getsize(path) - len(KLINE_MAGIC)) % BAR_STRUCT.size == 0
+        if aligned and (span is None or bars[0][0] > span[1]):
+            # 全部都是新日期, 直接附加
+            with open(path, 'ab') as kfile:
+                if span is None:
+                    kfile.truncate(0)
+                    kfile.write(KLINE_MAGIC)
+                kfile.write(b''.join(BAR_STRUCT.pack(*bar) for bar in bars))
+            self.bars_written += len(bars)
+            return len(bars)
+
+        merged = {bar[0]: bar for bar in self.read(stock_no)}
+        before = len(merged)
+        for bar in bars:
+            merged[bar[0]] = bar
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as kfile:
+            kfile.write(KLINE_MAGIC)
+            kfile.write(b''.join(BAR_STRUCT.pack(*merged[date]) for date in sorted(merged)))
+        os.replace(tmp_path, path)
+        self.bars_written += len(merged)
+        return len(merged) - before
+
+    def summary(self):
+        """ 統計摘要 """
+        return {
+            'bars_read': self.bars_read,
+            'bars_written': self.bars_written
+        }
@@ -0,0 +1,126 @@
+"""
+skcom.klinetrack
+
+追蹤每檔股票的日 K 接收進度, 判斷個股資料是否已經完整
+"""
+
+import time
+
+from skcom.metrics import LatencyHistogram
+
+class KLineProgress():
+    """ 單一股票的日 K 接收進度 """
+    __slots__ = ('expected', 'last_session', 'requested', 'bars', 'first_bar', 'last_bar')
+
+    def __init__(self, expected, last_session, requested):
+        self.expected = expected
+        self.last_session = last_session
+        self.requested = requested
+        self.bars = 0
+        self.first_bar = None
+        self.last_bar = None
+
+class KLineTracker():
+    """
+    日 K 接收進度
+
+    下列任一條件成立時, 該檔股票的日 K 視為完整:
+
+    * session: 收到日期在請求區間最後一個交易日 (含) 之後的日 K
+    * cached: 請求區間沒有交易日, 不需要請求
+    * quiet: 收到日 K 後 quiet_ms 毫秒沒有新資料 (例如停牌或最後一個交易日判斷錯誤)
+    * empty: 請求後 wait_ms 毫秒都沒有收到資料
+
+    預期筆數由交易日曆推算, 日曆不完整時可能偏少, 因此只用於統計, 不作為完成條件
+    """
+
+    def __init__(self, quiet_ms=300, wait_ms=5000, clock=time.monotonic):
+        self.quiet = quiet_ms / 1000
+        self.wait = wait_ms / 1000
+        self.clock = clock
+        self.pending = {}
+
+        # 統計
+        self.results = {}
+        self.first_bar_time = LatencyHistogram()
+        self.complete_time = LatencyHistogram()
+
+    def expect(self, stock_no, expected, last_session):
+        """ 送出請求前登記預期的筆數與最後一個交易日, 預期筆數為 0 時直接完成 """
+        self.pending[stock_no] = KLineProgress(expected, last_session, self.clock())
+        if expected <= 0:
+            return self.finish(stock_no, 'cached')
+        return False
+
+    def bar(self, stock_no, date):
+        """ 收到一筆日 K, date 為 YYYYMMDD 整數, 這筆資料讓個股完成時回傳 True """
+        progress = self.pending.get(stock_no)
+        if progress is None:
+            return False
+        now = self.clock()
+        if progress.first_bar is None:
+            progress.first_bar = now
+            self.first_bar_time.add(now - progress.requested)
+        progress.last_bar = now
+        progress.bars += 1
+        if progress.last_session is not None and date >= progress.last_session:
+            return self.finish(stock_no, 'session')
+        return False
+
+    def expire(self):
+        """ 回傳已逾時的股票代碼, 同時標記為完成 """
+        now = self.clock()
+        expired = []
+        for (stock_no, progress) in list(self.pending.items()):
+            if progress.last_bar is None:
+                if now - progress.requested >= self.wait:
+                    self.finish(stock_no, 'empty')
+                    expired.append(stock_no)
+            elif now - progress.last_bar >= self.quiet:
+                self.finish(stock_no, 'quiet')
+                expired.append(stock_no)
+        return expired
+
+    def next_deadline(self):
+        """ 最近一個逾時時間, 沒有等待中的股票時回傳 None """
+        deadline = None
+        for progress in self.pending.values():
+            if progress.last_bar is None:
+                due = progress.requested + self.wait
+            else:
+                due = progress.last_bar + self.quiet
+            if deadline is None or due < deadline:
+                deadline = due
+        return deadline
+
+    def finish(self, stock_no, reason):
+        """ 標記完成並記錄耗時 """
+        progress = self.pending.pop(stock_no, None)
+        if progress is None:
+            return False
+        elapsed = self.clock() - progress.requested
+        self.complete_time.add(elapsed)
+        first_bar = None
+        if progress.first_bar is not None:
+            first_bar = progress.first_bar - progress.requested
+        self.results[stock_no] = {
+            'bars': progress.bars,
+            'expected': progress.expected,
+            'reason': reason,
+            'first_bar': first_bar,
+            'complete': elapsed
+        }
+        return True
+
+    def summary(self):
+        """ 統計摘要 """
+        reasons = {}
+        for result in self.results.values():
+            reasons[result['reason']] = reasons.get(result['reason'], 0) + 1
+        return {
+            'pending': len(self.pending),
+            'completed': len(self.results),
+            'reasons': reasons,
+            'first_bar_time': self.first_bar_time.summary(),
+            'complete_time': self.complete_time.summary()
+        }
@@ -0,0 +1,69 @@
+"""
+skcom.metrics
+
+效能統計用的固定區間直方圖
+"""
+
+import bisect
+
+class LatencyHistogram():
+    """
+    固定區間的延遲直方圖, 單位為秒
+
+    區間固定, 記錄時不會配置記憶體, 適合放在高頻率的路徑上
+    """
+
+    # 區間上限 (秒), 最後一格收容超過 10 秒的資料
+    BOUNDS = (
+        0.00001, 0.00005, 0.0001, 0.0005,
+        0.001, 0.005, 0.01, 0.05,
+        0.1, 0.5, 1.0, 5.0, 10.0
+    )
+
+    def __init__(self, bounds=None):
+        self.bounds = self.BOUNDS if bounds is None else tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max_value = 0.0
+
+    def add(self, value):
+        """ 記錄一筆數值 """
+        self.count += 1
+        self.total += value
+        if value > self.max_value:
+            self.max_value = value
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+
+    def quantile(self, ratio):
+        """ 以區間上限估計百分位數 """
+        if self.count == 0:
+            return 0.0
+        target = ratio * self.count
+        acc = 0
+        for (slot, cnt) in enumerate(self.counts):
+            acc += cnt
+            if acc >= target:
+                if slot < len(self.bounds):
+                    return self.bounds[slot]
+                return self.max_value
+        return self.max_value
+
+    def reset(self):
+        """ 清除統計 """
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max_value = 0.0
+
+    def summary(self):
+        """ 統計摘要 """
+        labels = ['<=%g' % upper for upper in self.bounds] + ['>%g' % self.bounds[-1]]
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count > 0 else 0.0,
+            'max': self.max_value,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'histogram': dict(zip(labels, self.counts))
+        }
@@ -0,0 +1,17 @@
+"""
+skcom.npcompat
+
+numpy 為選用套件, 需要 numpy 的模組都從這裡取得 np
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from skcom.exception import ConfigException
+
+def require_numpy():
+    """ 確認 numpy 可以使用 """
+    if np is None:
+        raise ConfigException('需要安裝 numpy 才能使用這個功能: pip install numpy')
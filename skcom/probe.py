@@ -0,0 +1,126 @@
+"""
+skcom.probe
+
+熱路徑各階段的計時探針
+
+停用時不做任何檢查, 啟用時才把聽牌機上的函數替換成計時版本,
+未啟用的聽牌機執行的程式碼與沒有探針時完全相同
+"""
+
+import time
+
+from skcom.metrics import LatencyHistogram
+
+# 階段名稱
+# * callback: COM 事件處理函數從進入到返回的時間
+# * meta: 個股基本資料查詢
+# * record: 建立 TickRecord 或更新 Best5Book
+# * dispatch: 呼叫 hook (含環狀緩衝區與批次處理)
+# * complete: coroutine hook 從建立到執行完畢的時間, 包含排隊等待
+STAGES = ('callback', 'meta', 'record', 'dispatch', 'complete')
+
+class HotPathProbe():
+    """
+    每種事件類型, 每個階段各一個固定區間直方圖
+
+    callback, meta, record 以 COM 事件類型 (ticks, history, best5) 分類,
+    dispatch, complete 以 hook 類型 (ticks, ticks_batch, best5, kline) 分類
+    """
+
+    # 區間上限 (秒), 熱路徑的時間多半在微秒等級
+    BOUNDS = (
+        0.000001, 0.000002, 0.000005,
+        0.00001, 0.00002, 0.00005,
+        0.0001, 0.0002, 0.0005,
+        0.001, 0.005, 0.01, 0.05, 0.1, 1.0
+    )
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        # 目前處理中的 COM 事件類型, meta 與 record 階段依此分類
+        self.kind = None
+        self.histograms = {}
+
+    def histogram(self, kind, stage):
+        """ 取得直方圖, 不存在時建立 """
+        key = (kind, stage)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = LatencyHistogram(self.BOUNDS)
+            self.histograms[key] = hist
+        return hist
+
+    def wrap_callback(self, kind, func):
+        """ 包裝 COM 事件處理函數, 記錄事件類型與 callback 階段 """
+        add = self.histogram(kind, 'callback').add
+        clock = self.clock
+
+        def probed(*args):
+            self.kind = kind
+            begin = clock()
+            try:
+                return func(*args)
+            finally:
+                add(clock() - begin)
+        return probed
+
+    def wrap_stage(self, stage, func):
+        """ 包裝 meta 或 record 階段的函數, 依目前的事件類型分類 """
+        clock = self.clock
+        histogram = self.histogram
+
+        def probed(*args):
+            begin = clock()
+            try:
+                return func(*args)
+            finally:
+                histogram(self.kind, stage).add(clock() - begin)
+        return probed
+
+    def wrap_dispatch(self, kind, func):
+        """ 包裝呼叫 hook 的函數 """
+        add = self.histogram(kind, 'dispatch').add
+        clock = self.clock
+
+        def probed(*args):
+            begin = clock()
+            try:
+                return func(*args)
+            finally:
+                add(clock() - begin)
+        return probed
+
+    def complete(self, coro, kind):
+        """ 包裝 coroutine hook, 從包裝當下開始計時, 執行完畢時記錄 complete 階段 """
+        begin = self.clock()
+        add = self.histogram(kind, 'complete').add
+        clock = self.clock
+
+        async def probed():
+            try:
+                return await coro
+            finally:
+                add(clock() - begin)
+        return probed()
+
+    def reset(self):
+        """ 清除統計 """
+        for hist in self.histograms.values():
+            hist.reset()
+
+    def summary(self, kind=None):
+        """
+        統計摘要, 格式為 {事件類型: {階段: 直方圖摘要}}
+
+        kind 有指定時只回傳該事件類型的 {階段: 直方圖摘要}
+        """
+        result = {}
+        for ((hist_kind, stage), hist) in self.histograms.items():
+            result.setdefault(hist_kind, {})[stage] = hist.summary()
+        for stages in result.values():
+            ordered = {stage: stages[stage] for stage in STAGES if stage in stages}
+            stages.clear()
+            stages.update(ordered)
+        if kind is not None:
+            return result.get(kind, {})
+        return result
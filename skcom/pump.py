@@ -0,0 +1,65 @@
+"""
+skcom.pump
+
+依延遲預算調整 COM 事件推送頻率
+"""
+
+import time
+
+from skcom.metrics import LatencyHistogram
+
+class AdaptivePump():
+    """
+    低延遲 COM 事件推送控制
+
+    pump_messages 為 pythoncom.PumpWaitingMessages 或測試用的替代函數,
+    event_count 回傳目前累計的 COM 事件數量, 用來判斷這一輪是否有事件
+
+    * 有事件時, 間隔縮短到 budget_ms 以內
+    * 沒有事件時, 間隔加倍退避到 idle_ms 為止
+    """
+
+    def __init__(self, pump_messages, event_count, budget_ms=20, idle_ms=500,
+                 clock=time.perf_counter):
+        # pylint: disable=too-many-arguments
+        self.pump_messages = pump_messages
+        self.event_count = event_count
+        self.budget = budget_ms / 1000
+        self.idle = idle_ms / 1000
+        self.clock = clock
+        self.delay = self.budget
+        self.last_count = 0
+        self.last_end = None
+
+        # 每輪 PumpWaitingMessages() 花費時間
+        self.cycle_time = LatencyHistogram()
+        # 有事件的那一輪, 事件最多在佇列中等待的時間 (上一輪結束到這一輪開始)
+        self.queue_wait = LatencyHistogram()
+
+    def cycle(self):
+        """ 推送一輪 COM 事件, 回傳下一輪前應該等待的秒數 """
+        begin = self.clock()
+        self.pump_messages()
+        end = self.clock()
+        elapsed = end - begin
+        self.cycle_time.add(elapsed)
+
+        count = self.event_count()
+        if count != self.last_count:
+            self.last_count = count
+            if self.last_end is not None:
+                self.queue_wait.add(begin - self.last_end)
+            self.delay = max(0.0, self.budget - elapsed)
+        else:
+            self.delay = min(max(self.delay, self.budget) * 2, self.idle)
+
+        self.last_end = end
+        return self.delay
+
+    def summary(self):
+        """ 統計摘要 """
+        return {
+            'delay': self.delay,
+            'cycle_time': self.cycle_time.summary(),
+            'queue_wait': self.queue_wait.summary()
+        }
@@ -4,3 +4,4 @@ skcom.receiver
 
 from skcom.asyncrecv import AsyncQuoteReceiver
 from skcom.oldrecv import QuoteReceiver
+from skcom.inflight import HookPolicy
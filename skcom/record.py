@@ -0,0 +1,183 @@
+"""
+skcom.record
+
+行情事件的精簡資料結構
+"""
+
+import array
+from datetime import datetime, timedelta, timezone
+
+# 台股交易時間以 UTC+8 為準
+TW_TZ = timezone(timedelta(hours=8))
+TW_OFFSET_MS = 8 * 3600 * 1000
+DAY_MS = 86400 * 1000
+
+# nDate (YYYYMMDD) 對應當日 00:00 的 epoch 奈秒, 每個交易日只計算一次
+_day_base_ns = {}
+
+def day_base_ns(n_date):
+    """ 取得 nDate 當日 00:00 (UTC+8) 的 epoch 奈秒 """
+    base = _day_base_ns.get(n_date)
+    if base is None:
+        day = datetime(n_date // 10000, n_date // 100 % 100, n_date % 100, tzinfo=TW_TZ)
+        base = int(day.timestamp()) * 1000000000
+        _day_base_ns[n_date] = base
+    return base
+
+def tick_timestamp(n_date, n_timehms, n_timemillis):
+    """
+    將 nDate, nTimehms, nTimemillis 轉換為 epoch 奈秒
+
+    nTimemillis 實際上是微秒 (0-999999), 全程使用整數運算
+    """
+    seconds = n_timehms // 10000 * 3600 + n_timehms // 100 % 100 * 60 + n_timehms % 100
+    return day_base_ns(n_date) + (seconds * 1000000 + n_timemillis) * 1000
+
+def format_tick_time(timestamp):
+    """ epoch 奈秒轉換為 HH:MM:SS.mmm (UTC+8) """
+    ms_of_day = (timestamp // 1000000 + TW_OFFSET_MS) % DAY_MS
+    seconds = ms_of_day // 1000
+    return '%02d:%02d:%02d.%03d' % (
+        seconds // 3600,
+        seconds // 60 % 60,
+        seconds % 60,
+        ms_of_day % 1000
+    )
+
+def tick_dict(stock_id, name, timestamp, bid, ask, close, qty, vol):
+    """ 舊版 ticks hook 的 dict 格式, 不使用 raw 模式時每筆 tick 只建立這個 dict """
+    # pylint: disable=too-many-arguments
+    return {
+        'id': stock_id,
+        'name': name,
+        'time': format_tick_time(timestamp),
+        'bid': bid,
+        'ask': ask,
+        'close': close,
+        'qty': qty,
+        'vol': vol
+    }
+
+class TickRecord():
+    """
+    撮合資料
+
+    使用 __slots__ 減少每筆 tick 的記憶體配置, 欄位名稱與舊版 dict 的鍵值相同,
+    需要 dict 格式時再呼叫 as_dict()
+
+    ts 為 epoch 奈秒整數, time 字串只在讀取時才產生
+    """
+    __slots__ = ('id', 'name', 'ts', 'bid', 'ask', 'close', 'qty', 'vol', '_time')
+
+    def __init__(self, stock_id, name, timestamp, bid, ask, close, qty, vol):
+        # pylint: disable=too-many-arguments, invalid-name
+        self.id = stock_id
+        self.name = name
+        self.ts = timestamp
+        self.bid = bid
+        self.ask = ask
+        self.close = close
+        self.qty = qty
+        self.vol = vol
+        self._time = None
+
+    @property
+    def time(self):
+        """ HH:MM:SS.mmm 格式的撮合時間 """
+        if self._time is None:
+            self._time = format_tick_time(self.ts)
+        return self._time
+
+    def as_dict(self):
+        """ 轉換為舊版 ticks hook 的 dict 格式 """
+        return {
+            'id': self.id,
+            'name': self.name,
+            'time': self.time,
+            'bid': self.bid,
+            'ask': self.ask,
+            'close': self.close,
+            'qty': self.qty,
+            'vol': self.vol
+        }
+
+    def __repr__(self):
+        return 'TickRecord(%s %s %.2f x %d @ %s)' % (
+            self.id, self.name, self.close, self.qty, self.time
+        )
+
+class Best5Book():
+    """
+    最佳五檔快照
+
+    每檔股票預先配置一組陣列, 收到更新時直接覆寫, 不會產生新的巢狀結構
+
+    * prices, qtys: 0-4 為買進一到五檔, 5 為買進延伸檔, 6-10 為賣出一到五檔, 11 為賣出延伸檔
+    * hook 拿到的 bid, ask 等欄位是唯讀 memoryview, 內容永遠是最新狀態,
+      需要保留當下內容時請呼叫 as_dict() 或 copy()
+    """
+    __slots__ = (
+        'id', 'name', '_prices', '_qtys', 'prices', 'qtys',
+        'bid', 'bid_qty', 'ask', 'ask_qty',
+        'updates'
+    )
+
+    def __init__(self, stock_id, name):
+        # pylint: disable=invalid-name
+        self.id = stock_id
+        self.name = name
+        self._prices = array.array('d', bytes(8 * 12))
+        self._qtys = array.array('q', bytes(8 * 12))
+        self.prices = memoryview(self._prices).toreadonly()
+        self.qtys = memoryview(self._qtys).toreadonly()
+        self.bid = self.prices[0:5]
+        self.bid_qty = self.qtys[0:5]
+        self.ask = self.prices[6:11]
+        self.ask_qty = self.qtys[6:11]
+        self.updates = 0
+
+    @property
+    def extend_bid(self):
+        """ 買進延伸檔 (價, 量) """
+        return (self._prices[5], self._qtys[5])
+
+    @property
+    def extend_ask(self):
+        """ 賣出延伸檔 (價, 量) """
+        return (self._prices[11], self._qtys[11])
+
+    def update(self, divisor, levels):
+        """
+        依 OnNotifyBest5LONG 的參數順序覆寫內容
+
+        levels 為 (價, 量) 交錯的 24 個整數, 買進五檔 + 延伸檔, 賣出五檔 + 延伸檔,
+        價格除以 divisor (10 ** sDecimal) 換算, 24 個之後的欄位不使用
+        """
+        prices = self._prices
+        qtys = self._qtys
+        for slot in range(12):
+            prices[slot] = levels[slot * 2] / divisor
+            qtys[slot] = levels[slot * 2 + 1]
+        self.updates += 1
+
+    def copy(self):
+        """ 複製目前的 (價格, 數量) 內容 """
+        return (self._prices.tolist(), self._qtys.tolist())
+
+    def as_dict(self):
+        """ 轉換為舊版 best5 hook 的 dict 格式 """
+        return {
+            'id': self.id,
+            'name': self.name,
+            'best': [
+                {
+                    'bid': self._prices[i],
+                    'bidQty': self._qtys[i],
+                    'ask': self._prices[i + 6],
+                    'askQty': self._qtys[i + 6]
+                } for i in range(5)
+            ]
+        }
+
+    def __repr__(self):
+        return 'Best5Book(%s %s %.2f/%.2f)' % (self.id, self.name, self._prices[0], self._prices[6])
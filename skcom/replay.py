@@ -0,0 +1,150 @@
+"""
+skcom.replay
+
+以日誌檔重播行情, 直接呼叫聽牌機的 COM 事件處理函數
+"""
+
+import asyncio
+import logging
+import time
+
+from skcom.journal import (
+    read_journal,
+    REC_TICK, REC_HISTORY, REC_BEST5, REC_META, REC_KLINE
+)
+from skcom.stockmeta import StockMeta
+
+logger = logging.getLogger('skcom')
+
+class ReplayCenter():
+    """ 重播時取代 SKCenterLib, 只提供錯誤訊息查詢 """
+    # pylint: disable=invalid-name, no-self-use
+
+    def SKCenterLib_GetReturnCodeMessage(self, n_code):
+        """ 錯誤代碼訊息 """
+        return '重播模式無法取得錯誤訊息 (%d)' % n_code
+
+class JournalReplay():
+    """
+    日誌重播
+
+    依序把日誌中的事件送進 AsyncQuoteReceiver (或其子類別, 例如 StockBot) 的
+    OnNotifyTicksLONG, OnNotifyHistoryTicksLONG, OnNotifyBest5LONG, OnNotifyKLineData,
+    不需要登入, COM 元件與 pythoncom
+
+    speed:
+    * None: 不等待, 盡快重播
+    * 1.0: 依照接收時間即時重播
+    * N: N 倍速重播
+    """
+
+    # 盡快重播時, 每處理這麼多筆事件讓出一次 event loop, 讓 coroutine hook 有機會執行
+    YIELD_EVERY = 256
+
+    def __init__(self, receiver, path, speed=None):
+        self.receiver = receiver
+        self.path = path
+        self.speed = speed
+        self.names = {}
+        self.in_kline = False
+        self.best5_flushed = 0.0
+
+        # 統計
+        self.events = 0
+        self.elapsed = 0.0
+
+    def prepare(self):
+        """ 取代 COM 元件相關的設定 """
+        rcv = self.receiver
+        if rcv.skc is None:
+            rcv.skc = ReplayCenter()
+        # 日誌沒有記錄的個股, 視為查無資料
+        rcv.stock_meta.loader = lambda market_no, index: (None, 9999)
+        rcv.stock_meta.listener = None
+        if rcv.daily_kline is None:
+            rcv.daily_kline = {}
+
+    async def run(self):
+        """ 開始重播 """
+        self.prepare()
+        begin = time.perf_counter()
+        base_ns = None
+        count = 0
+
+        for (rec_type, fields) in read_journal(self.path):
+            recv_ns = fields[-1]
+            if self.speed:
+                if base_ns is None:
+                    base_ns = recv_ns
+                target = (recv_ns - base_ns) / 1e9 / self.speed
+                wait = target - (time.perf_counter() - begin)
+                if wait > 0:
+                    self.pump_cycle()
+                    await asyncio.sleep(wait)
+
+            self.dispatch(rec_type, fields)
+            count += 1
+            if count % self.YIELD_EVERY == 0:
+                self.pump_cycle()
+                await asyncio.sleep(0)
+
+        self.end_kline()
+        self.pump_cycle(final=True)
+        await asyncio.sleep(0)
+
+        self.events = count
+        self.elapsed = time.perf_counter() - begin
+        logger.info(
+            '重播完成: %d 筆事件, %.3f 秒, %.0f 筆/秒',
+            count, self.elapsed, count / self.elapsed if self.elapsed > 0 else 0
+        )
+
+    def start(self):
+        """ 使用 asyncio 執行重播 """
+        asyncio.run(self.run())
+
+    def dispatch(self, rec_type, fields):
+        """ 呼叫對應的 COM 事件處理函數 """
+        rcv = self.receiver
+        if rec_type != REC_KLINE:
+            self.end_kline()
+
+        if rec_type == REC_TICK:
+            rcv.OnNotifyTicksLONG(*fields[:-1])
+        elif rec_type == REC_HISTORY:
+            rcv.OnNotifyHistoryTicksLONG(*fields[:-1])
+        elif rec_type == REC_BEST5:
+            rcv.OnNotifyBest5LONG(*fields[:-1])
+        elif rec_type == REC_META:
+            (market_no, index, decimal, stock_no, name, _) = fields
+            self.names[stock_no] = name
+            if index >= 0:
+                rcv.stock_meta.put(StockMeta(market_no, index, stock_no, name, decimal))
+        elif rec_type == REC_KLINE:
+            (stock_no, data, _) = fields
+            if stock_no not in rcv.daily_kline:
+                rcv.daily_kline[stock_no] = rcv.new_kline_buffer(
+                    stock_no, self.names.get(stock_no, stock_no)
+                )
+            self.in_kline = True
+            rcv.OnNotifyKLineData(stock_no, data)
+
+    def end_kline(self):
+        """ K 線資料結束, 比照 handle_kline() 發送 kline hook """
+        if not self.in_kline:
+            return
+        self.in_kline = False
+        self.receiver.emit_kline()
+        self.receiver.daily_kline = {}
+
+    def pump_cycle(self, final=False):
+        """ 比照 pump() 每一輪結束時的處理 """
+        rcv = self.receiver
+        rcv.flush_ticks_batch()
+        conflator = rcv.best5_conflator
+        if conflator is not None:
+            now = time.perf_counter()
+            if final or now - self.best5_flushed >= conflator.interval:
+                self.best5_flushed = now
+                for record in conflator.flush():
+                    rcv.emit_best5(record)
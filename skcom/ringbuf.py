@@ -0,0 +1,140 @@
+"""
+skcom.ringbuf
+
+以 NumPy structured array 實作的個股 ticks 環狀緩衝區
+"""
+
+from skcom.npcompat import np, require_numpy
+
+if np is not None:
+    TICK_DTYPE = np.dtype([
+        ('ts', 'i8'),
+        ('bid', 'f8'),
+        ('ask', 'f8'),
+        ('close', 'f8'),
+        ('qty', 'i8'),
+        ('vol', 'i8')
+    ])
+else:
+    TICK_DTYPE = None
+
+class TickRing():
+    """
+    最多保留 capacity 筆的 ticks 環狀緩衝區
+
+    每筆資料同時寫入 pos 與 pos + size 兩個位置 (鏡像緩衝),
+    因此任何 "最後 n 筆" 的區間都是連續記憶體, 可以直接回傳 view 不需複製
+
+    緩衝區從 initial 筆開始, 寫滿時加倍直到 capacity, 成交稀少的個股只佔用少量記憶體;
+    記憶體用量最多為 2 * capacity * 48 bytes
+
+    資料依時間排序, 晚到的 tick (例如以 GetTickLONG 補回的缺漏) 插入對應的位置,
+    since() 的二分搜尋才會正確
+    """
+
+    # 初始容量
+    INITIAL = 1024
+
+    def __init__(self, capacity, initial=None):
+        require_numpy()
+        if initial is None:
+            initial = self.INITIAL
+        self.capacity = capacity
+        self.size = min(initial, capacity)
+        self.buffer = np.zeros(self.size * 2, dtype=TICK_DTYPE)
+        self.pos = 0
+        self.count = 0
+        self.last_ts = None
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def grow(self):
+        """ 緩衝區加倍, 保留現有資料 """
+        size = min(self.size * 2, self.capacity)
+        buffer = np.zeros(size * 2, dtype=TICK_DTYPE)
+        old = self.buffer[self.pos:self.pos + self.size]
+        buffer[:self.size] = old
+        buffer[size:size + self.size] = old
+        self.pos = self.size
+        self.size = size
+        self.buffer = buffer
+
+    def append(self, timestamp, bid, ask, close, qty, vol):
+        """ 寫入一筆 tick, 滿了會覆蓋最舊的資料 """
+        # pylint: disable=too-many-arguments
+        if self.last_ts is not None and timestamp < self.last_ts:
+            self.insert(timestamp, bid, ask, close, qty, vol)
+            return
+        self.last_ts = timestamp
+        self.push((timestamp, bid, ask, close, qty, vol))
+
+    def push(self, row):
+        """ 在結尾寫入一筆 """
+        if self.count == self.size < self.capacity:
+            self.grow()
+        self.buffer[self.pos] = row
+        self.buffer[self.pos + self.size] = row
+        self.pos += 1
+        if self.pos == self.size:
+            self.pos = 0
+        self.count += 1
+
+    def insert(self, timestamp, bid, ask, close, qty, vol):
+        """ 依時間插入一筆晚到的 tick, 只搬移時間比它晚的資料 """
+        # pylint: disable=too-many-arguments
+        view = self.last()
+        index = int(np.searchsorted(view['ts'], timestamp, side='right'))
+        if index == 0 and self.count >= self.capacity:
+            # 比保留的資料都舊
+            return
+        tail = view[index:].copy()
+        row = (timestamp, bid, ask, close, qty, vol)
+        # 先寫到結尾, 再把最後 len(tail) + 1 筆改成 [row, tail...]
+        self.push(row)
+        slots = np.arange(self.pos - len(tail) - 1, self.pos) % self.size
+        self.buffer[slots[0]] = row
+        self.buffer[slots[0] + self.size] = row
+        self.buffer[slots[1:]] = tail
+        self.buffer[slots[1:] + self.size] = tail
+
+    def last(self, n=None):
+        """ 最後 n 筆資料的唯讀 view, 省略 n 取全部 """
+        size = len(self)
+        if n is None or n > size:
+            n = size
+        end = self.pos + self.size
+        view = self.buffer[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def since(self, timestamp):
+        """ 時間 >= timestamp (epoch 奈秒) 的唯讀 view """
+        view = self.last()
+        begin = np.searchsorted(view['ts'], timestamp, side='left')
+        return view[begin:]
+
+class TickRingStore():
+    """ 各檔股票的 ticks 環狀緩衝區 """
+
+    def __init__(self, capacity):
+        require_numpy()
+        self.capacity = capacity
+        self.rings = {}
+
+    def get(self, stock_no):
+        """ 取得個股緩衝區, 尚未收到資料時回傳 None """
+        return self.rings.get(stock_no)
+
+    def append(self, stock_no, timestamp, bid, ask, close, qty, vol):
+        """ 寫入一筆 tick """
+        # pylint: disable=too-many-arguments
+        ring = self.rings.get(stock_no)
+        if ring is None:
+            ring = TickRing(self.capacity)
+            self.rings[stock_no] = ring
+        ring.append(timestamp, bid, ask, close, qty, vol)
+
+    def nbytes(self):
+        """ 目前配置的記憶體總量 """
+        return sum(ring.buffer.nbytes for ring in self.rings.values())
@@ -4,13 +4,10 @@ Telegram 機器人自動通知範例程式
 from functools import reduce
 from operator import itemgetter
 import logging
+import sys
 
-try:
-    from skcom.receiver import AsyncQuoteReceiver as QuoteReceiver
-except ImportError as ex:
-    print('尚未生成 SKCOMLib.py 請先執行一次 python -m skcom.tools.setup')
-    print('例外訊息:', ex)
-    exit(1)
+# 直接載入 skcom.asyncrecv, 以日誌重播時不需要 pythoncom 與 SKCOMLib.py
+from skcom.asyncrecv import AsyncQuoteReceiver as QuoteReceiver
 
 class StockBot(QuoteReceiver):
 
@@ -27,17 +24,13 @@ class StockBot(QuoteReceiver):
 
         # 設定事件接收
         self.set_kline_hook(self.on_receive_kline, 240)
-        self.set_ticks_hook(self.on_receive_ticks, True)
+        self.set_ticks_hook(self.on_receive_ticks, True, raw=True)
 
     def sub_minutes(self, t1, t2):
         """
-        hh:mm:ss 時間值相減取分鐘數, 控制震盪通知頻率用
+        epoch 奈秒時間值相減取分鐘數, 控制震盪通知頻率用
         """
-        (hh1, mm1, ss1) = t1.split(':')
-        (hh2, mm2, ss2) = t2.split(':')
-        m1 = int(hh1) * 60 + int(mm1) + float(ss1) / 60
-        m2 = int(hh2) * 60 + int(mm2) + float(ss2) / 60
-        return m2 - m1
+        return (t2 - t1) / 60000000000
 
     def get_avgline_step(self, security_id, close):
         """
@@ -69,11 +62,12 @@ class StockBot(QuoteReceiver):
         if self.avgline_steps:
             logger = logging.getLogger('bot')
 
-            security_id   = tick['id']
-            security_name = tick['name']
-            evt_time      = tick['time'][0:8]
-            close         = tick['close']
-            volume        = tick['vol']
+            security_id   = tick.id
+            security_name = tick.name
+            evt_time      = tick.time[0:8]
+            evt_ts        = tick.ts
+            close         = tick.close
+            volume        = tick.vol
 
             astep = self.get_avgline_step(security_id, close)
             if astep != self.avgline_curr[security_id]:
@@ -86,7 +80,7 @@ class StockBot(QuoteReceiver):
                         shaking = False
 
                 if shaking:
-                    footprint = (evt_time, astep_vector)
+                    footprint = (evt_ts, astep_vector)
                     self.shaking_log[security_id].append(footprint)
                 else:
                     self.shaking_log[security_id].clear()
@@ -207,7 +201,16 @@ def main():
     main()
     """
     logger = logging.getLogger('bot')
-    StockBot().start()
+    if len(sys.argv) > 1:
+        # 以日誌檔重播: python -m skcom.samples.bot quotes-20220113.skj [倍速]
+        from skcom.replay import JournalReplay
+        speed = float(sys.argv[2]) if len(sys.argv) > 2 else None
+        JournalReplay(StockBot(), sys.argv[1], speed).start()
+    else:
+        bot = StockBot()
+        # 只有即時連線收到的日 K 寫入本機資料庫, 重播的資料不寫入
+        bot.set_kline_store()
+        bot.start()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,506 @@
+"""
+skcom.simulator
+
+群益 API 模擬器, 不需要 SKCOM.dll 與券商連線就能對聽牌機做壓力測試
+
+使用方式, 必須在 import skcom.receiver 之前安裝:
+
+    from skcom.simulator import SkcomSimulator
+    sim = SkcomSimulator(symbols=50, tick_rate=2000)
+    sim.install()
+    qrcv = sim.create_receiver()
+    qrcv.set_ticks_hook(on_receive_ticks, raw=True)
+    qrcv.start()
+"""
+
+import collections
+import importlib
+import logging
+import random
+import sys
+import threading
+import time
+import types
+from datetime import datetime, timedelta
+
+from skcom.tradecal import TradingCalendar
+
+logger = logging.getLogger('skcom')
+
+# install() 取代的模組, 以及 skcom.asyncrecv 中對應的全域變數
+COM_MODULES = ('pythoncom', 'comtypes', 'comtypes.client', 'comtypes.gen', 'comtypes.gen.SKCOMLib')
+COM_GLOBALS = ('pythoncom', 'comtypes', 'sk', 'COMError')
+
+# 參考文件: 6. 代碼定義表 (p.170)
+SK_SUCCESS = 0
+SK_SUBJECT_CONNECTION_CONNECTED = 3001
+SK_SUBJECT_CONNECTION_DISCONNECT = 3002
+SK_SUBJECT_CONNECTION_STOCKS_READY = 3003
+SK_SUBJECT_CONNECTION_SOLCLIENTAPI_FAIL = 3021
+SK_ERROR_STOCK_NOT_FOUND = 9999
+SK_ERROR_TICK_NOT_FOUND = 9998 # 模擬器自訂, 查無指定 nPtr 的 tick
+
+def cp950_raw(text):
+    """ 模擬 COM 元件回傳的股票名稱, 聽牌機會用 fix_encoding() 還原 """
+    return ''.join(map(chr, text.encode('cp950')))
+
+class SimStock():
+    """ 模擬 SKSTOCKLONG """
+    # pylint: disable=invalid-name, too-few-public-methods
+
+    def __init__(self, market_no, index, stock_no, name, decimal, price):
+        # pylint: disable=too-many-arguments
+        self.bstrMarketNo = str(market_no)
+        self.sMarketNo = market_no
+        self.nStockIdx = index
+        self.bstrStockNo = stock_no
+        self.bstrStockName = cp950_raw(name)
+        self.sDecimal = decimal
+        self.nTQty = 0
+
+        # 模擬報價狀態
+        self.price = price
+        self.ptr = 0
+        self.total = 0
+        # 已送出的 ticks, 重新訂閱時重送
+        self.log = []
+
+class SimTick():
+    """ 模擬 SKTICK """
+    # pylint: disable=invalid-name, too-few-public-methods, too-many-instance-attributes
+
+    def __init__(self, args):
+        (_, _, self.nPtr, self.nDate, self.nTimehms, self.nTimemillis,
+         self.nBid, self.nAsk, self.nClose, self.nQty, self.nSimulate) = args
+
+class SimEventSource():
+    """ 模擬 COM 元件的事件來源, 透過 comtypes.client.GetEvents() 綁定事件接收器 """
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.sinks = []
+
+    def fire(self, name, *args):
+        """ 排入事件, 在 PumpWaitingMessages() 時送出 """
+        self.sim.events.append((self, name, args))
+
+class SKCenterLib(SimEventSource):
+    """ 模擬 SKCenterLib """
+    # pylint: disable=invalid-name
+
+    def SKCenterLib_SetLogPath(self, path):
+        """ 設定 log 路徑 """
+        # pylint: disable=unused-argument
+        return SK_SUCCESS
+
+    def SKCenterLib_Login(self, account, password):
+        """ 登入 """
+        # pylint: disable=unused-argument
+        self.sim.logins += 1
+        return self.sim.login_code
+
+    def SKCenterLib_GetReturnCodeMessage(self, n_code):
+        """ 錯誤代碼訊息 """
+        return 'SIMULATOR_%d' % n_code
+
+class SKReplyLib(SimEventSource):
+    """ 模擬 SKReplyLib, 模擬器不發送公告訊息 """
+
+class SKQuoteLib(SimEventSource):
+    """ 模擬 SKQuoteLib """
+    # pylint: disable=invalid-name
+
+    def SKQuoteLib_EnterMonitorLONG(self):
+        """ 建立報價連線 """
+        self.sim.connected = True
+        self.fire('OnConnection', SK_SUBJECT_CONNECTION_CONNECTED, SK_SUCCESS)
+        self.fire('OnConnection', SK_SUBJECT_CONNECTION_STOCKS_READY, SK_SUCCESS)
+        return SK_SUCCESS
+
+    def SKQuoteLib_LeaveMonitor(self):
+        """ 中斷報價連線 """
+        self.sim.connected = False
+        self.sim.subscribed.clear()
+        self.sim.pages.clear()
+        self.fire('OnConnection', SK_SUBJECT_CONNECTION_DISCONNECT, SK_SUCCESS)
+        return SK_SUCCESS
+
+    def SKQuoteLib_IsConnected(self):
+        """ 連線狀態 """
+        return 1 if self.sim.connected else 0
+
+    def SKQuoteLib_RequestTicks(self, page_no, stock_no):
+        """ 訂閱 ticks 與五檔, 回傳 [pageNo, nCode] """
+        stock = self.sim.by_no.get(stock_no)
+        if stock is None:
+            return [page_no, SK_ERROR_STOCK_NOT_FOUND]
+        if page_no == 50:
+            # 指定 page 50 取消報價
+            return [page_no, self.SKQuoteLib_CancelRequestTicks(stock_no)]
+        if page_no < 0:
+            page_no = len(self.sim.subscribed) % 50
+        self.sim.pages[stock_no] = page_no
+        if stock not in self.sim.subscribed:
+            self.sim.subscribed.append(stock)
+            self.sim.queue_history(self, stock)
+        return [page_no, SK_SUCCESS]
+
+    def SKQuoteLib_CancelRequestTicks(self, stock_no):
+        """ 取消訂閱 ticks 與五檔 """
+        stock = self.sim.by_no.get(stock_no)
+        if stock is None:
+            return SK_ERROR_STOCK_NOT_FOUND
+        if stock in self.sim.subscribed:
+            self.sim.subscribed.remove(stock)
+        self.sim.pages.pop(stock_no, None)
+        return SK_SUCCESS
+
+    def SKQuoteLib_GetStockByIndexLONG(self, market_no, index):
+        """ 以市場與索引取得個股資料, 回傳 [SKSTOCKLONG, nCode] """
+        self.sim.index_lookups += 1
+        stock = self.sim.by_index.get((market_no, index))
+        if stock is None:
+            return [None, SK_ERROR_STOCK_NOT_FOUND]
+        return [stock, SK_SUCCESS]
+
+    def SKQuoteLib_GetTickLONG(self, market_no, index, ptr):
+        """ 取得指定 nPtr 的 tick, 回傳 [SKTICK, nCode], 需要 replay_history=True """
+        self.sim.tick_lookups += 1
+        stock = self.sim.by_index.get((market_no, index))
+        if stock is None:
+            return [None, SK_ERROR_STOCK_NOT_FOUND]
+        for args in stock.log:
+            if args[2] == ptr:
+                return [SimTick(args), SK_SUCCESS]
+        return [None, SK_ERROR_TICK_NOT_FOUND]
+
+    def SKQuoteLib_GetStockByNoLONG(self, stock_no):
+        """ 以股票代碼取得個股資料, 回傳 [SKSTOCKLONG, nCode] """
+        stock = self.sim.by_no.get(stock_no)
+        if stock is None:
+            return [None, SK_ERROR_STOCK_NOT_FOUND]
+        return [stock, SK_SUCCESS]
+
+    def SKQuoteLib_RequestKLineAMByDate(self, stock_no, kline_type, out_type,
+                                        trade_session, start_date, end_date, min_number):
+        """ 請求日 K, 以平日作為交易日產生資料 """
+        # pylint: disable=too-many-arguments, unused-argument
+        stock = self.sim.by_no.get(stock_no)
+        if stock is None:
+            return SK_ERROR_STOCK_NOT_FOUND
+        self.sim.queue_kline(self, stock, start_date, end_date)
+        return SK_SUCCESS
+
+class SkcomSimulator():
+    """
+    群益 API 模擬器
+
+    * symbols: 股票代碼 list, 或是產生幾檔模擬股票
+    * tick_rate: 所有訂閱股票合計每秒產生的 ticks 數量
+    * best5_every: 每幾筆 tick 產生一筆五檔, 0 表示不產生
+    * history_ticks: 每檔股票訂閱時先送出的回補 ticks 數量
+    * max_burst: 單次 PumpWaitingMessages() 最多產生的 ticks 數量
+    * replay_history: 比照群益 API, 重新訂閱時以回補 ticks 重送當天所有 ticks
+    * holidays: 休市日 (YYYYMMDD 整數), 日 K 不產生這些日期
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, symbols=50, tick_rate=1000, best5_every=1, history_ticks=0,
+                 max_burst=100000, seed=0, replay_history=False, holidays=()):
+        # pylint: disable=too-many-arguments
+        self.tick_rate = tick_rate
+        self.best5_every = best5_every
+        self.history_ticks = history_ticks
+        self.max_burst = max_burst
+        self.replay_history = replay_history
+        self.holidays = set(holidays)
+        self.random = random.Random(seed)
+        self.login_code = SK_SUCCESS
+        self.lock = threading.Lock()
+
+        if isinstance(symbols, int):
+            symbols = ['%04d' % (1101 + i) for i in range(symbols)]
+        self.stocks = []
+        self.by_no = {}
+        self.by_index = {}
+        for (i, stock_no) in enumerate(symbols):
+            stock = SimStock(0, 100 + i, stock_no, '模擬%s' % stock_no, 2, 10000 + i * 100)
+            self.stocks.append(stock)
+            self.by_no[stock_no] = stock
+            self.by_index[(0, stock.nStockIdx)] = stock
+
+        self.events = collections.deque()
+        self.subscribed = []
+        self.pages = {}
+        self.connected = False
+        self.quote_lib = None
+        self.last_pump = None
+        self.carry = 0.0
+        self.cursor = 0
+        self.date = int(datetime.today().strftime('%Y%m%d'))
+        # 模擬盤中時間, 由 09:00:00 開始, 單位微秒
+        self.clock_us = 9 * 3600 * 1000000
+
+        # 統計
+        self.logins = 0
+        self.index_lookups = 0
+        self.ticks_sent = 0
+        self.history_sent = 0
+        self.history_replayed = 0
+        self.tick_lookups = 0
+        self.ticks_lost = 0
+        self.lose = 0
+        self.best5_sent = 0
+        self.kline_sent = 0
+        self.disconnects = 0
+
+        # install() 取代前的模組
+        self.saved_modules = None
+        self.saved_globals = {}
+
+    def install(self):
+        """
+        以模擬器取代 pythoncom, comtypes.client, comtypes.gen.SKCOMLib
+
+        必須在 import skcom.receiver 之前呼叫, 聽牌機的程式不需要修改
+        """
+        sim = self
+
+        pythoncom = types.ModuleType('pythoncom')
+        pythoncom.PumpWaitingMessages = sim.pump
+        pythoncom.CoInitialize = lambda: None
+        pythoncom.CoUninitialize = lambda: None
+
+        class COMError(Exception):
+            """ 模擬 comtypes.COMError """
+
+        comtypes = types.ModuleType('comtypes')
+        comtypes.COMError = COMError
+        client = types.ModuleType('comtypes.client')
+        client.CreateObject = sim.create_object
+        client.GetEvents = sim.get_events
+        gen = types.ModuleType('comtypes.gen')
+        sklib = types.ModuleType('comtypes.gen.SKCOMLib')
+        for cls in [SKCenterLib, SKQuoteLib, SKReplyLib]:
+            setattr(sklib, cls.__name__, cls)
+            setattr(sklib, 'I' + cls.__name__, cls)
+        comtypes.client = client
+        comtypes.gen = gen
+        gen.SKCOMLib = sklib
+
+        # 保留原本的模組, uninstall() 時還原
+        asyncrecv = sys.modules.get('skcom.asyncrecv')
+        self.saved_modules = {name: sys.modules.get(name) for name in COM_MODULES}
+        self.saved_globals = {}
+        if asyncrecv is not None:
+            self.saved_globals = {name: getattr(asyncrecv, name) for name in COM_GLOBALS}
+
+        sys.modules['pythoncom'] = pythoncom
+        sys.modules['comtypes'] = comtypes
+        sys.modules['comtypes.client'] = client
+        sys.modules['comtypes.gen'] = gen
+        sys.modules['comtypes.gen.SKCOMLib'] = sklib
+
+        # 已經載入的聽牌機改用模擬器
+        if asyncrecv is not None:
+            asyncrecv.pythoncom = pythoncom
+            asyncrecv.comtypes = comtypes
+            asyncrecv.sk = sklib
+            asyncrecv.COMError = COMError
+
+    def uninstall(self):
+        """ 還原 install() 取代的模組, 聽牌機下次啟動時重新載入 COM 元件 """
+        if self.saved_modules is None:
+            return
+        for (name, module) in self.saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        asyncrecv = sys.modules.get('skcom.asyncrecv')
+        if asyncrecv is not None:
+            for name in COM_GLOBALS:
+                setattr(asyncrecv, name, self.saved_globals.get(name))
+        self.saved_modules = None
+        self.saved_globals = {}
+
+    def create_receiver(self, receiver_class=None, config=None, **kwargs):
+        """
+        建立連到模擬器的聽牌機, 不讀取 skcom.yaml, 交易日曆只保留在記憶體
+
+        config 省略時訂閱模擬器的所有股票
+        """
+        asyncrecv = importlib.import_module('skcom.asyncrecv')
+        if receiver_class is None:
+            receiver_class = asyncrecv.AsyncQuoteReceiver
+        if config is None:
+            config = {
+                'account': 'SIMULATOR',
+                'password': 'SIMULATOR',
+                'reply_read': True,
+                'products': list(self.by_no)
+            }
+
+        receiver = receiver_class(**kwargs)
+        receiver.config = config
+        receiver.calendar = TradingCalendar()
+
+        # 模擬器不需要等待登入後的延遲
+        receiver.DELAY_LOGIN_DONE = 0
+        receiver.DELAY_RETRY = 0
+        return receiver
+
+    def create_object(self, cls, interface=None):
+        """ 取代 comtypes.client.CreateObject() """
+        # pylint: disable=unused-argument
+        obj = cls(self)
+        if isinstance(obj, SKQuoteLib):
+            self.quote_lib = obj
+        return obj
+
+    def get_events(self, source, sink):
+        """ 取代 comtypes.client.GetEvents() """
+        source.sinks.append(sink)
+        return (source, sink)
+
+    def pump(self):
+        """ 取代 pythoncom.PumpWaitingMessages(), 產生到期的 ticks 並送出所有事件 """
+        with self.lock:
+            self.generate_live()
+            events = self.events
+            while events:
+                (source, name, args) = events.popleft()
+                for sink in source.sinks:
+                    handler = getattr(sink, name, None)
+                    if handler is not None:
+                        handler(*args)
+        return 0
+
+    def generate_live(self):
+        """ 依照 tick_rate 產生即時 ticks """
+        now = time.perf_counter()
+        if self.last_pump is None:
+            self.last_pump = now
+            return
+        elapsed = now - self.last_pump
+        self.last_pump = now
+        if not self.connected or not self.subscribed or self.quote_lib is None:
+            return
+
+        self.carry += elapsed * self.tick_rate
+        count = int(self.carry)
+        self.carry -= count
+        count = min(count, self.max_burst)
+        self.generate(count)
+
+    def generate(self, count):
+        """ 立即產生 count 筆即時 ticks (以及五檔) """
+        if not self.subscribed or self.quote_lib is None:
+            return
+        step = 1000000 // max(self.tick_rate, 1)
+        for _ in range(count):
+            stock = self.subscribed[self.cursor % len(self.subscribed)]
+            self.cursor += 1
+            self.clock_us = min(self.clock_us + step, 13 * 3600 * 1000000 + 24 * 60 * 1000000)
+            self.fire_tick(self.quote_lib, stock, 'OnNotifyTicksLONG')
+            self.ticks_sent += 1
+            if self.best5_every and self.ticks_sent % self.best5_every == 0:
+                self.fire_best5(self.quote_lib, stock)
+
+    def fire_tick(self, source, stock, event):
+        """ 產生一筆 tick 事件 """
+        stock.price = max(100, stock.price + self.random.choice((-5, 0, 0, 5)))
+        qty = self.random.randint(1, 20)
+        stock.ptr += 1
+        stock.total += qty
+        seconds = self.clock_us // 1000000
+        timehms = seconds // 3600 * 10000 + seconds // 60 % 60 * 100 + seconds % 60
+        args = (
+            stock.sMarketNo, stock.nStockIdx, stock.ptr,
+            self.date, timehms, self.clock_us % 1000000,
+            stock.price - 5, stock.price, stock.price, qty, 0
+        )
+        if self.replay_history:
+            stock.log.append(args)
+        if self.lose > 0 and event == 'OnNotifyTicksLONG':
+            # 模擬 COM 事件遺失
+            self.lose -= 1
+            self.ticks_lost += 1
+            return
+        source.fire(event, *args)
+
+    def fire_best5(self, source, stock):
+        """ 產生一筆五檔事件 """
+        levels = []
+        for i in range(5):
+            levels += [stock.price - 5 * (i + 1), 10 + i]
+        levels += [0, 0]
+        for i in range(5):
+            levels += [stock.price + 5 * i, 10 + i]
+        levels += [0, 0]
+        source.fire('OnNotifyBest5LONG', stock.sMarketNo, stock.nStockIdx, *levels, 0)
+        self.best5_sent += 1
+
+    def queue_history(self, source, stock):
+        """ 訂閱時產生回補 ticks """
+        if stock.log:
+            for args in stock.log:
+                source.fire('OnNotifyHistoryTicksLONG', *args)
+            self.history_replayed += len(stock.log)
+            return
+
+        saved = self.clock_us
+        self.clock_us = 9 * 3600 * 1000000
+        for _ in range(self.history_ticks):
+            self.clock_us += 1000000
+            self.fire_tick(source, stock, 'OnNotifyHistoryTicksLONG')
+            self.history_sent += 1
+        self.clock_us = max(saved, self.clock_us)
+
+    def queue_kline(self, source, stock, start_date, end_date):
+        """ 產生 [start_date, end_date] 之間平日的日 K """
+        day = datetime.strptime(start_date, '%Y%m%d')
+        end = datetime.strptime(end_date, '%Y%m%d')
+        price = stock.price / 100
+        while day <= end:
+            if day.weekday() < 5 and int(day.strftime('%Y%m%d')) not in self.holidays:
+                close = price + self.random.choice((-1.0, 0.0, 1.0))
+                source.fire(
+                    'OnNotifyKLineData', stock.bstrStockNo,
+                    '%s, %.6f, %.6f, %.6f, %.6f, %d' % (
+                        day.strftime('%Y/%m/%d'), price, max(price, close) + 0.5,
+                        min(price, close) - 0.5, close, self.random.randint(1000, 50000)
+                    )
+                )
+                self.kline_sent += 1
+                price = close
+            day += timedelta(days=1)
+
+    def lose_ticks(self, count):
+        """ 接下來 count 筆即時 ticks 不送出, nPtr 照常遞增 """
+        with self.lock:
+            self.lose += count
+
+    def inject_disconnect(self, n_kind=SK_SUBJECT_CONNECTION_SOLCLIENTAPI_FAIL, n_code=0):
+        """ 模擬斷線, 之後不再產生 ticks, 直到重新 EnterMonitorLONG() """
+        with self.lock:
+            self.connected = False
+            self.subscribed.clear()
+            self.disconnects += 1
+            if self.quote_lib is not None:
+                self.quote_lib.fire('OnConnection', n_kind, n_code)
+
+    def summary(self):
+        """ 統計摘要 """
+        return {
+            'logins': self.logins,
+            'index_lookups': self.index_lookups,
+            'ticks': self.ticks_sent,
+            'history': self.history_sent,
+            'history_replayed': self.history_replayed,
+            'tick_lookups': self.tick_lookups,
+            'ticks_lost': self.ticks_lost,
+            'best5': self.best5_sent,
+            'kline': self.kline_sent,
+            'disconnects': self.disconnects
+        }
@@ -0,0 +1,104 @@
+"""
+skcom.stockmeta
+
+個股基本資料快取, 避免每筆 ticks/五檔都呼叫 SKQuoteLib_GetStockByIndexLONG
+"""
+
+def fix_encoding(thestr):
+    """ 修正群益 API 回傳的股票名稱編碼 """
+    # TODO: 股票名稱的編碼可能會被 Python 的參數影響, 需要測試一下
+    # 換了 Python 版本以後, 這樣才能取得正確中文字
+    newstr = bytes(map(ord, thestr)).decode('cp950')
+    # 原本這樣就可以
+    # newstr = thestr
+    return newstr
+
+class StockMeta():
+    """ 個股基本資料 """
+    __slots__ = ('market_no', 'index', 'stock_no', 'name', 'decimal', 'divisor')
+
+    def __init__(self, market_no, index, stock_no, name, decimal):
+        # pylint: disable=too-many-arguments
+        self.market_no = market_no
+        self.index = index
+        self.stock_no = stock_no
+        self.name = name
+        self.decimal = decimal
+        # 價格欄位都是整數, 除以 10 ** sDecimal 才是實際價格
+        self.divisor = 10 ** decimal
+
+    def __repr__(self):
+        return 'StockMeta(%s %s, market=%d, index=%d, decimal=%d)' % (
+            self.stock_no, self.name, self.market_no, self.index, self.decimal
+        )
+
+class StockMetaCache():
+    """
+    以 (sMarketNo, nStockIndex) 為鍵值的個股基本資料快取
+
+    loader 為 SKQuoteLib_GetStockByIndexLONG 的包裝函數, 回傳 (SKSTOCKLONG, nCode),
+    listener 有設定時, 每次從 COM 元件載入資料都會收到 StockMeta
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.listener = None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, market_no, index):
+        """
+        取得個股基本資料, 回傳 (StockMeta, nCode)
+
+        第一次查詢才會呼叫 COM 元件, nCode 非 0 時不寫入快取
+        """
+        key = (market_no, index)
+        meta = self.entries.get(key)
+        if meta is not None:
+            self.hits += 1
+            return (meta, 0)
+
+        self.misses += 1
+        (p_stock, n_code) = self.loader(market_no, index)
+        if n_code != 0:
+            return (None, n_code)
+        return (self.load(market_no, index, p_stock), 0)
+
+    def load(self, market_no, index, p_stock):
+        """ 由 SKSTOCKLONG 建立個股基本資料並寫入快取 """
+        meta = StockMeta(
+            market_no,
+            index,
+            p_stock.bstrStockNo,
+            fix_encoding(p_stock.bstrStockName),
+            p_stock.sDecimal
+        )
+        self.entries[(market_no, index)] = meta
+        if self.listener is not None:
+            self.listener(meta)
+        return meta
+
+    def put(self, meta):
+        """ 直接寫入個股基本資料, 重播或模擬時使用 """
+        self.entries[(meta.market_no, meta.index)] = meta
+
+    def discard(self, stock_no):
+        """ 移除指定股票的快取, 取消訂閱時使用 """
+        for (key, meta) in list(self.entries.items()):
+            if meta.stock_no == stock_no:
+                del self.entries[key]
+
+    def clear(self):
+        """ 清除快取, 重新連線後 nStockIndex 可能改變 """
+        self.entries.clear()
+
+    def stats(self):
+        """ 快取統計, misses 等於實際呼叫 COM 元件的次數 """
+        total = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total > 0 else 0.0
+        }
@@ -0,0 +1,133 @@
+"""
+skcom.subscribe
+
+Ticks 訂閱管理, 把股票分配到 SKQuoteLib_RequestTicks 的 psPageNo
+"""
+
+import logging
+
+logger = logging.getLogger('skcom')
+
+class SubscriptionManager():
+    """
+    Ticks 訂閱分頁管理
+
+    psPageNo 介於 0-49, 實測一個 page 可以對應多檔股票, 因此超過 50 檔時
+    每個 page 放 per_page 檔; per_page 為 None 時依訂閱數量自動調整,
+    50 檔以內每個 page 一檔, 與官方文件的用法相同
+
+    新股票一律分配到目前股票最少的 page, 讓事件平均分散
+    """
+
+    # psPageNo 可用數量, 指定 50 會取消報價
+    MAX_PAGES = 50
+
+    def __init__(self, per_page=None):
+        self.per_page = per_page
+        self.pages = {}    # page -> [stock_no, ...]
+        self.symbols = {}  # stock_no -> page
+
+    def limit(self):
+        """ 再加入一檔股票時, 每個 page 的股票數量上限 """
+        if self.per_page is not None:
+            return self.per_page
+        return max(1, -(-(len(self.symbols) + 1) // self.MAX_PAGES))
+
+    def capacity(self):
+        """ 可訂閱的股票總數, 自動調整模式沒有上限 """
+        if self.per_page is None:
+            return None
+        return self.per_page * self.MAX_PAGES
+
+    def assign(self, stock_no):
+        """ 分配 page, 已經訂閱時回傳原本的 page, 沒有空位時回傳 None """
+        page = self.symbols.get(stock_no)
+        if page is not None:
+            return page
+
+        limit = self.limit()
+        best = None
+        for page_no in range(self.MAX_PAGES):
+            size = len(self.pages.get(page_no, ()))
+            if size == 0:
+                best = page_no
+                break
+            if size < limit and (best is None or size < len(self.pages[best])):
+                best = page_no
+        if best is None:
+            return None
+
+        self.pages.setdefault(best, []).append(stock_no)
+        self.symbols[stock_no] = best
+        return best
+
+    def plan(self, stock_list):
+        """
+        重新分配所有股票, 回傳 [(page, stock_no), ...]
+
+        超過容量的股票不訂閱, 記錄警告
+        """
+        self.clear()
+        result = []
+        skipped = []
+        for stock_no in stock_list:
+            page_no = self.assign(stock_no)
+            if page_no is None:
+                skipped.append(stock_no)
+            else:
+                result.append((page_no, stock_no))
+        if skipped:
+            # 發生這個問題不阻斷使用, 讓其他功能維持正常運作
+            logger.warning(
+                'Ticks 最多只能監聽 %d 檔, 未訂閱: %s', self.capacity(), ', '.join(skipped)
+            )
+        return result
+
+    def confirm(self, stock_no, page_no):
+        """ 以 SKQuoteLib_RequestTicks 回傳的 page 為準 """
+        if self.symbols.get(stock_no) == page_no:
+            return
+        self.release(stock_no)
+        self.pages.setdefault(page_no, []).append(stock_no)
+        self.symbols[stock_no] = page_no
+
+    def release(self, stock_no):
+        """ 取消訂閱, 回傳原本的 page, 沒有訂閱時回傳 None """
+        page_no = self.symbols.pop(stock_no, None)
+        if page_no is not None:
+            self.pages[page_no].remove(stock_no)
+            if not self.pages[page_no]:
+                del self.pages[page_no]
+        return page_no
+
+    def page_of(self, stock_no):
+        """ 股票所在的 page """
+        return self.symbols.get(stock_no)
+
+    def clear(self):
+        """ 清除所有分配 """
+        self.pages.clear()
+        self.symbols.clear()
+
+    def page_stats(self, ticks_count, best5_books):
+        """
+        每個 page 的事件統計
+
+        由個股計數器加總, 每筆事件不需要額外查詢 page
+        """
+        stats = {}
+        for (page_no, stock_list) in sorted(self.pages.items()):
+            ticks = 0
+            best5 = 0
+            for stock_no in stock_list:
+                ticks += ticks_count.get(stock_no, 0)
+                book = best5_books.get(stock_no)
+                if book is not None:
+                    best5 += book.updates
+            stats[page_no] = {
+                'symbols': len(stock_list),
+                'ticks': ticks,
+                'best5': best5,
+                'events': ticks + best5
+            }
+        return stats
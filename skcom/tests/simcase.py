@@ -0,0 +1,67 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from skcom.simulator import SkcomSimulator
+
+# pylint: disable=all
+
+class SimulatorTestCase(unittest.TestCase):
+    """ 連到 SkcomSimulator 的聽牌機測試, 以條件等待取代固定時間 """
+
+    TIMEOUT = 10.0
+
+    def setUp(self):
+        # 群益 API log 與交易日曆寫在暫存的家目錄
+        home = tempfile.TemporaryDirectory()
+        self.addCleanup(home.cleanup)
+        patcher = mock.patch.dict(os.environ, {'HOME': home.name, 'USERPROFILE': home.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.home = home.name
+
+    def start_simulator(self, config=None, **kwargs):
+        """ 安裝模擬器並建立聽牌機, 測試結束時還原 pythoncom 與 comtypes """
+        sim = SkcomSimulator(**kwargs)
+        sim.install()
+        self.addCleanup(sim.uninstall)
+        return (sim, self.create_receiver(sim, config))
+
+    def create_receiver(self, sim, config=None):
+        receiver = sim.create_receiver(config=config)
+        receiver.DELAY_PUMP = 0.02
+        return receiver
+
+    async def wait_until(self, condition, timeout=None):
+        """ 等待 condition() 成立, 逾時視為測試失敗 """
+        deadline = time.monotonic() + (timeout or self.TIMEOUT)
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('等待逾時: %s' % condition.__code__.co_firstlineno)
+            await asyncio.sleep(0.01)
+
+    async def wait_ticks(self, sim, count):
+        """ 等待模擬器再送出 count 筆即時 ticks """
+        target = sim.ticks_sent + count
+        await self.wait_until(lambda: sim.ticks_sent >= target)
+
+    def run_receiver(self, receiver, scenario):
+        """
+        執行聽牌機直到 scenario 完成後停止, 回傳 scenario 的結果
+
+        scenario 可以是條件函數或 async 函數
+        """
+        async def main():
+            async def driver():
+                try:
+                    if asyncio.iscoroutinefunction(scenario):
+                        return await scenario()
+                    return await self.wait_until(scenario)
+                finally:
+                    receiver.stop()
+            (_, result) = await asyncio.gather(receiver.root_task(), driver())
+            return result
+        return asyncio.run(main())
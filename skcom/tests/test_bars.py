@@ -0,0 +1,86 @@
+import unittest
+
+from skcom.bars import BarBuilder, parse_interval
+from skcom.exception import ConfigException
+from skcom.record import tick_timestamp
+
+# pylint: disable=all
+
+def ts(hms, micros=0, date=20201102):
+    return tick_timestamp(date, hms, micros)
+
+class TestBarBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.closed = []
+        self.builder = BarBuilder([60, 300], self.closed.append)
+
+    def test_parse_interval(self):
+        self.assertEqual(parse_interval('1m'), 60)
+        self.assertEqual(parse_interval('15m'), 900)
+        self.assertEqual(parse_interval('30s'), 30)
+        self.assertEqual(parse_interval('1h'), 3600)
+        self.assertEqual(parse_interval(90), 90)
+        for value in ['1d', 'm', 0, '-5m']:
+            with self.assertRaises(ConfigException):
+                parse_interval(value)
+
+    def test_ohlcv(self):
+        b = self.builder
+        b.update('2330', '台積電', ts(90000, 100), 100.0, 5)
+        b.update('2330', '台積電', ts(90010), 102.0, 1)
+        b.update('2330', '台積電', ts(90030), 99.0, 2)
+        b.update('2330', '台積電', ts(90059, 999999), 101.0, 3)
+        self.assertEqual(self.closed, [])
+
+        # 下一分鐘的第一筆 tick 讓前一根收盤
+        b.update('2330', '台積電', ts(90100), 103.0, 4)
+        self.assertEqual(len(self.closed), 1)
+        bar = self.closed[0]
+        self.assertEqual((bar.interval, bar.time), (60, '09:00:00'))
+        self.assertEqual((bar.open, bar.high, bar.low, bar.close), (100.0, 102.0, 99.0, 101.0))
+        self.assertEqual((bar.volume, bar.ticks), (11, 4))
+        self.assertEqual(bar.ts, ts(90000))
+
+        # 5 分 K 還沒收盤, 盤中資料可以直接讀取
+        series = b.get('2330', 300)
+        self.assertEqual(series.slots, 54)
+        self.assertEqual([x.volume for x in series.bars()], [15])
+        self.assertIsNone(b.get('2330', 900))
+
+    def test_sweep_idle_symbols(self):
+        b = self.builder
+        b.update('2330', '台積電', ts(90000), 100.0, 1)
+        b.update('2317', '鴻海', ts(90005), 50.0, 1)
+        # 鴻海沒有新 tick, 市場時間跨過 09:01 時一樣收盤
+        b.update('2330', '台積電', ts(90101), 100.5, 1)
+        self.assertEqual(sorted(x.id for x in self.closed), ['2317', '2330'])
+
+        # 13:30 收盤撮合併入最後一根, 盤後零股不列入
+        b.update('2330', '台積電', ts(132459), 101.0, 1)
+        b.update('2330', '台積電', ts(133000), 102.0, 7)
+        b.update('2330', '台積電', ts(143000), 103.0, 9)
+        last = sorted((x.interval, x.time, x.close, x.volume) for x in self.closed[-2:])
+        self.assertEqual(last, [(60, '13:29:00', 102.0, 7), (300, '13:25:00', 102.0, 7)])
+        self.assertEqual(b.ignored_ticks, 1)
+
+    def test_order_independent(self):
+        ticks = [
+            (ts(90000, 1), 100.0, 1), (ts(90000, 2), 101.0, 2),
+            (ts(90020), 98.0, 3), (ts(90040), 99.5, 4)
+        ]
+        other = BarBuilder([60], lambda bar: None)
+        for tick in ticks:
+            self.builder.update('2330', '台積電', *tick)
+        for tick in reversed(ticks):
+            other.update('2330', '台積電', *tick)
+        expect = [x.as_dict() for x in self.builder.get('2330', 60).bars()]
+        self.assertEqual([x.as_dict() for x in other.get('2330', 60).bars()], expect)
+        self.assertEqual((expect[0]['open'], expect[0]['close']), (100.0, 99.5))
+
+    def test_new_day(self):
+        b = self.builder
+        b.update('2330', '台積電', ts(132000), 100.0, 1)
+        b.update('2330', '台積電', ts(90000, date=20201103), 105.0, 1)
+        self.assertEqual([x.time for x in self.closed], ['13:20:00', '13:20:00'])
+        self.assertEqual([x.close for x in b.get('2330', 60).bars()], [105.0])
@@ -0,0 +1,56 @@
+import unittest
+
+from skcom.batch import TickBatcher, Best5Conflator
+
+# pylint: disable=all
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTickBatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.batcher = TickBatcher(max_batch=3, max_delay_ms=100, clock=self.clock)
+
+    def test_size_bound(self):
+        self.assertIsNone(self.batcher.add('a1'))
+        self.assertIsNone(self.batcher.add('b1'))
+        self.assertEqual(self.batcher.add('a2'), ['a1', 'b1', 'a2'])
+        self.assertIsNone(self.batcher.flush())
+
+    def test_time_bound(self):
+        self.assertIsNone(self.batcher.add('a1'))
+        self.clock.now = 0.15
+        self.assertEqual(self.batcher.add('a2'), ['a1', 'a2'])
+
+    def test_flush_and_stats(self):
+        self.batcher.add('a1')
+        self.assertEqual(self.batcher.flush(), ['a1'])
+        for name in ['a1', 'a2', 'a3']:
+            self.batcher.add(name)
+        summary = self.batcher.stats.summary()
+        self.assertEqual(summary['batches'], 2)
+        self.assertEqual(summary['items'], 4)
+        self.assertEqual(summary['max'], 3)
+        self.assertEqual(summary['histogram']['<=1'], 1)
+        self.assertEqual(summary['histogram']['<=4'], 1)
+
+class TestBest5Conflator(unittest.TestCase):
+
+    def test_latest_only(self):
+        conflator = Best5Conflator(50)
+        conflator.put('2330', 'a1')
+        conflator.put('2317', 'b1')
+        conflator.put('2330', 'a2')
+        self.assertEqual(conflator.flush(), ['a2', 'b1'])
+        self.assertEqual(conflator.flush(), [])
+        summary = conflator.summary()
+        self.assertEqual(summary['updates'], 3)
+        self.assertEqual(summary['collapsed'], 1)
+        self.assertEqual(summary['delivered'], 2)
@@ -0,0 +1,29 @@
+import asyncio
+import importlib.util
+import os
+
+from skcom.tests.simcase import SimulatorTestCase
+
+# pylint: disable=all
+
+BENCH_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'bin', 'bench_receiver.py')
+
+def load_bench():
+    spec = importlib.util.spec_from_file_location('bench_receiver', BENCH_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class TestBenchReceiver(SimulatorTestCase):
+
+    def test_run_scenario(self):
+        if not os.path.isfile(BENCH_PATH):
+            self.skipTest('bin/bench_receiver.py 不在原始碼目錄')
+        bench = load_bench()
+        for (name, use_async, with_best5, raw) in bench.SCENARIOS:
+            result = asyncio.run(bench.run_scenario(name, use_async, with_best5, raw, 500, 5))
+            self.assertEqual(result['scenario'], name)
+            self.assertEqual(result['delivered'], 500)
+
+        result = asyncio.run(bench.run_scenario('probes', False, True, True, 500, 5, probes=True))
+        self.assertEqual(result['stages']['ticks']['callback']['count'], 500)
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import unittest
+
+from skcom.comthread import ComThread, EventHandoff
+
+# pylint: disable=all
+
+class TestEventHandoff(unittest.TestCase):
+
+    def test_order_and_stats(self):
+        received = []
+        flushed = []
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            handoff = EventHandoff(loop, received.append, maxsize=1000, after=lambda: flushed.append(len(received)))
+
+            def producer():
+                for i in range(500):
+                    handoff.put(i)
+
+            worker = threading.Thread(target=producer)
+            worker.start()
+            while worker.is_alive() or handoff.depth() > 0:
+                await asyncio.sleep(0.001)
+            worker.join()
+            await asyncio.sleep(0.01)
+            return handoff
+
+        handoff = asyncio.run(scenario())
+        self.assertEqual(received, list(range(500)))
+        self.assertEqual(flushed[-1], 500)
+        summary = handoff.summary()
+        self.assertEqual(summary['dropped'], 0)
+        self.assertGreaterEqual(summary['latency']['count'], 1)
+
+    def test_bounded(self):
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            handoff = EventHandoff(loop, lambda r: None, maxsize=3)
+            for i in range(5):
+                handoff.put(i)
+            return handoff
+
+        handoff = asyncio.run(scenario())
+        self.assertEqual(handoff.dropped, 2)
+        self.assertEqual(handoff.max_depth, 3)
+
+class TestComThread(unittest.TestCase):
+
+    def test_call_runs_on_com_thread(self):
+        pumped = []
+        com = ComThread(lambda: 'sink', lambda: pumped.append(1), interval_ms=1)
+        com.start_and_wait()
+        name = com.call(lambda: threading.current_thread().name)
+        com.stop()
+        com.join(1)
+        self.assertEqual(name, 'skcom-com')
+        self.assertTrue(pumped)
+
+    def test_pause(self):
+        pumped = []
+        com = ComThread(lambda: 'sink', lambda: pumped.append(1), interval_ms=1)
+        com.start_and_wait()
+        com.pause()
+        # 暫停期間仍然執行 COM 方法呼叫, 呼叫完成後推送次數不再增加
+        com.call(lambda: None)
+        count = len(pumped)
+        com.call(lambda: None)
+        com.call(lambda: None)
+        self.assertEqual(len(pumped), count)
+        com.resume()
+        com.stop()
+        com.join(1)
+
+    def test_setup_error(self):
+        def setup():
+            raise RuntimeError('COM 元件建立失敗')
+        com = ComThread(setup, lambda: None, interval_ms=1)
+        with self.assertRaises(RuntimeError):
+            com.start_and_wait()
+        com.stop()
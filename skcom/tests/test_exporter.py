@@ -0,0 +1,81 @@
+import asyncio
+
+from skcom.tests.simcase import SimulatorTestCase
+
+# pylint: disable=all
+
+async def http_get(port, path):
+    (reader, writer) = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(('GET %s HTTP/1.0\r\nHost: localhost\r\n\r\n' % path).encode('latin-1'))
+    await writer.drain()
+    resp = await reader.read()
+    writer.close()
+    (head, body) = resp.split(b'\r\n\r\n', 1)
+    return (head.split(b'\r\n')[0].decode(), body.decode('utf-8'))
+
+def parse_metrics(text):
+    values = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        (name, value) = line.rsplit(' ', 1)
+        values[name] = float(value)
+    return values
+
+class TestMetricsExporter(SimulatorTestCase):
+
+    def test_scrape(self):
+        (sim, receiver) = self.start_simulator(symbols=2, tick_rate=500)
+        ticks = []
+        receiver.set_ticks_hook(ticks.append, raw=True)
+        receiver.set_metrics_server(port=0)
+
+        async def scraper():
+            await self.wait_until(lambda: {'1101', '1102'} <= {tick.id for tick in ticks})
+            port = receiver.metrics_exporter.port
+            (status, body) = await http_get(port, '/metrics')
+            (missing, _) = await http_get(port, '/')
+            return (status, body, missing)
+
+        (status, body, missing) = self.run_receiver(receiver, scraper)
+        self.assertEqual(status, 'HTTP/1.0 200 OK')
+        self.assertEqual(missing, 'HTTP/1.0 404 Not Found')
+
+        values = parse_metrics(body)
+        self.assertEqual(values['skcom_receiver_state{state="MONITOR_DONE"}'], 1)
+        self.assertEqual(values['skcom_receiver_state{state="IDLE"}'], 0)
+        self.assertEqual(values['skcom_retry_count'], 0)
+        self.assertGreater(values['skcom_ticks_total{symbol="1101"}'], 0)
+        self.assertNotIn('skcom_ticks_per_second{symbol="1102"}', values)
+        # 沒有設定 set_hook_limit() 也輸出 hook 佇列
+        self.assertEqual(values['skcom_hook_pending{kind="ticks"}'], 0)
+        self.assertIn('skcom_hook_inflight{kind="best5"}', values)
+        self.assertEqual(values['skcom_handoff_depth{kind="ticks"}'], 0)
+        self.assertGreater(values['skcom_best5_updates_total'], 0)
+        self.assertGreater(values['skcom_pump_cycle_seconds_count'], 0)
+        self.assertLess(values['skcom_last_event_age_seconds'], 0.5)
+        # 伺服器已關閉
+        self.assertIsNone(receiver.metrics_exporter.server)
+
+        # 抓取不改變狀態, 連續抓取的累計數值相同
+        exporter = receiver.metrics_exporter
+        first = parse_metrics(exporter.render())
+        second = parse_metrics(exporter.render())
+        self.assertEqual(first['skcom_ticks_total{symbol="1101"}'], second['skcom_ticks_total{symbol="1101"}'])
+        self.assertEqual(first['skcom_best5_updates_total'], second['skcom_best5_updates_total'])
+
+    def test_hook_inflight(self):
+        (sim, receiver) = self.start_simulator(symbols=1, tick_rate=200)
+
+        async def hook(entry):
+            await asyncio.sleep(0)
+
+        async def scenario():
+            receiver.await_coroutine(hook(None), 'ticks')
+            receiver.await_coroutine(hook(None), 'ticks')
+            inflight = receiver.hook_inflight['ticks']
+            await self.wait_until(lambda: receiver.hook_inflight['ticks'] == 0)
+            return inflight
+
+        self.assertEqual(asyncio.run(scenario()), 2)
+        self.assertEqual(receiver.hook_inflight['ticks'], 0)
@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+
+from skcom.inflight import HookGate, HookPolicy
+
+# pylint: disable=all
+
+class TestHookGate(unittest.TestCase):
+
+    def run_gate(self, policy, events):
+        """ limit=2, 依序送出 events 後讓 hook 全部完成, 回傳 (實際執行順序, gate) """
+        executed = []
+
+        async def hook(name):
+            await asyncio.sleep(0.01)
+            executed.append(name)
+
+        async def scenario():
+            gate = HookGate('ticks', 2, policy)
+            for (name, key) in events:
+                gate.submit(hook(name), key)
+            await gate.wait_ready()
+            while gate.inflight > 0:
+                await asyncio.sleep(0.005)
+            return gate
+
+        gate = asyncio.run(scenario())
+        return (executed, gate)
+
+    def test_block(self):
+        events = [('a%d' % i, 'A') for i in range(5)]
+        (executed, gate) = self.run_gate(HookPolicy.BLOCK, events)
+        self.assertEqual(executed, ['a0', 'a1', 'a2', 'a3', 'a4'])
+        self.assertEqual(gate.max_inflight, 2)
+        self.assertEqual(gate.max_pending, 3)
+
+    def test_drop_newest(self):
+        events = [('a%d' % i, 'A') for i in range(5)]
+        (executed, gate) = self.run_gate(HookPolicy.DROP_NEWEST, events)
+        self.assertEqual(executed, ['a0', 'a1'])
+        self.assertEqual(gate.dropped, 3)
+
+    def test_drop_oldest(self):
+        events = [('a%d' % i, 'A') for i in range(6)]
+        (executed, gate) = self.run_gate(HookPolicy.DROP_OLDEST, events)
+        self.assertEqual(executed, ['a0', 'a1', 'a4', 'a5'])
+        self.assertEqual(gate.dropped, 2)
+
+    def test_conflate(self):
+        events = [('a0', 'A'), ('b0', 'B'), ('a1', 'A'), ('b1', 'B'), ('a2', 'A')]
+        (executed, gate) = self.run_gate(HookPolicy.CONFLATE, events)
+        self.assertEqual(sorted(executed), ['a0', 'a2', 'b0', 'b1'])
+        self.assertEqual(gate.conflated, 1)
+
+    def test_block_backlog(self):
+        async def scenario():
+            gate = HookGate('ticks', 1, HookPolicy.BLOCK, backlog=3)
+            for i in range(6):
+                gate.submit(asyncio.sleep(0.01), 'A')
+            await gate.wait_ready()
+            return gate
+
+        gate = asyncio.run(scenario())
+        self.assertEqual(gate.max_pending, 3)
+        self.assertEqual(gate.dropped, 2)
+
+    def test_conflate_without_key(self):
+        events = [('b%d' % i, None) for i in range(5)]
+        (executed, gate) = self.run_gate(HookPolicy.CONFLATE, events)
+        self.assertEqual(executed, ['b0', 'b1', 'b4'])
+        self.assertEqual(gate.conflated, 2)
+
+    def test_notify(self):
+        changes = []
+
+        async def scenario():
+            gate = HookGate('ticks', 1, HookPolicy.BLOCK)
+            gate.notify = changes.append
+            for i in range(3):
+                gate.submit(asyncio.sleep(0.01), 'A')
+            await gate.wait_ready()
+
+        asyncio.run(scenario())
+        self.assertEqual(changes[0], False)
+        self.assertEqual(changes[-1], True)
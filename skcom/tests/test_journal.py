@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from skcom.journal import (
+    JournalWriter, read_journal, journal_filename,
+    REC_TICK, REC_HISTORY, REC_BEST5, REC_META, REC_KLINE, TICK_STRUCT, BEST5_STRUCT
+)
+
+# pylint: disable=all
+
+class TestJournal(unittest.TestCase):
+
+    def test_write_and_read(self):
+        levels = tuple(range(1, 25))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = JournalWriter(tmpdir, commit_ms=10, fsync=False)
+            writer.start()
+            writer.write_tick(True, 0, 12, 1, 20220113, 90000, 530, 23300, 23350, 23350, 3594, 0)
+            writer.write_tick(False, 0, 12, 2, 20220113, 90005, 543, 23300, 23350, 23350, 87, 0)
+            writer.write_best5(0, 12, levels, 0)
+            writer.stop()
+
+            path = journal_filename(tmpdir, writer.day)
+            self.assertEqual(
+                os.path.getsize(path),
+                4 + TICK_STRUCT.size * 2 + BEST5_STRUCT.size
+            )
+            records = list(read_journal(path))
+
+        self.assertEqual([rec[0] for rec in records], [REC_HISTORY, REC_TICK, REC_BEST5])
+        self.assertEqual(records[0][1][:11], (0, 12, 1, 20220113, 90000, 530, 23300, 23350, 23350, 3594, 0))
+        self.assertEqual(records[2][1][2:26], levels)
+
+        summary = writer.summary()
+        self.assertEqual(summary['records'], 3)
+        self.assertEqual(summary['bytes_per_tick'], (TICK_STRUCT.size * 2 + BEST5_STRUCT.size) / 2)
+
+    def test_truncate_torn_record(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = JournalWriter(tmpdir, commit_ms=10, fsync=False)
+            writer.start()
+            writer.write_tick(False, 0, 12, 1, 20220113, 90000, 0, 23300, 23350, 23350, 1, 0)
+            writer.stop()
+            path = journal_filename(tmpdir, writer.day)
+
+            # 模擬寫到一半當機
+            record = TICK_STRUCT.pack(REC_TICK, 0, 12, 2, 20220113, 90001, 0, 23300, 23350, 23350, 2, 0, 0)
+            with open(path, 'ab') as journal:
+                journal.write(record[:10])
+
+            writer = JournalWriter(tmpdir, commit_ms=10, fsync=False)
+            writer.start()
+            writer.write_tick(False, 0, 12, 3, 20220113, 90002, 0, 23300, 23350, 23350, 3, 0)
+            writer.stop()
+            records = list(read_journal(path))
+
+        self.assertEqual([rec[1][2] for rec in records], [1, 3])
+        self.assertEqual(writer.truncated, 10)
+
+    def test_rotate_by_record_time(self):
+        def record(ptr, when):
+            recv_ns = int(datetime(2022, 1, 13, *when).timestamp()) * 1000000000
+            return TICK_STRUCT.pack(REC_TICK, 0, 12, ptr, 20220113, 0, 0, 1, 1, 1, 1, 0, recv_ns)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = JournalWriter(tmpdir, commit_ms=10, fsync=False)
+            writer.put(record(1, (23, 59, 59)))
+            writer.put(record(2, (23, 59, 59, 999999)))
+            writer.put(TICK_STRUCT.pack(
+                REC_TICK, 0, 12, 3, 20220114, 0, 0, 1, 1, 1, 1, 0,
+                int(datetime(2022, 1, 14).timestamp()) * 1000000000
+            ))
+            # 日期變更之後才寫入
+            writer.commit()
+            writer.close_file()
+            first = [rec[1][2] for rec in read_journal(journal_filename(tmpdir, '20220113'))]
+            second = [rec[1][2] for rec in read_journal(journal_filename(tmpdir, '20220114'))]
+
+        self.assertEqual(first, [1, 2])
+        self.assertEqual(second, [3])
+
+    def test_bounded(self):
+        writer = JournalWriter('.', maxsize=2)
+        for i in range(5):
+            writer.write_best5(0, 12, tuple(range(24)), 0)
+        self.assertEqual(len(writer.queue), 2)
+        self.assertEqual(writer.dropped, 3)
+
+class TestJournalText(unittest.TestCase):
+
+    def test_meta_and_kline(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = JournalWriter(tmpdir, commit_ms=10, fsync=False)
+            writer.start()
+            writer.write_meta(0, 12, '2330', '台積電', 2)
+            writer.write_kline('2330', '2019/05/21, 233.500000, 236.000000, 232.500000, 234.000000, 79971')
+            writer.stop()
+            records = list(read_journal(journal_filename(tmpdir, writer.day)))
+
+        self.assertEqual(records[0][0], REC_META)
+        self.assertEqual(records[0][1][:5], (0, 12, 2, '2330', '台積電'))
+        self.assertEqual(records[1][0], REC_KLINE)
+        self.assertEqual(records[1][1][0], '2330')
+        self.assertTrue(records[1][1][1].startswith('2019/05/21, '))
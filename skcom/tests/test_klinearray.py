@@ -0,0 +1,58 @@
+import tempfile
+import unittest
+
+from skcom.klinearray import np, KLineColumns, dates_from_int, dates_to_int
+from skcom.klinestore import KLineStore
+
+# pylint: disable=all
+
+LINES = [
+    '2020/11/02, 233.500000, 236.000000, 232.500000, 234.000000, 79971',
+    '2020/11/03, 234.000000, 240.000000, 233.000000, 239.500000, 81234',
+    '2020/11/04, 239.500000, 241.000000, 237.000000, 238.000000, 50123'
+]
+
+@unittest.skipIf(np is None, 'numpy 未安裝')
+class TestKLineColumns(unittest.TestCase):
+
+    def test_parse(self):
+        kline = KLineColumns.parse('2330', '台積電', LINES)
+        self.assertEqual(len(kline), 3)
+        self.assertEqual(kline.date.dtype, np.dtype('M8[D]'))
+        self.assertEqual(kline.close.dtype, np.float64)
+        self.assertEqual(kline.volume.dtype, np.int64)
+        self.assertEqual(str(kline.date[0]), '2020-11-02')
+        self.assertEqual(kline.high.tolist(), [236.0, 240.0, 241.0])
+        self.assertEqual(kline.volume.tolist(), [79971, 81234, 50123])
+
+    def test_quotes_adapter(self):
+        kline = KLineColumns.parse('2330', '台積電', LINES)
+        self.assertEqual(kline['id'], '2330')
+        self.assertEqual(kline['name'], '台積電')
+        self.assertEqual(kline['quotes'][1], {
+            'date': '2020-11-03',
+            'open': 234.0,
+            'high': 240.0,
+            'low': 233.0,
+            'close': 239.5,
+            'volume': 81234
+        })
+        tail = kline.tail(2)
+        self.assertEqual([q['date'] for q in tail.quotes()], ['2020-11-03', '2020-11-04'])
+        self.assertIs(kline.tail(0), kline)
+        self.assertEqual(len(KLineColumns.parse('2330', '台積電', [])), 0)
+
+    def test_dates(self):
+        values = np.array([19700101, 20200229, 20201231])
+        dates = dates_from_int(values)
+        self.assertEqual([str(d) for d in dates], ['1970-01-01', '2020-02-29', '2020-12-31'])
+        self.assertEqual(dates_to_int(dates).tolist(), values.tolist())
+
+    def test_store_roundtrip(self):
+        kline = KLineColumns.parse('2330', '台積電', LINES)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = KLineStore(tmpdir)
+            self.assertEqual(store.merge_bars('2330', kline.bars()), 3)
+            loaded = KLineColumns.from_bytes('2330', '台積電', store.read_bytes('2330', 2))
+            self.assertEqual(loaded.quotes(), kline.tail(2).quotes())
+            self.assertEqual(store.quotes('2330'), kline.quotes())
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from skcom.klinestore import KLineStore, BAR_STRUCT, KLINE_MAGIC
+
+# pylint: disable=all
+
+def quote(date, close, volume=1000):
+    return {
+        'date': date,
+        'open': close - 1.0,
+        'high': close + 1.0,
+        'low': close - 2.0,
+        'close': close,
+        'volume': volume
+    }
+
+class TestKLineStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = KLineStore(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_append_and_read(self):
+        self.assertIsNone(self.store.span('2330'))
+        self.assertEqual(self.store.merge('2330', [
+            quote('2020-01-03', 330.0), quote('2020-01-02', 339.0)
+        ]), 2)
+        self.assertEqual(self.store.merge('2330', [quote('2020-01-06', 332.0)]), 1)
+        self.assertEqual(self.store.span('2330'), (20200102, 20200106, 3))
+
+        quotes = self.store.quotes('2330')
+        self.assertEqual([q['date'] for q in quotes], ['2020-01-02', '2020-01-03', '2020-01-06'])
+        self.assertEqual(quotes[0], quote('2020-01-02', 339.0))
+        self.assertEqual([q['date'] for q in self.store.quotes('2330', 2)], ['2020-01-03', '2020-01-06'])
+
+    def test_merge_overlap(self):
+        self.store.merge('2330', [quote('2020-01-02', 339.0), quote('2020-01-06', 332.0)])
+        added = self.store.merge('2330', [quote('2020-01-03', 330.0), quote('2020-01-06', 333.0)])
+        self.assertEqual(added, 1)
+        quotes = self.store.quotes('2330')
+        self.assertEqual([q['close'] for q in quotes], [339.0, 330.0, 333.0])
+
+    def test_truncated_tail(self):
+        self.store.merge('2330', [quote('2020-01-02', 339.0)])
+        path = self.store.filename('2330')
+        with open(path, 'ab') as kfile:
+            kfile.write(b'\x00' * 7)
+        self.store.merge('2330', [quote('2020-01-03', 330.0)])
+        self.assertEqual(os.path.getsize(path), len(KLINE_MAGIC) + 2 * BAR_STRUCT.size)
+        self.assertEqual(self.store.span('2330'), (20200102, 20200103, 2))
@@ -0,0 +1,72 @@
+import unittest
+
+from skcom.klinetrack import KLineTracker
+
+# pylint: disable=all
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class TestKLineTracker(unittest.TestCase):
+
+    def test_count(self):
+        clock = FakeClock()
+        tracker = KLineTracker(clock=clock)
+        tracker.expect('2330', 3, 20201104)
+        tracker.expect('2317', 0, None)
+        self.assertEqual(list(tracker.pending), ['2330'])
+
+        clock.now += 0.05
+        self.assertFalse(tracker.bar('2330', 20201102))
+        self.assertFalse(tracker.bar('2330', 20201103))
+        # 收到最後一個交易日即完成
+        self.assertTrue(tracker.bar('2330', 20201104))
+        self.assertFalse(tracker.bar('2330', 20201105))
+        result = tracker.results['2330']
+        self.assertEqual(result['bars'], 3)
+        self.assertEqual(result['reason'], 'session')
+        self.assertAlmostEqual(result['first_bar'], 0.05)
+        self.assertEqual(tracker.summary()['reasons'], {'session': 1, 'cached': 1})
+
+    def test_last_session(self):
+        tracker = KLineTracker(clock=FakeClock())
+        # 遇到假日時實際筆數少於預期
+        tracker.expect('2330', 5, 20201106)
+        self.assertFalse(tracker.bar('2330', 20201105))
+        self.assertTrue(tracker.bar('2330', 20201106))
+        self.assertEqual(tracker.results['2330']['bars'], 2)
+
+    def test_undercount(self):
+        tracker = KLineTracker(clock=FakeClock())
+        # 日曆不完整時預期筆數偏少, 收到預期筆數也不算完成
+        tracker.expect('2330', 2, 20201106)
+        self.assertFalse(tracker.bar('2330', 20201102))
+        self.assertFalse(tracker.bar('2330', 20201103))
+        self.assertFalse(tracker.bar('2330', 20201105))
+        self.assertTrue(tracker.bar('2330', 20201106))
+        self.assertEqual(tracker.results['2330']['bars'], 4)
+
+    def test_expire(self):
+        clock = FakeClock()
+        tracker = KLineTracker(quiet_ms=300, wait_ms=5000, clock=clock)
+        tracker.expect('2330', 5, 20201106)
+        tracker.expect('2317', 5, 20201106)
+        clock.now += 0.1
+        tracker.bar('2330', 20201102)
+        self.assertAlmostEqual(tracker.next_deadline(), 100.4)
+
+        clock.now += 0.2
+        self.assertEqual(tracker.expire(), [])
+        clock.now += 0.15
+        self.assertEqual(tracker.expire(), ['2330'])
+        self.assertAlmostEqual(tracker.next_deadline(), 105.0)
+
+        clock.now = 105.0
+        self.assertEqual(tracker.expire(), ['2317'])
+        self.assertIsNone(tracker.next_deadline())
+        self.assertEqual(tracker.summary()['reasons'], {'quiet': 1, 'empty': 1})
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+
+from skcom.probe import HotPathProbe
+from skcom.tests.simcase import SimulatorTestCase
+
+# pylint: disable=all
+
+class FakeClock():
+
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+class TestHotPathProbe(unittest.TestCase):
+
+    def test_stages(self):
+        probe = HotPathProbe(FakeClock(0.000003))
+        meta = probe.wrap_stage('meta', lambda x: x * 2)
+        callback = probe.wrap_callback('ticks', lambda x: meta(x))
+        self.assertEqual(callback(21), 42)
+
+        stats = probe.summary('ticks')
+        self.assertEqual(list(stats), ['callback', 'meta'])
+        self.assertEqual(stats['meta']['count'], 1)
+        self.assertEqual(stats['meta']['histogram']['<=5e-06'], 1)
+        # callback 包含 meta 的時間
+        self.assertEqual(stats['callback']['histogram']['<=1e-05'], 1)
+
+        probe.reset()
+        self.assertEqual(probe.summary('ticks')['meta']['count'], 0)
+
+    def test_complete(self):
+        probe = HotPathProbe()
+
+        async def hook():
+            await asyncio.sleep(0)
+            return 1
+
+        result = asyncio.run(probe.complete(hook(), 'best5'))
+        self.assertEqual(result, 1)
+        self.assertEqual(probe.summary()['best5']['complete']['count'], 1)
+
+class TestReceiverProbes(SimulatorTestCase):
+
+    def test_probes(self):
+        (sim, receiver) = self.start_simulator(symbols=2, tick_rate=500)
+        ticks = []
+        best5 = []
+
+        async def best5_hook(entry):
+            best5.append(entry)
+
+        receiver.set_ticks_hook(ticks.append, raw=True)
+        receiver.set_best5_hook(best5_hook, raw=True)
+        self.assertIsNone(receiver.get_probe_stats())
+        receiver.set_probes()
+        self.run_receiver(receiver, lambda: len(ticks) >= 100 and best5)
+
+        stats = receiver.get_probe_stats()
+        count = sim.summary()['ticks']
+        self.assertEqual(stats['ticks']['callback']['count'], count)
+        self.assertEqual(stats['ticks']['meta']['count'], count)
+        self.assertEqual(stats['ticks']['record']['count'], count)
+        self.assertEqual(stats['ticks']['dispatch']['count'], len(ticks))
+        self.assertEqual(stats['best5']['record']['count'], sim.summary()['best5'])
+        self.assertEqual(stats['best5']['complete']['count'], len(best5))
+
+        # 停用後還原成類別上的函數
+        receiver.set_probes(False)
+        self.assertIsNone(receiver.get_probe_stats())
+        self.assertNotIn('OnNotifyTicksLONG', receiver.__dict__)
+        self.assertNotIn('get', receiver.stock_meta.__dict__)
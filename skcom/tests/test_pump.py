@@ -0,0 +1,67 @@
+import unittest
+
+from skcom.pump import AdaptivePump
+
+# pylint: disable=all
+
+class StubPythoncom():
+    """ 模擬 pythoncom, PumpWaitingMessages() 逐一處理佇列中的合成訊息 """
+
+    def __init__(self):
+        self.queue = []
+        self.handled = 0
+
+    def enqueue(self, count):
+        self.queue.extend(range(count))
+
+    def PumpWaitingMessages(self):
+        while self.queue:
+            self.queue.pop(0)
+            self.handled += 1
+        return 0
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestAdaptivePump(unittest.TestCase):
+
+    def setUp(self):
+        self.com = StubPythoncom()
+        self.clock = FakeClock()
+        self.pump = AdaptivePump(
+            self.com.PumpWaitingMessages,
+            lambda: self.com.handled,
+            budget_ms=20,
+            idle_ms=500,
+            clock=self.clock
+        )
+
+    def test_active_and_backoff(self):
+        self.com.enqueue(5)
+        self.assertAlmostEqual(self.pump.cycle(), 0.02)
+        self.assertEqual(self.com.handled, 5)
+
+        # 沒有事件時逐步退避
+        delays = [self.pump.cycle() for _ in range(6)]
+        self.assertEqual(delays, [0.04, 0.08, 0.16, 0.32, 0.5, 0.5])
+
+        # 事件恢復後立即回到預算內
+        self.com.enqueue(1)
+        self.clock.now = 1.0
+        self.assertAlmostEqual(self.pump.cycle(), 0.02)
+
+    def test_histograms(self):
+        self.com.enqueue(1)
+        self.pump.cycle()
+        self.clock.now = 0.3
+        self.com.enqueue(1)
+        self.pump.cycle()
+        summary = self.pump.summary()
+        self.assertEqual(summary['cycle_time']['count'], 2)
+        self.assertEqual(summary['queue_wait']['count'], 1)
+        self.assertAlmostEqual(summary['queue_wait']['max'], 0.3)
@@ -0,0 +1,71 @@
+import unittest
+
+from skcom.record import TickRecord, Best5Book, tick_timestamp, format_tick_time, tick_dict
+
+# pylint: disable=all
+
+class TestTickRecord(unittest.TestCase):
+
+    def test_timestamp(self):
+        ts = tick_timestamp(20220113, 91503, 123456)
+        # 2022-01-13 09:15:03.123456 +08:00
+        self.assertEqual(ts, 1642036503123456000)
+        self.assertEqual(format_tick_time(ts), '09:15:03.123')
+        self.assertEqual(tick_timestamp(20220113, 91504, 0) - tick_timestamp(20220113, 91503, 0), 1000000000)
+
+    def test_as_dict(self):
+        ts = tick_timestamp(20220113, 90000, 0)
+        tick = TickRecord('2330', '台積電', ts, 600.0, 601.0, 600.5, 3, 1234)
+        self.assertEqual(tick.close, 600.5)
+        self.assertEqual(tick.as_dict(), {
+            'id': '2330',
+            'name': '台積電',
+            'time': '09:00:00.000',
+            'bid': 600.0,
+            'ask': 601.0,
+            'close': 600.5,
+            'qty': 3,
+            'vol': 1234
+        })
+
+    def test_tick_dict(self):
+        ts = tick_timestamp(20220113, 90000, 0)
+        tick = TickRecord('2330', '台積電', ts, 600.0, 601.0, 600.5, 3, 1234)
+        self.assertEqual(tick_dict('2330', '台積電', ts, 600.0, 601.0, 600.5, 3, 1234), tick.as_dict())
+
+    def test_slots(self):
+        tick = TickRecord('2330', '台積電', 0, 600.0, 601.0, 600.5, 3, 1234)
+        with self.assertRaises(AttributeError):
+            tick.extra = 1
+
+class TestBest5Book(unittest.TestCase):
+
+    def setUp(self):
+        self.book = Best5Book('2330', '台積電')
+        self.levels = (
+            60000, 1, 59900, 2, 59800, 3, 59700, 4, 59600, 5, 0, 0,
+            60100, 6, 60200, 7, 60300, 8, 60400, 9, 60500, 10, 0, 0
+        )
+
+    def test_update_in_place(self):
+        bid = self.book.bid
+        self.book.update(100, self.levels)
+        self.assertEqual(list(bid), [600.0, 599.0, 598.0, 597.0, 596.0])
+        self.assertEqual(list(self.book.ask_qty), [6, 7, 8, 9, 10])
+        # 不同小數位數
+        self.book.update(1000, self.levels)
+        self.assertEqual(bid[0], 60.0)
+        self.assertIs(bid, self.book.bid)
+        self.assertEqual(self.book.updates, 2)
+
+    def test_read_only(self):
+        self.book.update(100, self.levels)
+        with self.assertRaises(TypeError):
+            self.book.bid[0] = 1.0
+
+    def test_as_dict(self):
+        self.book.update(100, self.levels)
+        best = self.book.as_dict()['best']
+        self.assertEqual(len(best), 5)
+        self.assertEqual(best[0], {'bid': 600.0, 'bidQty': 1, 'ask': 601.0, 'askQty': 6})
+        self.assertEqual(best[4], {'bid': 596.0, 'bidQty': 5, 'ask': 605.0, 'askQty': 10})
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from skcom.journal import JournalWriter, journal_filename
+from skcom.replay import JournalReplay
+from skcom.stockmeta import StockMetaCache
+
+# pylint: disable=all
+
+class FakeReceiver():
+    """ 只記錄事件的聽牌機, 介面與 AsyncQuoteReceiver 相同 """
+
+    def __init__(self):
+        self.skc = None
+        self.stock_meta = StockMetaCache(None)
+        self.daily_kline = {}
+        self.best5_conflator = None
+        self.calls = []
+
+    def OnNotifyTicksLONG(self, *args):
+        (meta, n_code) = self.stock_meta.get(args[0], args[1])
+        self.calls.append(('tick', meta.stock_no, args[2]))
+
+    def OnNotifyHistoryTicksLONG(self, *args):
+        self.calls.append(('history', args[2]))
+
+    def OnNotifyBest5LONG(self, *args):
+        self.calls.append(('best5', len(args)))
+
+    def new_kline_buffer(self, stock_no, name):
+        return {'id': stock_no, 'name': name, 'quotes': []}
+
+    def OnNotifyKLineData(self, stock_no, data):
+        self.daily_kline[stock_no]['quotes'].append(data)
+
+    def emit_kline(self):
+        for (stock_no, kline) in self.daily_kline.items():
+            self.calls.append(('kline', stock_no, kline['name'], len(kline['quotes'])))
+
+    def flush_ticks_batch(self):
+        pass
+
+class TestJournalReplay(unittest.TestCase):
+
+    def test_replay_order(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = JournalWriter(tmpdir, commit_ms=10, fsync=False)
+            writer.start()
+            writer.write_meta(-1, -1, '2330', '台積電', 2)
+            writer.write_kline('2330', '2019/05/21, 1, 2, 0.5, 1.5, 10')
+            writer.write_kline('2330', '2019/05/22, 1, 2, 0.5, 1.5, 10')
+            writer.write_meta(0, 12, '2330', '台積電', 2)
+            writer.write_tick(True, 0, 12, 1, 20220113, 90000, 0, 1, 2, 3, 4, 0)
+            writer.write_tick(False, 0, 12, 2, 20220113, 90001, 0, 1, 2, 3, 4, 0)
+            writer.write_best5(0, 12, tuple(range(24)), 0)
+            writer.stop()
+
+            receiver = FakeReceiver()
+            replay = JournalReplay(receiver, journal_filename(tmpdir, writer.day))
+            asyncio.run(replay.run())
+
+        self.assertEqual(receiver.calls, [
+            ('kline', '2330', '台積電', 2),
+            ('history', 1),
+            ('tick', '2330', 2),
+            ('best5', 27),
+        ])
+        self.assertEqual(replay.events, 7)
+
+class TestReceiverReplay(unittest.TestCase):
+    """ 以實際的 AsyncQuoteReceiver 重播, 不需要 pythoncom, comtypes 與 skcom.yaml """
+
+    def test_replay_receiver(self):
+        from skcom import asyncrecv
+
+        def no_config():
+            raise AssertionError('重播不應該讀取設定檔')
+
+        blocked = {name: None for name in ['pythoncom', 'comtypes', 'comtypes.client', 'comtypes.gen.SKCOMLib']}
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch.dict(os.environ, {'HOME': tmpdir, 'USERPROFILE': tmpdir}), \
+                mock.patch.dict(sys.modules, blocked), \
+                mock.patch.multiple(asyncrecv, pythoncom=None, comtypes=None, sk=None, COMError=None,
+                                    load_config=no_config):
+            writer = JournalWriter(tmpdir, commit_ms=10, fsync=False)
+            writer.start()
+            writer.write_meta(-1, -1, '2330', '台積電', 2)
+            writer.write_kline('2330', '2022/01/12, 600, 610, 590, 605, 1000')
+            writer.write_kline('2330', '2022/01/13, 605, 615, 600, 610, 2000')
+            writer.write_meta(0, 12, '2330', '台積電', 2)
+            writer.write_tick(True, 0, 12, 1, 20220113, 90000, 0, 60000, 60100, 60050, 4, 0)
+            writer.write_tick(False, 0, 12, 2, 20220113, 90001, 0, 60000, 60100, 60100, 3, 0)
+            writer.write_best5(0, 12, tuple(range(60000, 60024)), 0)
+            writer.stop()
+
+            receiver = asyncrecv.AsyncQuoteReceiver()
+            ticks = []
+            best5 = []
+            klines = []
+            receiver.set_ticks_hook(ticks.append, include_history=True)
+            receiver.set_best5_hook(best5.append)
+            receiver.set_kline_hook(klines.append, 5)
+            replay = JournalReplay(receiver, journal_filename(tmpdir, writer.day))
+            asyncio.run(replay.run())
+
+        self.assertIsNone(receiver.config)
+        self.assertEqual([(t['id'], t['close'], t['qty']) for t in ticks], [('2330', 600.5, 4), ('2330', 601.0, 3)])
+        self.assertEqual(ticks[1]['name'], '台積電')
+        self.assertEqual(len(best5), 1)
+        self.assertEqual(best5[0]['best'][0]['bid'], 600.0)
+        self.assertEqual(len(klines), 1)
+        self.assertEqual([q['close'] for q in klines[0]['quotes']], [605.0, 610.0])
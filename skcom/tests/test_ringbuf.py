@@ -0,0 +1,68 @@
+import unittest
+
+from skcom.ringbuf import np, TickRing
+
+# pylint: disable=all
+
+@unittest.skipIf(np is None, 'numpy 未安裝')
+class TestTickRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = TickRing(4)
+
+    def fill(self, count):
+        for i in range(count):
+            self.ring.append(1000 + i, 9.0, 10.0, 9.5, 1, i + 1)
+
+    def test_partial(self):
+        self.fill(3)
+        self.assertEqual(len(self.ring), 3)
+        self.assertEqual(list(self.ring.last()['ts']), [1000, 1001, 1002])
+        self.assertEqual(list(self.ring.last(2)['ts']), [1001, 1002])
+
+    def test_wrap(self):
+        self.fill(7)
+        last = self.ring.last()
+        self.assertEqual(list(last['ts']), [1003, 1004, 1005, 1006])
+        # 回傳的是 view 不是複本
+        self.assertIs(last.base, self.ring.buffer)
+        self.assertFalse(last.flags.writeable)
+
+    def test_since(self):
+        self.fill(7)
+        self.assertEqual(list(self.ring.since(1005)['vol']), [6, 7])
+        self.assertEqual(len(self.ring.since(2000)), 0)
+
+    def test_grow(self):
+        ring = TickRing(8, initial=2)
+        self.assertEqual(len(ring.buffer), 4)
+        for i in range(5):
+            ring.append(1000 + i, 9.0, 10.0, 9.5, 1, i + 1)
+        self.assertEqual(ring.size, 8)
+        self.assertEqual(list(ring.last()['ts']), [1000, 1001, 1002, 1003, 1004])
+        for i in range(5, 11):
+            ring.append(1000 + i, 9.0, 10.0, 9.5, 1, i + 1)
+        self.assertEqual(len(ring.buffer), 16)
+        self.assertEqual(list(ring.last()['ts']), list(range(1003, 1011)))
+        self.assertEqual(list(ring.since(1009)['vol']), [10, 11])
+
+    def test_insert_late(self):
+        for ts in [1000, 1001, 1003, 1004]:
+            self.ring.append(ts, 9.0, 10.0, 9.5, 1, ts)
+        self.ring.append(1002, 9.0, 10.0, 9.5, 1, 1002)
+        self.assertEqual(list(self.ring.last()['ts']), [1001, 1002, 1003, 1004])
+        self.assertEqual(list(self.ring.since(1002)['vol']), [1002, 1003, 1004])
+        # 比保留的資料都舊
+        self.ring.append(900, 9.0, 10.0, 9.5, 1, 900)
+        self.assertEqual(list(self.ring.last()['ts']), [1001, 1002, 1003, 1004])
+        self.ring.append(1005, 9.0, 10.0, 9.5, 1, 1005)
+        self.assertEqual(list(self.ring.last()['ts']), [1002, 1003, 1004, 1005])
+
+    def test_insert_growing(self):
+        ring = TickRing(8, initial=2)
+        for ts in [10, 30, 40]:
+            ring.append(ts, 9.0, 10.0, 9.5, 1, ts)
+        ring.append(20, 9.0, 10.0, 9.5, 1, 20)
+        ring.append(5, 9.0, 10.0, 9.5, 1, 5)
+        self.assertEqual(list(ring.last()['ts']), [5, 10, 20, 30, 40])
+        self.assertEqual(list(ring.last()['vol']), [5, 10, 20, 30, 40])
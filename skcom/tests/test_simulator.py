@@ -0,0 +1,402 @@
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from skcom.npcompat import np
+from skcom.klinearray import KLineColumns
+from skcom.klinestore import date_to_int
+from skcom.tradecal import TradingCalendar, int_to_day, day_to_int
+from skcom.tests.simcase import SimulatorTestCase
+
+# pylint: disable=all
+
+class TestSimulator(SimulatorTestCase):
+
+    def test_ticks_and_kline(self):
+        (sim, receiver) = self.start_simulator(symbols=3, tick_rate=1000, history_ticks=2)
+        ticks = []
+        best5 = []
+        klines = []
+        receiver.set_ticks_hook(ticks.append, include_history=True, raw=True)
+        receiver.set_best5_hook(best5.append, raw=True)
+        receiver.set_kline_hook(klines.append, 5)
+        self.run_receiver(receiver, lambda: len(klines) == 3 and len(ticks) > 6 and best5)
+
+        summary = sim.summary()
+        self.assertEqual(summary['history'], 6)
+        self.assertEqual(len(ticks), summary['ticks'] + summary['history'])
+        self.assertEqual(len(best5), summary['best5'])
+        self.assertEqual(sorted(k['id'] for k in klines), ['1101', '1102', '1103'])
+        self.assertEqual(klines[0]['name'], '模擬%s' % klines[0]['id'])
+        # 個股資料只查詢一次
+        self.assertEqual(summary['index_lookups'], 3)
+
+    def test_com_thread_best5(self):
+        (sim, receiver) = self.start_simulator(symbols=2, tick_rate=1000)
+        receiver.set_com_thread(interval_ms=1)
+        updates = {}
+        receiver.set_best5_hook(lambda book: updates.setdefault(book.id, []).append(book.updates), raw=True)
+        self.run_receiver(
+            receiver, lambda: len(updates) == 2 and min(len(seq) for seq in updates.values()) >= 20
+        )
+
+        # 每一筆五檔更新都在 event loop 上依序送出, 沒有重複也沒有遺漏
+        self.assertEqual(sorted(updates), ['1101', '1102'])
+        for seq in updates.values():
+            self.assertEqual(seq, list(range(1, len(seq) + 1)))
+        self.assertLessEqual(sum(len(seq) for seq in updates.values()), sim.summary()['best5'])
+
+    def test_disconnect(self):
+        (sim, receiver) = self.start_simulator(
+            symbols=2, tick_rate=500, history_ticks=3, replay_history=True
+        )
+        ticks = []
+        receiver.set_ticks_hook(ticks.append, include_history=True, raw=True)
+
+        async def chaos():
+            await self.wait_ticks(sim, 50)
+            sim.inject_disconnect()
+            # 重新訂閱後重送的回補 ticks 全部處理完, 並且再收到新的 ticks
+            await self.wait_until(
+                lambda: sim.logins == 2 and 0 < sim.history_replayed == receiver.ticks_duplicates
+            )
+            await self.wait_ticks(sim, 50)
+
+        self.run_receiver(receiver, chaos)
+        summary = sim.summary()
+        self.assertEqual(summary['disconnects'], 1)
+        # 異常斷線後重新登入與訂閱
+        self.assertEqual(summary['logins'], 2)
+        self.assertGreater(summary['history_replayed'], 0)
+
+        # 重送的回補 ticks 全部略過, 每筆 tick 只送給 hook 一次, 總量不重複累計
+        self.assertEqual(receiver.reconnect_duplicates, [summary['history_replayed']])
+        self.assertEqual(len(ticks), summary['ticks'] + summary['history'])
+        for stock in sim.stocks:
+            self.assertEqual(receiver.ticks_total[stock.bstrStockNo], stock.total)
+
+    def test_many_symbols(self):
+        (sim, receiver) = self.start_simulator(symbols=120, tick_rate=2000)
+        receiver.set_ticks_hook(lambda entry: None, raw=True)
+
+        async def scenario():
+            await self.wait_until(lambda: len(sim.pages) == 120)
+            await self.wait_ticks(sim, 200)
+            return dict(sim.pages)
+
+        # 超過 50 檔時分散到 50 個 page
+        pages = self.run_receiver(receiver, scenario)
+        self.assertEqual(len(pages), 120)
+        self.assertEqual(len(set(pages.values())), 50)
+        stats = receiver.get_page_stats()
+        self.assertEqual(sum(page['symbols'] for page in stats.values()), 120)
+        self.assertEqual(
+            sum(page['ticks'] for page in stats.values()),
+            sum(receiver.ticks_count.values())
+        )
+
+    def test_subscribe_unsubscribe(self):
+        config = {
+            'account': 'SIMULATOR',
+            'password': 'SIMULATOR',
+            'reply_read': True,
+            'products': ['1101', '1102']
+        }
+        (sim, receiver) = self.start_simulator(
+            config=config, symbols=4, tick_rate=1000, history_ticks=3
+        )
+        ticks = []
+        receiver.set_ticks_hook(ticks.append, include_history=True, raw=True)
+
+        def received(*stock_ids):
+            return lambda: set(stock_ids) <= {tick.id for tick in ticks}
+
+        async def rotate():
+            await self.wait_until(received('1101', '1102'))
+            added = await receiver.subscribe(['1103', '1104', '1101', '9999'])
+            lookups = sim.index_lookups
+            await self.wait_until(received('1103', '1104'))
+            removed = await receiver.unsubscribe(['1101'])
+            subscribed = [stock.bstrStockNo for stock in sim.subscribed]
+            count = len(ticks)
+            await self.wait_ticks(sim, 100)
+            return (added, removed, lookups, subscribed, count)
+
+        with self.assertLogs('skcom', 'INFO'):
+            (added, removed, lookups, subscribed, count) = self.run_receiver(receiver, rotate)
+        self.assertEqual(added, ['1103', '1104'])
+        self.assertEqual(removed, ['1101'])
+        self.assertEqual(subscribed, ['1102', '1103', '1104'])
+        self.assertEqual(config['products'], ['1102', '1103', '1104'])
+        # 新訂閱的股票已預先載入個股資料
+        self.assertEqual(sim.index_lookups, lookups)
+        # 取消訂閱後不再收到該檔 ticks, 累計資料已清除
+        self.assertNotIn('1101', [tick.id for tick in ticks[count:]])
+        self.assertNotIn('1101', receiver.ticks_total)
+        self.assertIsNone(receiver.get_best5_book('1101'))
+        # 新訂閱的股票收到回補
+        self.assertEqual(receiver.ticks_total['1103'], sum(
+            tick.qty for tick in ticks if tick.id == '1103'
+        ))
+
+    def run_gap(self, recover):
+        (sim, receiver) = self.start_simulator(symbols=2, tick_rate=500, replay_history=True)
+        ticks = []
+        gaps = []
+        receiver.set_ticks_hook(ticks.append, raw=True)
+        receiver.set_gap_hook(gaps.append, recover=recover)
+        receiver.set_bar_hook(lambda bar: None, intervals=('1s',))
+
+        async def chaos():
+            await self.wait_ticks(sim, 50)
+            sim.lose_ticks(6)
+            await self.wait_until(
+                lambda: len(gaps) == 2 and (not recover or receiver.ticks_recovered == 6)
+            )
+
+        self.run_receiver(receiver, chaos)
+        return (sim, receiver, ticks, gaps)
+
+    def test_gap_detection(self):
+        (sim, receiver, ticks, gaps) = self.run_gap(False)
+        self.assertEqual(sim.ticks_lost, 6)
+        # 兩檔輪流產生, 各缺 3 筆
+        self.assertEqual(sorted(gap['id'] for gap in gaps), ['1101', '1102'])
+        self.assertEqual([gap['missing'] for gap in gaps], [3, 3])
+        self.assertEqual(receiver.ticks_gaps, 2)
+        self.assertEqual(receiver.ticks_gap_missing, 6)
+        self.assertEqual(len(ticks), sim.ticks_sent - 6)
+        self.assertEqual(sim.tick_lookups, 0)
+
+    def test_gap_recovery(self):
+        (sim, receiver, ticks, gaps) = self.run_gap(True)
+        self.assertEqual(len(gaps), 2)
+        self.assertEqual(receiver.ticks_recovered, 6)
+        self.assertEqual(sim.tick_lookups, 6)
+        self.assertEqual(receiver.ticks_missing, {})
+        # 補回後每筆 tick 都送給 hook, 總量與模擬器一致
+        self.assertEqual(len(ticks), sim.ticks_sent)
+        for stock in sim.stocks:
+            self.assertEqual(receiver.ticks_total[stock.bstrStockNo], stock.total)
+            # 補回的 ticks 也寫入 K 棒
+            self.assertEqual(sum(receiver.get_bars(stock.bstrStockNo, '1s').volume), stock.total)
+
+    def test_gap_history_fill(self):
+        (sim, receiver) = self.start_simulator(symbols=2, tick_rate=500, replay_history=True)
+        ticks = []
+        receiver.set_ticks_hook(ticks.append, include_history=True, raw=True)
+        receiver.set_gap_hook(lambda gap: None, recover=True, max_recover=2)
+
+        async def chaos():
+            await self.wait_ticks(sim, 50)
+            sim.lose_ticks(6)
+            # 超過補抓上限的缺漏保留到重新連線, 由回補 ticks 補上
+            await self.wait_until(
+                lambda: sum(len(missing) for missing in receiver.ticks_missing.values()) == 6
+            )
+            await self.wait_ticks(sim, 50)
+            self.assertEqual(sum(len(missing) for missing in receiver.ticks_missing.values()), 6)
+            sim.inject_disconnect()
+            await self.wait_until(lambda: sim.logins == 2 and not receiver.ticks_missing)
+
+        self.run_receiver(receiver, chaos)
+        self.assertEqual(sim.tick_lookups, 0)
+        self.assertEqual(receiver.ticks_missing, {})
+        for stock in sim.stocks:
+            self.assertEqual(receiver.ticks_total[stock.bstrStockNo], stock.total)
+
+    @unittest.skipIf(np is None, 'numpy 未安裝')
+    def test_gap_recovery_ring_order(self):
+        (sim, receiver) = self.start_simulator(symbols=2, tick_rate=500, replay_history=True)
+        receiver.set_ticks_buffer()
+        receiver.set_gap_hook(lambda gap: None, recover=True)
+
+        async def chaos():
+            await self.wait_ticks(sim, 50)
+            sim.lose_ticks(6)
+            await self.wait_until(lambda: receiver.ticks_recovered == 6)
+
+        self.run_receiver(receiver, chaos)
+        self.assertEqual(receiver.ticks_recovered, 6)
+        # 補回的 ticks 依時間插入緩衝區
+        for stock in sim.stocks:
+            ts = receiver.get_ticks_buffer(stock.bstrStockNo).last()['ts']
+            self.assertTrue((ts[1:] >= ts[:-1]).all())
+
+    def test_kline_store(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            payloads = []
+            sent = []
+            for _ in range(2):
+                (sim, receiver) = self.start_simulator(symbols=2, tick_rate=100)
+                klines = []
+                receiver.set_kline_hook(klines.append, 10)
+                receiver.set_kline_store(tmpdir)
+                self.run_receiver(receiver, lambda: len(klines) == 2)
+                payloads.append(sorted(klines, key=lambda k: k['id']))
+                sent.append(sim.kline_sent)
+
+            # 第二次啟動不再請求已儲存的日 K, hook 收到相同資料
+            # (第一次啟動的日曆沒有確認過任何交易日, 多請求一倍的平日)
+            self.assertEqual(sent[0], 40)
+            self.assertEqual(sent[1], 0)
+            self.assertEqual(payloads[0], payloads[1])
+            self.assertEqual(len(payloads[1][0]['quotes']), 10)
+
+    def test_kline_complete(self):
+        (sim, receiver) = self.start_simulator(symbols=3, tick_rate=100)
+        klines = []
+        receiver.set_kline_hook(klines.append, 5, quiet_ms=5000)
+        self.run_receiver(receiver, lambda: len(klines) == 3)
+
+        # 收到最後一個交易日就發送, 不必等待 quiet_ms
+        self.assertEqual(sorted(k['id'] for k in klines), ['1101', '1102', '1103'])
+        summary = receiver.kline_tracker.summary()
+        self.assertEqual(summary['pending'], 0)
+        self.assertEqual(summary['reasons'], {'session': 3})
+
+    @unittest.skipIf(np is None, 'numpy 未安裝')
+    def test_kline_columnar(self):
+        payloads = []
+        for columnar in [False, True]:
+            (sim, receiver) = self.start_simulator(symbols=2, tick_rate=100, seed=7)
+            klines = []
+            receiver.set_kline_hook(klines.append, 0, columnar=columnar)
+            self.run_receiver(receiver, lambda: len(klines) == 2)
+            payloads.append(sorted(klines, key=lambda k: k['id']))
+
+        # 欄位式資料轉換回 dict 與原本的格式相同
+        self.assertIsInstance(payloads[1][0], KLineColumns)
+        self.assertEqual(payloads[1][0].close.dtype, np.float64)
+        self.assertEqual(
+            [k.to_dict() for k in payloads[1]],
+            payloads[0]
+        )
+
+    def test_kline_window(self):
+        sent = []
+        calendar = None
+        for _ in range(2):
+            (sim, receiver) = self.start_simulator(symbols=2, tick_rate=100)
+            if calendar is not None:
+                receiver.calendar = calendar
+            klines = []
+            receiver.set_kline_hook(klines.append, 7)
+            self.run_receiver(receiver, lambda: len(klines) == 2)
+            self.assertEqual([len(k['quotes']) for k in klines], [7, 7])
+            sent.append(sim.kline_sent)
+            calendar = receiver.calendar
+
+        # 日曆還沒確認的平日可能是休市日, 多請求相同天數; 學到交易日之後只請求需要的交易日
+        self.assertEqual(sent, [28, 14])
+        self.assertEqual(len(calendar.trading), 14)
+
+    def test_kline_holidays(self):
+        # 最後一個交易日之前連續 7 個平日休市, 補足的請求區間仍然不夠
+        end = TradingCalendar().last_completed(datetime.today())
+        day = int_to_day(end)
+        weekdays = []
+        while len(weekdays) < 10:
+            if day.weekday() < 5:
+                weekdays.append(day_to_int(day))
+            day -= timedelta(days=1)
+        holidays = weekdays[2:9]
+
+        (sim, receiver) = self.start_simulator(symbols=2, tick_rate=100, holidays=holidays)
+        klines = []
+        receiver.set_kline_hook(klines.append, 5)
+        self.run_receiver(receiver, lambda: len(klines) == 2)
+
+        # 收到的日 K 不足時往前再請求一次, 依日期排序後發送
+        self.assertEqual(receiver.kline_retried, {'1101', '1102'})
+        for kline in klines:
+            dates = [date_to_int(quote['date']) for quote in kline['quotes']]
+            self.assertEqual(len(dates), 5)
+            self.assertEqual(dates, sorted(dates))
+            self.assertEqual(dates[-2:], [weekdays[1], weekdays[0]])
+            self.assertFalse(set(dates) & set(holidays))
+        self.assertEqual(receiver.kline_tracker.summary()['pending'], 0)
+
+    def test_bars_history_only(self):
+        (sim, receiver) = self.start_simulator(symbols=2, tick_rate=1000, history_ticks=3)
+        ticks = []
+        receiver.set_ticks_hook(ticks.append)
+        receiver.set_bar_hook(lambda bar: None, intervals=('1s',))
+        self.run_receiver(receiver, lambda: len({tick['id'] for tick in ticks}) == 2)
+
+        # 回補 ticks 只寫入 K 棒, 總量與筆數仍然只累計即時 ticks
+        for stock in sim.stocks:
+            live = [tick for tick in ticks if tick['id'] == stock.bstrStockNo]
+            self.assertGreater(len(live), 0)
+            self.assertEqual(receiver.ticks_count[stock.bstrStockNo], len(live))
+            self.assertEqual(live[-1]['vol'], sum(tick['qty'] for tick in live))
+            bars = receiver.get_bars(stock.bstrStockNo, '1s')
+            self.assertEqual(sum(bars.volume), stock.total)
+            self.assertEqual(sum(bars.ticks), len(live) + 3)
+
+    def test_bars_history_gap(self):
+        (sim, receiver) = self.start_simulator(symbols=2, tick_rate=1000, replay_history=True)
+        ticks = []
+        gaps = []
+        receiver.set_ticks_hook(ticks.append, raw=True)
+        receiver.set_gap_hook(gaps.append, recover=True)
+        receiver.set_bar_hook(lambda bar: None, intervals=('1s',))
+
+        async def chaos():
+            await self.wait_ticks(sim, 50)
+            # 斷線前的 ticks 遺失, 重新連線後先由回補 ticks 寫入 K 棒, 再由 GetTickLONG() 補回
+            sim.lose_ticks(1000000)
+            await self.wait_until(lambda: sim.ticks_lost >= 20)
+            sim.inject_disconnect()
+            sim.lose = 0
+            await self.wait_until(
+                lambda: sim.logins == 2 and len(gaps) == 2 and not receiver.ticks_missing
+            )
+            await self.wait_ticks(sim, 50)
+
+        self.run_receiver(receiver, chaos)
+        self.assertGreater(receiver.ticks_recovered, 0)
+        # 每筆 tick 只寫入 K 棒一次
+        for stock in sim.stocks:
+            bars = receiver.get_bars(stock.bstrStockNo, '1s')
+            qty = sum(tick.qty for tick in ticks if tick.id == stock.bstrStockNo)
+            self.assertEqual(sum(bars.volume), qty)
+            self.assertEqual(sum(bars.volume), stock.total)
+            self.assertEqual(sum(bars.ticks), stock.ptr)
+
+    def test_bars_rebuild(self):
+        (sim, receiver) = self.start_simulator(
+            symbols=2, tick_rate=1000, history_ticks=3, replay_history=True
+        )
+        closed = []
+        receiver.set_bar_hook(closed.append, intervals=('1s',))
+
+        async def chaos():
+            await self.wait_until(lambda: len(closed) > 0)
+            sim.inject_disconnect()
+            await self.wait_until(lambda: sim.logins == 2)
+            await self.wait_ticks(sim, 200)
+
+        self.run_receiver(receiver, chaos)
+        self.assertGreater(len(closed), 0)
+
+        # 重新啟動, 只從回補 ticks 重建的 K 棒與即時合成的相同
+        sim.tick_rate = 0
+        rebuilt = self.create_receiver(sim)
+        rebuilt.set_bar_hook(lambda bar: None, intervals=('1s',))
+
+        def rebuilt_all():
+            for stock in sim.stocks:
+                bars = rebuilt.get_bars(stock.bstrStockNo, '1s')
+                if bars is None or sum(bars.volume) < stock.total:
+                    return False
+            return True
+
+        self.run_receiver(rebuilt, rebuilt_all)
+        for stock in sim.stocks:
+            live = receiver.get_bars(stock.bstrStockNo, '1s')
+            self.assertEqual(
+                [bar.as_dict() for bar in rebuilt.get_bars(stock.bstrStockNo, '1s').bars()],
+                [bar.as_dict() for bar in live.bars()]
+            )
+            self.assertEqual(sum(live.volume), stock.total)
@@ -0,0 +1,50 @@
+import unittest
+from types import SimpleNamespace
+
+from skcom.stockmeta import StockMetaCache
+
+# pylint: disable=all
+
+class TestStockMetaCache(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.cache = StockMetaCache(self.loader)
+
+    def loader(self, market_no, index):
+        self.calls.append((market_no, index))
+        if index == 999:
+            return (None, 9999)
+        p_stock = SimpleNamespace(
+            bstrStockNo='2330',
+            # cp950 編碼的 "台積電", 模擬 COM 元件回傳的字串
+            bstrStockName=''.join(map(chr, '台積電'.encode('cp950'))),
+            sDecimal=2
+        )
+        return (p_stock, 0)
+
+    def test_hit_and_miss(self):
+        (meta, n_code) = self.cache.get(0, 10)
+        self.assertEqual(n_code, 0)
+        self.assertEqual(meta.stock_no, '2330')
+        self.assertEqual(meta.name, '台積電')
+        self.assertEqual(meta.divisor, 100)
+
+        (meta2, n_code) = self.cache.get(0, 10)
+        self.assertIs(meta, meta2)
+        self.assertEqual(self.calls, [(0, 10)])
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_error_not_cached(self):
+        (meta, n_code) = self.cache.get(0, 999)
+        self.assertIsNone(meta)
+        self.assertEqual(n_code, 9999)
+        self.cache.get(0, 999)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_clear(self):
+        self.cache.get(0, 10)
+        self.cache.clear()
+        self.cache.get(0, 10)
+        self.assertEqual(len(self.calls), 2)
@@ -0,0 +1,55 @@
+import unittest
+
+from skcom.subscribe import SubscriptionManager
+from skcom.record import Best5Book
+
+# pylint: disable=all
+
+class TestSubscriptionManager(unittest.TestCase):
+
+    def test_one_per_page(self):
+        mgr = SubscriptionManager()
+        plan = mgr.plan(['2330', '2317', '2454'])
+        self.assertEqual(plan, [(0, '2330'), (1, '2317'), (2, '2454')])
+
+    def test_auto_spread(self):
+        mgr = SubscriptionManager()
+        stocks = ['%04d' % (1101 + i) for i in range(120)]
+        plan = mgr.plan(stocks)
+        self.assertEqual(len(plan), 120)
+        sizes = sorted(len(stock_list) for stock_list in mgr.pages.values())
+        self.assertEqual(len(mgr.pages), 50)
+        self.assertEqual(sizes[0], 2)
+        self.assertEqual(sizes[-1], 3)
+
+    def test_fixed_capacity(self):
+        mgr = SubscriptionManager(per_page=2)
+        stocks = ['%04d' % (1101 + i) for i in range(101)]
+        with self.assertLogs('skcom', 'WARNING'):
+            plan = mgr.plan(stocks)
+        self.assertEqual(len(plan), 100)
+        self.assertIsNone(mgr.page_of('1201'))
+        self.assertEqual(mgr.capacity(), 100)
+
+    def test_confirm_release(self):
+        mgr = SubscriptionManager()
+        mgr.plan(['2330', '2317'])
+        mgr.confirm('2317', 7)
+        self.assertEqual(mgr.page_of('2317'), 7)
+        self.assertNotIn(1, mgr.pages)
+        self.assertEqual(mgr.release('2317'), 7)
+        self.assertNotIn(7, mgr.pages)
+        # 空出來的 page 優先使用
+        self.assertEqual(mgr.assign('2454'), 1)
+
+    def test_page_stats(self):
+        mgr = SubscriptionManager(per_page=2)
+        mgr.plan(['2330', '2317', '2454'])
+        # 平均分散, 每個 page 先放一檔
+        self.assertEqual(len(mgr.pages), 3)
+        mgr.confirm('2454', 0)
+        book = Best5Book('2330', '台積電')
+        book.updates = 4
+        stats = mgr.page_stats({'2330': 10, '2454': 5}, {'2330': book})
+        self.assertEqual(stats[0], {'symbols': 2, 'ticks': 15, 'best5': 4, 'events': 19})
+        self.assertEqual(stats[1]['symbols'], 1)
@@ -0,0 +1,31 @@
+import unittest
+
+from skcom.tickgap import MissingTicks
+
+# pylint: disable=all
+
+class TestMissingTicks(unittest.TestCase):
+
+    def test_add_merge(self):
+        missing = MissingTicks()
+        missing.add(10, 12)
+        missing.add(20, 29)
+        missing.add(13, 15)
+        self.assertEqual(missing.ranges(), [(10, 15), (20, 29)])
+        missing.add(14, 21)
+        self.assertEqual(missing.ranges(), [(10, 29)])
+        self.assertEqual(len(missing), 20)
+
+    def test_discard(self):
+        missing = MissingTicks()
+        missing.add(1, 5)
+        for ptr in [1, 5, 3]:
+            missing.discard(ptr)
+        self.assertEqual(missing.ranges(), [(2, 2), (4, 4)])
+        self.assertIn(2, missing)
+        self.assertNotIn(3, missing)
+        missing.discard(2)
+        missing.discard(4)
+        missing.discard(4)
+        self.assertEqual(len(missing), 0)
+        self.assertFalse(missing)
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from skcom.tradecal import TradingCalendar
+
+# pylint: disable=all
+
+# 2024 春節封關: 2/5 (一) 最後交易日, 2/15 (四) 開市
+LUNAR_NEW_YEAR = [20240201, 20240202, 20240205, 20240215, 20240216, 20240219]
+
+class TestTradingCalendar(unittest.TestCase):
+
+    def test_weekdays(self):
+        cal = TradingCalendar()
+        # 2020-11-07 星期六
+        self.assertEqual(cal.last_completed(datetime(2020, 11, 7, 10, 0)), 20201106)
+        self.assertEqual(cal.last_completed(datetime(2020, 11, 6, 14, 59)), 20201105)
+        self.assertEqual(cal.last_completed(datetime(2020, 11, 6, 15, 0)), 20201106)
+        self.assertEqual(cal.last_sessions(5, 20201106), (20201102, 20201106))
+        self.assertEqual(cal.next_session(20201106), 20201109)
+        self.assertEqual(cal.count(20201102, 20201108), 5)
+        self.assertEqual(cal.count(20201107, 20201108), 0)
+
+    def test_learn_holidays(self):
+        cal = TradingCalendar()
+        self.assertEqual(cal.learn(LUNAR_NEW_YEAR), 6)
+        self.assertEqual(cal.learn(LUNAR_NEW_YEAR), 0)
+        # 已學習範圍內沒有日 K 的平日是休市日
+        self.assertEqual(cal.last_sessions(3, 20240216), (20240205, 20240216))
+        self.assertEqual(cal.next_session(20240205), 20240215)
+        self.assertEqual(cal.count(20240201, 20240219), 6)
+        self.assertEqual(cal.last_completed(datetime(2024, 2, 14, 16, 0)), 20240205)
+        # 學習範圍之外以平日推算
+        self.assertEqual(cal.next_session(20240219), 20240220)
+
+    def test_assumed(self):
+        cal = TradingCalendar()
+        self.assertEqual(cal.assumed(20240201, 20240220), 14)
+        cal.learn(LUNAR_NEW_YEAR)
+        # 2/1-2/19 都已確認, 只剩 2/20 是推定的交易日
+        self.assertEqual(cal.assumed(20240201, 20240220), 1)
+        self.assertEqual(cal.assumed(20240220, 20240219), 0)
+
+    def test_seed_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'calendar.txt')
+            with open(path, 'w', encoding='utf-8') as cfile:
+                cfile.write('# 預先公告的休市日\n20250127 closed\n20250128 closed\nbad line\n')
+            cal = TradingCalendar(path)
+            self.assertEqual(cal.next_session(20250124), 20250129)
+            self.assertEqual(cal.count(20250127, 20250131), 3)
+
+            # 學到交易日後寫回, 休市日保留
+            cal.learn([20250124])
+            cal.save()
+            loaded = TradingCalendar(path)
+            self.assertEqual(loaded.trading, {20250124})
+            self.assertEqual(loaded.closed, {20250127, 20250128})
+            self.assertFalse(loaded.dirty)
+
+    def test_indexed_queries(self):
+        cal = TradingCalendar()
+        cal.last_sessions(20, 20201106)
+        rebuilds = cal.rebuilds
+        for day in range(20201001, 20201031):
+            cal.count(day, 20201106)
+            cal.last_sessions(5, day)
+        self.assertEqual(cal.rebuilds, rebuilds)
+        # 超出索引範圍時擴充
+        self.assertEqual(cal.last_sessions(1000, 20201106)[1], 20201106)
@@ -0,0 +1,70 @@
+"""
+skcom.tickgap
+
+個股缺漏 nPtr 的區間記錄
+"""
+
+import bisect
+
+class MissingTicks():
+    """
+    缺漏 nPtr 集合, 以不重疊的 [first, last] 區間記錄
+
+    斷線期間的缺漏可能有上萬筆, 以區間記錄時記憶體只與缺漏段數有關,
+    補上一筆時只會縮短或切開所在的區間
+    """
+
+    def __init__(self):
+        self.firsts = []
+        self.lasts = []
+        self.count = 0
+
+    def add(self, first, last):
+        """ 加入 [first, last] 區間 """
+        pos = bisect.bisect_left(self.lasts, first - 1)
+        end = pos
+        # 合併重疊或相鄰的區間
+        while end < len(self.firsts) and self.firsts[end] <= last + 1:
+            first = min(first, self.firsts[end])
+            last = max(last, self.lasts[end])
+            self.count -= self.lasts[end] - self.firsts[end] + 1
+            end += 1
+        self.firsts[pos:end] = [first]
+        self.lasts[pos:end] = [last]
+        self.count += last - first + 1
+
+    def find(self, ptr):
+        """ ptr 所在區間的位置, 不在任何區間時回傳 -1 """
+        pos = bisect.bisect_right(self.firsts, ptr) - 1
+        if pos >= 0 and ptr <= self.lasts[pos]:
+            return pos
+        return -1
+
+    def __contains__(self, ptr):
+        return self.find(ptr) >= 0
+
+    def discard(self, ptr):
+        """ 移除一個 nPtr """
+        pos = self.find(ptr)
+        if pos < 0:
+            return
+        first = self.firsts[pos]
+        last = self.lasts[pos]
+        if first == last:
+            del self.firsts[pos]
+            del self.lasts[pos]
+        elif ptr == first:
+            self.firsts[pos] = ptr + 1
+        elif ptr == last:
+            self.lasts[pos] = ptr - 1
+        else:
+            self.firsts.insert(pos + 1, ptr + 1)
+            self.lasts.insert(pos, ptr - 1)
+        self.count -= 1
+
+    def __len__(self):
+        return self.count
+
+    def ranges(self):
+        """ 所有缺漏區間 (first, last) """
+        return list(zip(self.firsts, self.lasts))
@@ -0,0 +1,223 @@
+"""
+skcom.tradecal
+
+台股交易日曆, 由收到的日 K 學習交易日, 也可以從本機檔案載入
+"""
+
+import logging
+import os
+import os.path
+from datetime import date, timedelta
+
+logger = logging.getLogger('skcom')
+
+def int_to_day(value):
+    """ YYYYMMDD 整數轉換為 date """
+    return date(value // 10000, value // 100 % 100, value % 100)
+
+def day_to_int(day):
+    """ date 轉換為 YYYYMMDD 整數 """
+    return day.year * 10000 + day.month * 100 + day.day
+
+class TradingCalendar():
+    """
+    台股交易日曆
+
+    判斷交易日的順序:
+
+    1. 收過日 K 或檔案記錄的交易日
+    2. 檔案記錄的休市日 (例如事先公告的春節封關)
+    3. 已學習範圍 (第一個到最後一個已知交易日) 內沒有任何日 K 的平日視為休市
+    4. 其餘的平日視為交易日, 週末休市
+
+    查詢使用以日期為索引的陣列, 每個日曆日對應到當天或之前最後一個交易日,
+    因此 "最後 N 個交易日" 與 "區間內的交易日數" 都只需要查表;
+    學到新的交易日時索引失效, 下一次查詢重建
+    """
+
+    # 索引向前後多涵蓋的日數, 減少重建次數
+    MARGIN = 400
+
+    def __init__(self, path=None):
+        self.path = path
+        self.trading = set()
+        self.closed = set()
+        self.first = None
+        self.last = None
+        self.dirty = False
+
+        # 索引
+        self.base = None      # 索引第一天的 ordinal
+        self.sessions = []    # 索引範圍內的交易日, YYYYMMDD 整數
+        self.floor = []       # 第 k 天 (base + k) 當天或之前最後一個交易日在 sessions 的位置
+
+        # 統計
+        self.rebuilds = 0
+
+        if path is not None and os.path.isfile(path):
+            self.load(path)
+
+    def load(self, path):
+        """
+        載入日曆檔, 每行一個 YYYYMMDD 交易日, 休市日在日期後加上 closed, # 之後為註解
+        """
+        with open(path, 'r', encoding='utf-8') as cfile:
+            for line in cfile:
+                cols = line.split('#', 1)[0].split()
+                if not cols:
+                    continue
+                try:
+                    value = int(cols[0])
+                    int_to_day(value)
+                except ValueError:
+                    logger.warning('交易日曆格式錯誤: %s', line.strip())
+                    continue
+                if len(cols) > 1 and cols[1] == 'closed':
+                    self.closed.add(value)
+                else:
+                    self.add(value)
+        self.invalidate()
+        self.dirty = False
+
+    def save(self, path=None):
+        """ 寫入日曆檔, 沒有新資料時略過 """
+        if path is None:
+            path = self.path
+        if path is None or not self.dirty:
+            return
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as cfile:
+            cfile.write('# skcom 交易日曆\n')
+            for value in sorted(self.trading):
+                cfile.write('%d\n' % value)
+            for value in sorted(self.closed):
+                cfile.write('%d closed\n' % value)
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+    def add(self, value):
+        """ 加入一個交易日, 回傳是否為新的交易日 """
+        if value in self.trading:
+            return False
+        self.trading.add(value)
+        self.closed.discard(value)
+        if self.first is None or value < self.first:
+            self.first = value
+        if self.last is None or value > self.last:
+            self.last = value
+        return True
+
+    def learn(self, values):
+        """ 由日 K 日期 (YYYYMMDD 整數) 學習交易日, 回傳新增的交易日數 """
+        added = 0
+        for value in values:
+            if self.add(value):
+                added += 1
+        if added > 0:
+            self.invalidate()
+            self.dirty = True
+        return added
+
+    def invalidate(self):
+        """ 清除索引 """
+        self.base = None
+        self.sessions = []
+        self.floor = []
+
+    def is_session(self, day):
+        """ 是否為交易日 """
+        value = day_to_int(day)
+        if value in self.trading:
+            return True
+        if value in self.closed or day.weekday() >= 5:
+            return False
+        if self.first is not None and self.first <= value <= self.last:
+            return False
+        return True
+
+    def ensure(self, first_day, last_day):
+        """ 確保索引涵蓋 [first_day, last_day] """
+        if self.base is not None:
+            first_ord = self.base
+            last_ord = self.base + len(self.floor) - 1
+            if first_ord <= first_day.toordinal() and last_day.toordinal() <= last_ord:
+                return
+            first_day = min(first_day, date.fromordinal(first_ord))
+            last_day = max(last_day, date.fromordinal(last_ord))
+
+        first_day -= timedelta(days=self.MARGIN)
+        last_day += timedelta(days=self.MARGIN)
+        self.base = first_day.toordinal()
+        self.sessions = []
+        self.floor = []
+        day = first_day
+        while day <= last_day:
+            if self.is_session(day):
+                self.sessions.append(day_to_int(day))
+            self.floor.append(len(self.sessions) - 1)
+            day += timedelta(days=1)
+        self.rebuilds += 1
+
+    def position(self, value):
+        """ value 當天或之前最後一個交易日在 sessions 的位置 """
+        day = int_to_day(value)
+        self.ensure(day, day)
+        return self.floor[day.toordinal() - self.base]
+
+    def last_completed(self, now, cutoff=1500):
+        """ 最後一個已收盤的交易日, 當天 cutoff (HHMM) 之後才算當天收盤 """
+        today = now.date()
+        if now.hour * 100 + now.minute < cutoff:
+            today -= timedelta(days=1)
+        pos = self.position(day_to_int(today))
+        return self.sessions[pos]
+
+    def last_sessions(self, count, end):
+        """ 截至 end (含) 的最後 count 個交易日, 回傳 (第一天, 最後一天) """
+        pos = self.position(end)
+        while pos - count + 1 < 0:
+            # 索引不夠早, 往前擴充
+            self.ensure(date.fromordinal(self.base) - timedelta(days=count * 2), int_to_day(end))
+            pos = self.position(end)
+        return (self.sessions[pos - count + 1], self.sessions[pos])
+
+    def next_session(self, value):
+        """ value 之後的第一個交易日 """
+        pos = self.position(value)
+        if pos + 1 >= len(self.sessions):
+            day = int_to_day(value)
+            self.ensure(day, day + timedelta(days=self.MARGIN))
+            pos = self.position(value)
+        return self.sessions[pos + 1]
+
+    def count(self, start, end):
+        """ [start, end] 之間的交易日數 """
+        if start > end:
+            return 0
+        first = int_to_day(start) - timedelta(days=1)
+        self.ensure(first, int_to_day(end))
+        return self.floor[int_to_day(end).toordinal() - self.base] - \
+            self.floor[first.toordinal() - self.base]
+
+    def assumed(self, start, end):
+        """ [start, end] 之間沒有日 K 或檔案確認, 只以平日推定為交易日的天數 """
+        if start > end:
+            return 0
+        first = int_to_day(start) - timedelta(days=1)
+        self.ensure(first, int_to_day(end))
+        begin = self.floor[first.toordinal() - self.base] + 1
+        stop = self.floor[int_to_day(end).toordinal() - self.base] + 1
+        return sum(1 for value in self.sessions[begin:stop] if value not in self.trading)
+
+    def summary(self):
+        """ 統計摘要 """
+        return {
+            'trading': len(self.trading),
+            'closed': len(self.closed),
+            'first': self.first,
+            'last': self.last,
+            'rebuilds': self.rebuilds
+        }